@@ -1,5 +1,8 @@
 from app import app
 
+# Serverless functions: no process pools, parse uploads serially in the request
+app.config['PARALLEL_WORKERS'] = 1
+
 # Vercel entry point
 # No need for handler(), Vercel/WSGI handles 'app' object automatically if exposed.
 # But for @vercel/python, we usually expose 'app' as a variable.
@@ -1,19 +1,104 @@
-from flask import Flask, render_template
+import os
+from flask import Flask, Response, render_template, jsonify
 from modules.reconciliation import reconciliation_bp
 from modules.invoice_generator import invoice_generator_bp
 from modules.create_invoice import create_invoice_bp
+from modules.common import get_result_cache
+from modules.common.jobs import FINISHED, STATUS_FAILED, get_job_manager, job_payload
+from modules.common.timing import METRICS, begin_request, end_request
 
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB limit
+# Worker processes used to parse uploaded files in parallel (1 = serial)
+app.config['PARALLEL_WORKERS'] = int(os.environ.get('PARALLEL_WORKERS', min(4, os.cpu_count() or 1)))
+# 'process' or 'thread' pool for scanning reconciliation invoices
+app.config['RECONCILIATION_EXECUTOR'] = os.environ.get('RECONCILIATION_EXECUTOR', 'process')
+# Folder of extra invoice layout *.json files for reconciliation (see modules/reconciliation/layouts.py)
+app.config['RECONCILIATION_LAYOUT_DIR'] = os.environ.get('RECONCILIATION_LAYOUT_DIR')
+# Cache of parsed per-file results keyed by upload content: 'memory', 'disk' or 'none'
+app.config['RESULT_CACHE_BACKEND'] = os.environ.get('RESULT_CACHE_BACKEND', 'memory')
+app.config['RESULT_CACHE_MAX_MB'] = float(os.environ.get('RESULT_CACHE_MAX_MB', 256))
+app.config['RESULT_CACHE_DIR'] = os.environ.get('RESULT_CACHE_DIR')
+# Generated workbooks are kept server-side for download ('inline' = base64 in the JSON, default on serverless)
+app.config['DOWNLOAD_MODE'] = os.environ.get('DOWNLOAD_MODE')
+app.config['DOWNLOAD_DIR'] = os.environ.get('DOWNLOAD_DIR')
+app.config['DOWNLOAD_TTL_SECONDS'] = int(os.environ.get('DOWNLOAD_TTL_SECONDS', 15 * 60))
+# Uploads are spooled to UPLOAD_SPOOL_DIR and admitted within a per-process memory budget (see modules/common/uploads.py)
+app.config['UPLOAD_SPOOL_DIR'] = os.environ.get('UPLOAD_SPOOL_DIR')
+app.config['UPLOAD_MEMORY_BUDGET_MB'] = os.environ.get('UPLOAD_MEMORY_BUDGET_MB')
+app.config['UPLOAD_QUEUE_TIMEOUT'] = os.environ.get('UPLOAD_QUEUE_TIMEOUT')
+# Vendor sheets are streamed in chunks of this many rows (see modules/common/sheet_reader.py)
+app.config['SHEET_CHUNK_ROWS'] = int(os.environ.get('SHEET_CHUNK_ROWS', 10000))
+# Background jobs for ?async=1 requests: 'memory', 'local' (files in JOB_DIR, shared by workers), 'redis' or 'none'
+app.config['JOB_BACKEND'] = os.environ.get('JOB_BACKEND', 'memory')
+app.config['JOB_DIR'] = os.environ.get('JOB_DIR')
+app.config['JOB_REDIS_URL'] = os.environ.get('JOB_REDIS_URL')
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))
+app.config['JOB_TTL_SECONDS'] = int(os.environ.get('JOB_TTL_SECONDS', 60 * 60))
+# SQLite file of the persistent Master Data store ('none' = rebuild master data per request)
+app.config['MASTER_STORE_PATH'] = os.environ.get('MASTER_STORE_PATH')
+# Per-stage timings (see modules/common/timing.py): JSON log line per request, optional Server-Timing header
+app.config['TIMING_LOG'] = os.environ.get('TIMING_LOG', 'true').lower() in ('1', 'true', 'yes')
+app.config['SERVER_TIMING'] = os.environ.get('SERVER_TIMING', 'false').lower() in ('1', 'true', 'yes')
+# ?profile=1 dumps a profile of that request here (unset = profiling off); 'cprofile' or 'pyinstrument'
+app.config['PROFILE_DIR'] = os.environ.get('PROFILE_DIR')
+app.config['PROFILER'] = os.environ.get('PROFILER', 'cprofile')
 
 # Register Blueprints
 app.register_blueprint(reconciliation_bp, url_prefix='/reconciliation')
 app.register_blueprint(invoice_generator_bp, url_prefix='/invoice-generator')
 app.register_blueprint(create_invoice_bp, url_prefix='/create-invoice')
 
+app.before_request(begin_request)
+app.after_request(end_request)
+
 @app.route('/')
 def dashboard():
     return render_template('dashboard.html')
 
+@app.route('/api/cache-stats')
+def cache_stats():
+    cache = get_result_cache(app)
+    return jsonify(cache.stats() if cache else {"backend": None})
+
+@app.route('/metrics')
+def metrics():
+    """Request, stage and file timings of this process (Prometheus text format), plus result cache counters."""
+    extra = []
+    cache = get_result_cache(app)
+    if cache is not None:
+        stats = cache.stats()
+        extra = [
+            ('result_cache_hits_total', 'counter', 'Result cache hits.', [({}, stats["hits"])]),
+            ('result_cache_misses_total', 'counter', 'Result cache misses.', [({}, stats["misses"])]),
+            ('result_cache_bytes', 'gauge', 'Size of the result cache.', [({}, stats["size_bytes"])]),
+        ]
+    return Response(METRICS.render(extra), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/jobs/<job_id>')
+def job_status(job_id):
+    """Progress of a background job (see modules/common/jobs.py)."""
+    manager = get_job_manager(app)
+    job = manager.status(job_id) if manager else None
+    if job is None:
+        return jsonify({"success": False, "error": "Job not found or expired."}), 404
+    return jsonify(job_payload(job))
+
+@app.route('/api/jobs/<job_id>/result')
+def job_result(job_id):
+    """The response the job's endpoint produced, once it is finished (202 with the status before)."""
+    manager = get_job_manager(app)
+    job = manager.status(job_id) if manager else None
+    if job is None:
+        return jsonify({"success": False, "error": "Job not found or expired."}), 404
+    if job["status"] not in FINISHED:
+        return jsonify(job_payload(job)), 202
+    if job["status"] == STATUS_FAILED:
+        return jsonify({"success": False, "error": f"Processing failed: {job['error']}"}), 500
+    result = manager.result(job_id)
+    if result is None:
+        return jsonify({"success": False, "error": "Job result expired."}), 404
+    return Response(result["body"], status=result["status"], headers=result["headers"])
+
 if __name__ == '__main__':
     app.run(debug=True, port=1111)
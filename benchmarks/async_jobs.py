@@ -0,0 +1,109 @@
+"""
+Benchmark: background jobs (?async=1, modules.common.jobs) against the inline
+requests of the four long-running endpoints, on the memory and local backends.
+
+For each endpoint the same upload is sent inline and as a job; the job is
+polled through /api/jobs/<id> until it finishes and its /result must equal the
+inline response (apart from per-request tokens and peak memory). Reports how
+long the client waits for the inline response versus the 202, the total job
+time, and the progress stages seen while polling.
+
+Usage: python benchmarks/async_jobs.py [files] [rows per file]
+"""
+import io
+import os
+import sys
+import json
+import time
+import tempfile
+
+from openpyxl import load_workbook
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from create_invoice_rows import make_vendor_file
+from create_invoice_export import CONFIG
+from reconciliation_scan import make_invoice
+
+VOLATILE = ('peak_memory_mb', 'handle', 'download_token', 'download_url', 'master_version', 'preview')
+
+
+def strip(body):
+    if isinstance(body, dict):
+        return {k: strip(v) for k, v in body.items() if k not in VOLATILE}
+    return body
+
+
+def sheet_values(data):
+    wb = load_workbook(io.BytesIO(data))
+    return {ws.title: [list(row) for row in ws.iter_rows(values_only=True)] for ws in wb.worksheets}
+
+
+def comparable(response):
+    if response.mimetype == 'application/json':
+        return strip(response.get_json())
+    return response.headers.get('Content-Disposition'), sheet_values(response.data)
+
+
+def run_job(client, url, **kwargs):
+    """Submits with ?async=1 and polls; returns (seconds to 202, seconds to result, stages, result response)."""
+    start = time.perf_counter()
+    submitted = client.post(url + '?async=1', **kwargs)
+    accepted = time.perf_counter() - start
+    assert submitted.status_code == 202, submitted.data[:200]
+    job = submitted.get_json()
+    stages = []
+    while True:
+        status = client.get(job['status_url']).get_json()
+        progress = f"{status['stage']} {status['files_done']}/{status['files_total']} files {status['rows']} rows"
+        if not stages or stages[-1] != progress:
+            stages.append(progress)
+        if status['status'] in ('done', 'failed'):
+            break
+        time.sleep(0.05)
+    result = client.get(job['result_url'])
+    return accepted, time.perf_counter() - start, stages, result
+
+
+def requests(files, rows):
+    vendor = make_vendor_file(rows)
+    invoices = [make_invoice(n) for n in range(files)]
+
+    def vendor_upload(**fields):
+        return {'data': dict(fields, files=[(io.BytesIO(vendor), f'1-7 Desember 2025_C{n}_X.xlsx') for n in range(files)]),
+                'content_type': 'multipart/form-data'}
+
+    with app.test_client() as client:
+        trips = client.post('/create-invoice/process', **vendor_upload(format='columnar')).get_json()['trips']
+    return [
+        ('/create-invoice/process', lambda: vendor_upload(format='columnar')),
+        ('/create-invoice/export', lambda: {'json': {'trips': trips, 'config': CONFIG}}),
+        ('/invoice-generator/api/process', lambda: vendor_upload(filename_suffix='W1')),
+        ('/reconciliation/process', lambda: {'data': {'files': [(io.BytesIO(data), f'inv{n}.xlsx') for n, data in enumerate(invoices)]},
+                                             'content_type': 'multipart/form-data'}),
+    ]
+
+
+if __name__ == '__main__':
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    app.config['RESULT_CACHE_BACKEND'] = 'none'
+    app.config['DOWNLOAD_MODE'] = 'server'
+    cases = requests(files, rows)
+
+    for backend in ('memory', 'local'):
+        app.config['JOB_BACKEND'] = backend
+        app.config['JOB_DIR'] = tempfile.mkdtemp(prefix='jobs_')
+        app.extensions.pop('job_manager', None)
+        print(f"--- JOB_BACKEND={backend}")
+        with app.test_client() as client:
+            for url, make_kwargs in cases:
+                start = time.perf_counter()
+                inline = client.post(url, **make_kwargs())
+                inline_time = time.perf_counter() - start
+                accepted, total, stages, result = run_job(client, url, **make_kwargs())
+                assert result.status_code == inline.status_code, (url, result.status_code, result.data[:200])
+                assert comparable(result) == comparable(inline), f"{url}: job result differs from the inline response"
+                print(f"{url:<31} inline {inline_time:6.2f} s   202 after {accepted * 1000:6.1f} ms, result after {total:6.2f} s")
+                print(f"{'':<31} progress: {' -> '.join(stages)}")
@@ -0,0 +1,67 @@
+"""
+Benchmark: /create-invoice/export-batch against one /export call per city.
+Builds synthetic trips for several city codes, then times N manual exports
+(one request per city, as done by hand today) and the batch ZIP with 1 worker
+and with PARALLEL_WORKERS workers, including the time to the first ZIP chunk.
+Every ZIP entry is checked against the single export of the same city.
+
+Usage: python benchmarks/create_invoice_batch.py [cities] [trips per city] [workers]
+"""
+import io
+import os
+import sys
+import json
+import time
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from modules.create_invoice.batch import invoice_number
+from create_invoice_export import CONFIG, make_trips, dump
+
+CITY_CODES = ['BGR', 'CKP', 'DPK', 'BKS', 'TNG', 'JKT', 'SBY', 'MDN', 'SMG', 'BDG', 'MKS', 'PLM']
+
+
+def make_batch(cities, per_city):
+    trips = []
+    for code in CITY_CODES[:cities]:
+        for trip in make_trips(per_city):
+            trip['source_file'] = f'22-31 Desember 2025_{code}_CSF_REPORT W4.xlsx'
+            trips.append(trip)
+    return trips
+
+
+if __name__ == '__main__':
+    cities = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    per_city = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else max(2, os.cpu_count() or 1)
+    trips = make_batch(cities, per_city)
+    config = dict(CONFIG, invoice_no='INV/2025/12/001')
+    client = app.test_client()
+
+    start = time.perf_counter()
+    singles = []
+    for pos, code in enumerate(CITY_CODES[:cities]):
+        part = [trip for trip in trips if f'_{code}_' in trip['source_file']]
+        response = client.post('/create-invoice/export',
+                               json={'data': part, 'config': dict(config, invoice_no=invoice_number(config['invoice_no'], pos))})
+        singles.append(response.data)
+    manual = time.perf_counter() - start
+    print(f"cities={cities} trips={len(trips):,}  {cities} single exports {manual:6.2f} s")
+
+    for pool_size in (1, workers):
+        app.config['PARALLEL_WORKERS'] = pool_size
+        start = time.perf_counter()
+        response = client.post('/create-invoice/export-batch', json={'data': trips, 'config': config}, buffered=False)
+        chunks = iter(response.response)
+        body = [next(chunks)]
+        first_chunk = time.perf_counter() - start
+        body.extend(chunks)
+        elapsed = time.perf_counter() - start
+
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(body)))
+        for name, single in zip(archive.namelist(), singles):
+            assert json.dumps(dump(archive.read(name))) == json.dumps(dump(single)), name
+        print(f"  batch ZIP workers={pool_size}  {elapsed:6.2f} s  first chunk {first_chunk:5.2f} s  "
+              f"speedup x{manual / elapsed:.1f}  entries={len(archive.namelist())} (identical to single exports)")
@@ -0,0 +1,134 @@
+"""
+Benchmark: /create-invoice/export latency and style objects created per export.
+Posts a synthetic batch of trips to the export route through the Flask test
+client and counts Font/Border/Side/Alignment/PatternFill instances created
+and style attribute assignments hashed into the workbook during one export.
+
+Run it with --save on one checkout and --compare on another to check the two
+exports cell by cell (value, number format, font, fill, borders, alignment,
+merges, widths, heights, images).
+
+Usage: python benchmarks/create_invoice_export.py [trips] [--save ref.json | --compare ref.json]
+"""
+import io
+import os
+import sys
+import json
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openpyxl import load_workbook
+from openpyxl.styles import Font, Border, Side, Alignment, PatternFill
+from openpyxl.utils.indexed_list import IndexedList
+
+from app import app
+
+STYLE_CLASSES = [Font, Border, Side, Alignment, PatternFill]
+CONFIG = {'bill_to': 'PT GLOBAL JET EXPRESS', 'invoice_no': 'INV/2025/12/001', 'invoice_date': '2025-12-10',
+          'due_date': '2026-01-10', 'tax_mode': 'with_tax'}
+
+
+def make_trips(count):
+    routes = ['BGR-SOC-CKP', 'CRN-CKP-SMI', 'DPK-HUB-BKS', 'TNG-SOC-JKT']
+    return [{
+        'date': f'{n % 28 + 1:02d}/12/2025',
+        'rute': routes[n % len(routes)],
+        'surat_jalan': f'TG{n:010d}',
+        'jenis_mobil': 'CDD' if n % 3 else 'FUSO',
+        'trip_type': 'SEPIHAK' if n % 2 else 'PP',
+        'plat_nomor': f'B {1000 + n % 9000} XY',
+        'base_amount_raw': 850000 + (n % 4) * 125000,
+        'source_file': '22-31 Desember 2025_BGR_CSF_REPORT W4.xlsx',
+    } for n in range(count)]
+
+
+class StyleCounter:
+    """Counts style objects built and style ids looked up (hashed) while active."""
+
+    def __enter__(self):
+        self.created = 0
+        self.hashed = 0
+        self._originals = {cls: cls.__init__ for cls in STYLE_CLASSES}
+        self._add = IndexedList.add
+        counter = self
+
+        def counting(original):
+            def __init__(self, *args, **kwargs):
+                counter.created += 1
+                original(self, *args, **kwargs)
+            return __init__
+
+        def add(self, value):
+            counter.hashed += 1
+            return counter._add(self, value)
+
+        for cls, original in self._originals.items():
+            cls.__init__ = counting(original)
+        IndexedList.add = add
+        return self
+
+    def __exit__(self, *exc):
+        for cls, original in self._originals.items():
+            cls.__init__ = original
+        IndexedList.add = self._add
+
+
+def dump(data):
+    wb = load_workbook(io.BytesIO(data))
+    sheets = {}
+    for ws in wb.worksheets:
+        cells = [
+            [cell.coordinate, repr(cell.value), cell.number_format, cell.font.name, cell.font.sz, cell.font.b,
+             str(cell.font.color.rgb if cell.font.color else None), cell.fill.fill_type, str(cell.fill.fgColor.rgb),
+             *[getattr(getattr(cell.border, side), 'style', None) for side in ('left', 'right', 'top', 'bottom')],
+             cell.alignment.horizontal, cell.alignment.vertical, cell.alignment.wrap_text]
+            for row in ws.iter_rows() for cell in row if cell.value is not None or cell.has_style
+        ]
+        sheets[ws.title] = {
+            'cells': cells,
+            'merged': sorted(str(rng) for rng in ws.merged_cells.ranges),
+            'widths': {key: dim.width for key, dim in ws.column_dimensions.items()},
+            'heights': {key: dim.height for key, dim in ws.row_dimensions.items() if dim.height},
+            'images': [(img.width, img.height) for img in ws._images],
+        }
+    return {'sheetnames': wb.sheetnames, 'sheets': sheets}
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    reference_mode, reference_path = None, None
+    for flag in ('--save', '--compare'):
+        if flag in args:
+            pos = args.index(flag)
+            reference_mode, reference_path = flag, args[pos + 1]
+            del args[pos:pos + 2]
+    trips = make_trips(int(args[0]) if args else 750)
+    client = app.test_client()
+
+    def export():
+        response = client.post('/create-invoice/export', json={'data': trips, 'config': CONFIG})
+        assert response.status_code == 200, response.data[:200]
+        return response.data
+
+    export() # warm-up (imports, logo file cache)
+    with StyleCounter() as counter:
+        data = export()
+    runs = 5
+    start = time.perf_counter()
+    for _ in range(runs):
+        export()
+    elapsed = (time.perf_counter() - start) / runs
+    print(f"trips={len(trips)}  export {elapsed * 1000:8.1f} ms  style objects created={counter.created}  "
+          f"style index lookups incl. save={counter.hashed}")
+
+    if reference_mode == '--save':
+        with open(reference_path, 'w', encoding='utf-8') as f:
+            json.dump(dump(data), f)
+        print(f"saved reference to {reference_path}")
+    elif reference_mode == '--compare':
+        with open(reference_path, encoding='utf-8') as f:
+            reference = json.load(f)
+        current = json.loads(json.dumps(dump(data)))
+        assert current == reference, "Export differs from the reference workbook"
+        print("identical to the reference workbook, cell by cell")
@@ -0,0 +1,75 @@
+"""
+Benchmark: logo handling of the create-invoice export (INVOICE at 85 px, KWITANSI at 60 px).
+Compares the legacy per-export loading (os.path.exists + Image(path) + aspect
+ratio per sheet, and openpyxl re-reading the file on save) with the cached
+LogoRegistry, and counts how often the logo file is opened during real
+/create-invoice/export calls.
+
+Usage: python benchmarks/create_invoice_logos.py [exports]
+"""
+import os
+import sys
+import time
+import builtins
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openpyxl.drawing.image import Image
+
+from app import app
+from modules.create_invoice.logos import (
+    COMPANY_LOGOS, DEFAULT_COMPANY, INVOICE_LOGO_HEIGHT, KWITANSI_LOGO_HEIGHT, get_logo_registry
+)
+from create_invoice_export import CONFIG, make_trips
+
+LOGO_PATH = os.path.join(app.root_path, 'static', 'create_invoice', COMPANY_LOGOS[DEFAULT_COMPANY])
+
+
+def legacy_logos():
+    images = []
+    for target_height in (INVOICE_LOGO_HEIGHT, KWITANSI_LOGO_HEIGHT):
+        if os.path.exists(LOGO_PATH):
+            img = Image(LOGO_PATH)
+            aspect_ratio = img.width / img.height
+            img.height = target_height
+            img.width = int(target_height * aspect_ratio)
+            images.append(img)
+    return [(img.width, img.height, img._data()) for img in images]
+
+
+def cached_logos():
+    registry = get_logo_registry(app.root_path)
+    images = [registry.image(DEFAULT_COMPANY, h) for h in (INVOICE_LOGO_HEIGHT, KWITANSI_LOGO_HEIGHT)]
+    return [(img.width, img.height, img._data()) for img in images]
+
+
+def count_logo_opens(fn):
+    opened = []
+    real_open = builtins.open
+
+    def counting_open(file, *args, **kwargs):
+        if str(file) == LOGO_PATH:
+            opened.append(file)
+        return real_open(file, *args, **kwargs)
+
+    with mock.patch('builtins.open', counting_open):
+        fn()
+    return len(opened)
+
+
+if __name__ == '__main__':
+    exports = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    assert legacy_logos() == cached_logos(), "Cached logos differ from the files"
+
+    for label, fn in (('legacy', legacy_logos), ('registry', cached_logos)):
+        start = time.perf_counter()
+        for _ in range(exports):
+            fn()
+        elapsed = time.perf_counter() - start
+        print(f"{label:<9} {elapsed / exports * 1000:7.3f} ms per export (2 logos)  file opens per export={count_logo_opens(fn)}")
+
+    client = app.test_client()
+    trips = make_trips(20)
+    opens = count_logo_opens(lambda: client.post('/create-invoice/export', json={'data': trips, 'config': CONFIG}))
+    print(f"/create-invoice/export: logo file opened {opens} times")
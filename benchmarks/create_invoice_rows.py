@@ -0,0 +1,139 @@
+"""
+Benchmark: row extraction of /create-invoice/process on one vendor workbook.
+Compares the legacy iterrows loop against the column-wise extract_chunk_rows
+on a generated 50k-row file, in both tax modes, and checks the JSON records
+and anomalies are identical. The workbook is read once (pd.read_excel time is
+reported separately) and both extractors get the same frame, as one chunk.
+
+Usage: python benchmarks/create_invoice_rows.py [rows]
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+from datetime import datetime, date
+
+import pandas as pd
+from openpyxl import Workbook
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.common import parse_amount, MODE_THREE_DIGIT
+from modules.create_invoice.routes import extract_chunk_rows
+from modules.create_invoice.transport import columns_to_records
+
+
+def safe_float(val):
+    return parse_amount(val, mode=MODE_THREE_DIGIT)
+
+
+def legacy_rows(df, filename, tax_mode):
+    all_data = []
+    anomalies = []
+    for idx, row in df.iterrows():
+        row_num = idx + 5
+        col_a = str(row.iloc[0]).lower() if pd.notna(row.iloc[0]) else ""
+        col_d = str(row.iloc[3]).lower() if pd.notna(row.iloc[3]) else ""
+        exclude_keywords = ['total', 'dibuatkan', 'disetujui', 'sub total', 'grand total', 'manager', 'finance']
+        if any(k in col_a for k in exclude_keywords) or any(k in col_d for k in exclude_keywords):
+            continue
+        surat_jalan = row.iloc[3]
+        if pd.isna(surat_jalan) or str(surat_jalan).strip() == "":
+            continue
+        raw_date = row.iloc[10]
+        fmt_date = ""
+        try:
+            if pd.notna(raw_date):
+                if isinstance(raw_date, (pd.Timestamp, datetime, date)):
+                    fmt_date = raw_date.strftime("%d/%m/%Y")
+                else:
+                    fmt_date = str(raw_date).split()[0]
+        except:
+            fmt_date = str(raw_date)
+        item = {
+            "source_file": filename,
+            "surat_jalan": str(surat_jalan).strip(),
+            "plat_nomor": str(row.iloc[7]).strip() if pd.notna(row.iloc[7]) else "",
+            "jenis_mobil": str(row.iloc[8]).strip().upper() if pd.notna(row.iloc[8]) else "",
+            "rute": str(row.iloc[6]).strip() if pd.notna(row.iloc[6]) else "",
+            "trip_type": str(row.iloc[9]).strip().upper() if pd.notna(row.iloc[9]) else "",
+            "date": fmt_date,
+            "dpp": safe_float(row.iloc[15]) if df.shape[1] > 15 else 0,
+            "base_amount_raw": safe_float(row.iloc[15]),
+        }
+        raw_ppn = safe_float(row.iloc[20])
+        raw_pph = safe_float(row.iloc[21])
+        raw_total = safe_float(row.iloc[22])
+        if tax_mode == 'no_tax':
+            item['ppn'] = 0
+            item['pph'] = 0
+            base_amount = safe_float(row.iloc[15])
+            item['base_amount'] = base_amount
+            item['final_total'] = base_amount
+        else:
+            item['ppn'] = raw_ppn
+            item['pph'] = raw_pph
+            item['base_amount'] = safe_float(row.iloc[15])
+            item['final_total'] = raw_total
+        if item['jenis_mobil'] not in ['CDDL', 'TWB']:
+            anomalies.append(f"File {filename} Row {row_num}: Jenis Mobil '{item['jenis_mobil']}' invalid (Expected CDDL/TWB).")
+        all_data.append(item)
+    return {"data": all_data, "anomalies": anomalies}
+
+
+def make_vendor_file(rows, seed=3):
+    rng = random.Random(seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Sheet1')
+    ws.append(['Vendor report'])
+    ws.append([])
+    ws.append([])
+    ws.append([f'H{i}' for i in range(24)])
+    for n in range(rows):
+        amount = rng.randint(100, 9000) * 1000
+        row = [None] * 24
+        row[0] = n + 1
+        row[3] = f'TG{rng.randint(0, 99999):08d}' if rng.random() > 0.02 else None
+        row[6] = rng.choice(['BGR-SOC-A001', 'CRN-CKP-SMI', 'DPK-HUB-BKS'])
+        row[7] = f'B {rng.randint(1000, 9999)} XY'
+        row[8] = rng.choice(['CDDL', 'TWB', 'cddl ', 'FUSO'])
+        row[9] = rng.choice(['Sepihak', 'PP'])
+        row[10] = rng.choice([datetime(2025, 12, rng.randint(1, 28), 3, 5), '23/12/2025 0:58'])
+        row[15] = rng.choice([amount, f'{amount:,}'.replace(',', '.'), f'Rp {amount:,}'.replace(',', '.')])
+        row[20] = amount * 0.011
+        row[21] = -amount * 0.02
+        row[22] = amount * 0.991
+        ws.append(row)
+    for label in ['Sub Total', 'Dibuatkan oleh', 'Disetujui', 'Finance Manager']:
+        ws.append([label, None, None, label] + [None] * 18 + [5])
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    data = make_vendor_file(rows)
+    filename = '22-31 Desember 2025_BGR_CSF_REPORT W4.xlsx'
+
+    start = time.perf_counter()
+    df = pd.read_excel(io.BytesIO(data), header=3, engine='openpyxl')
+    print(f"rows={rows:,}  pd.read_excel {time.perf_counter() - start:.2f} s (same for both)")
+
+    for tax_mode in ('with_tax', 'no_tax'):
+        start = time.perf_counter()
+        legacy = legacy_rows(df, filename, tax_mode)
+        legacy_time = time.perf_counter() - start
+
+        # extract_chunk_rows addresses columns by sheet position
+        chunk = df.set_axis(range(df.shape[1]), axis=1)
+        start = time.perf_counter()
+        columns, anomalies = extract_chunk_rows(chunk, filename, tax_mode)
+        fast_time = time.perf_counter() - start
+        result = {"data": columns_to_records(columns), "anomalies": anomalies}
+
+        assert json.dumps(result, default=str) == json.dumps(legacy, default=str), "Extracted rows differ"
+        print(f"{tax_mode:<9} iterrows {legacy_time:7.3f} s  column-wise {fast_time:7.3f} s  "
+              f"speedup x{legacy_time / fast_time:5.1f}  records={len(result['data'])} anomalies={len(result['anomalies'])}")
@@ -0,0 +1,77 @@
+"""
+Benchmark: trip transport between /create-invoice/process and /export.
+For a batch of synthetic trips, compares the legacy record list with the
+columnar payload (encode_trips) and with the server-side handle: JSON size,
+encode time (/process response) and decode time (/export body), and checks the
+columnar payload decodes back to the same export columns.
+
+Usage: python benchmarks/create_invoice_transport.py [trips ...]
+"""
+import os
+import sys
+import json
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.create_invoice.transport import (
+    columns_to_records, records_to_columns, encode_trips, decode_trips
+)
+
+CONFIG = {'bill_to': 'PT GLOBAL JET EXPRESS', 'invoice_no': 'INV/1', 'invoice_date': '2025-12-10',
+          'due_date': '2026-01-10', 'tax_mode': 'with_tax'}
+
+
+def make_columns(count, seed=11):
+    rng = random.Random(seed)
+    files = [f'{d}-{d + 6} Desember 2025_{city}_CSF_REPORT W{w}.xlsx'
+             for d, city, w in [(1, 'BGR', 1), (8, 'CKP', 2), (15, 'BGR', 3), (22, 'DPK', 4)]]
+    base = [float(rng.randint(100, 9000) * 1000) for _ in range(count)]
+    return {
+        "source_file": [files[n * len(files) // count] for n in range(count)],
+        "surat_jalan": [f'TG{rng.randint(0, 10**8):010d}' for _ in range(count)],
+        "plat_nomor": [f'B {rng.randint(1000, 9999)} XY' for _ in range(count)],
+        "jenis_mobil": [rng.choice(['CDDL', 'TWB', 'FUSO']) for _ in range(count)],
+        "rute": [rng.choice(['BGR-SOC-CKP', 'CRN-CKP-SMI', 'DPK-HUB-BKS']) for _ in range(count)],
+        "trip_type": [rng.choice(['SEPIHAK', 'PP']) for _ in range(count)],
+        "date": [f'{rng.randint(1, 28):02d}/12/2025' for _ in range(count)],
+        "dpp": base,
+        "base_amount_raw": base,
+        "ppn": [b * 0.011 for b in base],
+        "pph": [-b * 0.02 for b in base],
+        "base_amount": base,
+        "final_total": [b * 0.991 for b in base],
+    }
+
+
+def timed(fn, runs=3):
+    start = time.perf_counter()
+    for _ in range(runs):
+        result = fn()
+    return result, (time.perf_counter() - start) / runs
+
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 50_000]
+    for count in sizes:
+        columns = make_columns(count)
+
+        # /process response
+        legacy_body, legacy_encode = timed(lambda: json.dumps({"data": columns_to_records(columns)}))
+        columnar_body, columnar_encode = timed(lambda: json.dumps({"trips": encode_trips(columns)}))
+
+        # /export request body
+        export_legacy = json.dumps({"data": json.loads(legacy_body)["data"], "config": CONFIG})
+        export_columnar = json.dumps({"trips": json.loads(columnar_body)["trips"], "config": CONFIG})
+        export_handle = json.dumps({"handle": 'x' * 32, "config": CONFIG})
+        legacy_cols, legacy_decode = timed(lambda: records_to_columns(json.loads(export_legacy)["data"]))
+        columnar_cols, columnar_decode = timed(lambda: decode_trips(json.loads(export_columnar)["trips"]))
+        assert legacy_cols == columnar_cols, "Columnar payload decodes differently"
+
+        print(f"trips={count:,}")
+        print(f"  /process response  records {len(legacy_body) / 1e6:7.2f} MB {legacy_encode * 1000:7.1f} ms   "
+              f"columnar {len(columnar_body) / 1e6:6.2f} MB {columnar_encode * 1000:7.1f} ms")
+        print(f"  /export body       records {len(export_legacy) / 1e6:7.2f} MB {legacy_decode * 1000:7.1f} ms   "
+              f"columnar {len(export_columnar) / 1e6:6.2f} MB {columnar_decode * 1000:7.1f} ms   "
+              f"handle {len(export_handle)} bytes")
@@ -0,0 +1,137 @@
+"""
+Benchmark: writing the consolidated 陆运数据核对 workbook.
+Compares the legacy DataFrame.to_excel + per-cell styling/auto-width loop
+against the write-only write_consolidated_workbook. Each run happens in a
+fresh subprocess so the peak RSS (ru_maxrss) belongs to that writer alone.
+Before timing, both writers are run on a small frame with edge values (NaN,
+inf, mixed int/float/bool, dates, long text) and compared cell by cell.
+
+Usage: python benchmarks/excel_writer.py [rows ...]
+"""
+import io
+import os
+import sys
+import json
+import time
+import resource
+import subprocess
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.invoice_generator.workbook import write_consolidated_workbook
+
+EXCEL_COLUMNS = [
+    'Agen Operasional', 'Kode Tugas', 'Nama Tugas', 'Plat Mobil',
+    'Jenis Kendaraan', 'Mode Operasi', 'Metode Perhitungan',
+    'Berat', 'Tarif Pengiriman per kg', 'Tarif Pengiriman Sistem',
+    'PPN', 'PPH', 'Total pembayaran aktual'
+]
+
+
+def legacy_write(df, columns, output):
+    from openpyxl.styles import Font, PatternFill, Border, Side, Alignment
+
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        df[columns].to_excel(writer, index=False, sheet_name='Sheet1')
+        worksheet = writer.sheets['Sheet1']
+
+        header_font = Font(name='SimSun', size=11, color="FF0000", bold=True)
+        black_header_font = Font(name='SimSun', size=11, color="000000", bold=True)
+        header_fill = PatternFill(start_color="D9D9D9", end_color="D9D9D9", fill_type="solid")
+        thin_border = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
+        center_alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
+
+        worksheet.row_dimensions[1].height = 40
+        for cell in worksheet[1]:
+            cell.font = black_header_font if cell.value in ['Berat', 'Tarif Pengiriman per kg'] else header_font
+            cell.fill = header_fill
+            cell.border = thin_border
+            cell.alignment = center_alignment
+
+        for column in worksheet.columns:
+            column = [cell for cell in column]
+            max_length = max(len(str(cell.value)) for cell in column)
+            worksheet.column_dimensions[column[0].column_letter].width = max_length + 2
+
+
+def make_frame(rows, seed=7):
+    rng = np.random.default_rng(seed)
+    agents = np.array(['PT ALPHA LOGISTIK', 'CV BETA', 'PT GAMMA TRANS NUSANTARA'], dtype=object)
+    amounts = rng.integers(100_000, 9_000_000, size=rows).astype(float)
+    return pd.DataFrame({
+        'Agen Operasional': agents[rng.integers(0, len(agents), size=rows)],
+        'Kode Tugas': [f'TG{n:010d}' for n in rng.integers(0, 10**9, size=rows)],
+        'Nama Tugas': [f'BGR-SOC-A{n % 500:03d}-CKP' for n in range(rows)],
+        'Plat Mobil': [f'B {n % 9000 + 1000} XY' for n in range(rows)],
+        'Jenis Kendaraan': np.where(rng.random(rows) < 0.5, 'CDD', 'Fuso'),
+        'Mode Operasi': 'Reguler',
+        'Metode Perhitungan': 'Per Trip',
+        'Berat': '',
+        'Tarif Pengiriman per kg': '',
+        'Tarif Pengiriman Sistem': amounts,
+        'PPN': amounts * 0.011,
+        'PPH': -amounts * 0.02,
+        'Total pembayaran aktual': amounts * 0.991,
+    })
+
+
+def edge_frame():
+    df = make_frame(6)
+    df['Berat'] = pd.Series([np.nan, 1, 1.0, True, pd.Timestamp('2024-05-01 08:30'), None], dtype=object)
+    df['Tarif Pengiriman per kg'] = pd.Series(['x' * 40, np.inf, -np.inf, np.int64(5), np.float64(0.1 + 0.2), pd.NaT], dtype=object)
+    df.loc[2, 'PPN'] = np.nan
+    df['Mode Operasi'] = pd.Series(['Reguler', None, 'Charter', 'Reguler', None, 'X'], dtype='str')
+    return df
+
+
+def dump(data):
+    ws = load_workbook(io.BytesIO(data)).active
+    cells = [
+        (cell.coordinate, repr(cell.value), cell.number_format, cell.font.name, cell.font.b, str(cell.font.color.rgb if cell.font.color else None),
+         cell.fill.fill_type, str(cell.fill.fgColor.rgb), cell.border.left.style, cell.alignment.horizontal, cell.alignment.wrap_text)
+        for row in ws.iter_rows() for cell in row
+    ]
+    widths = {key: dim.width for key, dim in ws.column_dimensions.items()}
+    return cells, widths, ws.row_dimensions[1].height
+
+
+def check():
+    for df in (edge_frame(), make_frame(0), make_frame(500)):
+        legacy, fast = io.BytesIO(), io.BytesIO()
+        legacy_write(df, EXCEL_COLUMNS, legacy)
+        write_consolidated_workbook(df, EXCEL_COLUMNS, fast)
+        assert dump(legacy.getvalue()) == dump(fast.getvalue()), "Workbooks differ"
+    print("check: legacy and write-only workbooks are identical")
+
+
+def run(writer, rows):
+    df = make_frame(rows)
+    start = time.perf_counter()
+    output = io.BytesIO()
+    (legacy_write if writer == 'legacy' else write_consolidated_workbook)(df, EXCEL_COLUMNS, output)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({"seconds": elapsed, "bytes": output.tell(),
+                      "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4 and sys.argv[1] == '--run':
+        run(sys.argv[2], int(sys.argv[3]))
+        sys.exit(0)
+
+    check()
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 300_000]
+    for rows in sizes:
+        results = {}
+        for writer in ('legacy', 'write_only'):
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), '--run', writer, str(rows)],
+                                 capture_output=True, text=True, check=True).stdout
+            results[writer] = json.loads(out.strip().splitlines()[-1])
+        legacy, fast = results['legacy'], results['write_only']
+        print(f"rows={rows:>8,}  legacy {rows / legacy['seconds']:>9,.0f} rows/s {legacy['peak_rss_mb']:7.1f} MB  "
+              f"write-only {rows / fast['seconds']:>9,.0f} rows/s {fast['peak_rss_mb']:7.1f} MB  "
+              f"speedup x{legacy['seconds'] / fast['seconds']:.1f}")
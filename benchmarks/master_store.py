@@ -0,0 +1,79 @@
+"""
+Benchmark: per-request Master Data handling for /invoice-generator/api/process.
+Compares re-reading the master Excel into a dict (old behaviour, every request)
+with the SQLite MasterStore: first import, re-upload of the same file (skipped
+by hash), and the bulk lookup of one batch of codes. Then checks the import
+order on small masters: the file uploaded last wins, even when its bytes were
+imported before, and clear() drops every code.
+
+Usage: python benchmarks/master_store.py [master_rows] [batch_codes]
+"""
+import io
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.invoice_generator.master_store import MasterStore
+from modules.invoice_generator.routes import load_master_data
+
+
+def master_file(names):
+    buffer = io.BytesIO()
+    pd.DataFrame({'Kode Tugas': list(names), 'Nama Tugas': list(names.values())}).to_excel(buffer, index=False)
+    return buffer.getvalue()
+
+
+def timed(label, fn):
+    start = time.perf_counter()
+    result = fn()
+    print(f"{label:<34} {time.perf_counter() - start:8.3f} s")
+    return result
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    batch = int(sys.argv[2]) if len(sys.argv) > 2 else 5_000
+
+    master = pd.DataFrame({
+        'Kode Tugas': [f'TG{n:08d}' for n in range(rows)],
+        'Nama Tugas': [f'BGR-SOC-{n % 997:03d}-CKP' for n in range(rows)],
+    })
+    buffer = io.BytesIO()
+    master.to_excel(buffer, index=False)
+    data = buffer.getvalue()
+    codes = [f'TG{n:08d}' for n in range(0, rows, max(1, rows // batch))][:batch]
+    print(f"master_rows={rows} batch_codes={len(codes)} file={len(data) // 1024} KB")
+
+    mapping = timed("dict rebuild (every request)", lambda: load_master_data(io.BytesIO(data)))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = MasterStore(os.path.join(tmp, 'master.sqlite3'))
+        timed("store: first import", lambda: store.import_file(data, 'master.xlsx', load_master_data))
+        timed("store: same file uploaded again", lambda: store.import_file(data, 'master.xlsx', load_master_data))
+        found = timed("store: bulk lookup of the batch", lambda: store.lookup(codes))
+        assert found == {code: mapping[code] for code in codes}, "Store lookup differs from the dict"
+        print(f"store version={store.version()} records={store.count()}")
+
+    # --- ORDER ---
+    file_a = master_file({'X': 'NAME-A', 'Y': 'ONLY-A'})
+    file_b = master_file({'X': 'NAME-B'})
+    with tempfile.TemporaryDirectory() as tmp:
+        store = MasterStore(os.path.join(tmp, 'master.sqlite3'))
+        for data in (file_a, file_b, file_a):
+            store.import_file(data, 'master.xlsx', load_master_data)
+        assert store.lookup(['X']) == {'X': 'NAME-A'}, "A known file uploaded last must win again"
+        # One request with a new file first and a known one second: the second wins
+        store.import_file(file_b, 'b.xlsx', load_master_data)
+        store.import_file(master_file({'X': 'NAME-C'}), 'c.xlsx', load_master_data)
+        store.import_file(file_b, 'b.xlsx', load_master_data)
+        assert store.lookup(['X']) == {'X': 'NAME-B'}, "Later file in a request must win"
+        version = store.version()
+        assert store.clear() > version and store.count() == 0, "clear() must drop every code and bump the version"
+        store.import_file(file_b, 'b.xlsx', load_master_data)
+        assert store.lookup(['X', 'Y']) == {'X': 'NAME-B'}, "Replaced store must hold only the new master"
+    print("import order: last upload wins, clear() replaces the store")
@@ -0,0 +1,253 @@
+"""
+Benchmark and correctness check: shared Indonesian currency parser (modules.common.numeric).
+
+Checks, before timing, on randomized cells (well-formed and malformed amounts,
+"Rp"/"IDR" prefixes, mixed and repeated separators, signs, exponents, inf/nan
+text, unicode digits, None/NaN/NaT/pd.NA, bools, numpy scalars, inf, dates):
+- parse_amount in every mode against the parser it replaced, copied below
+  (reconciliation safe_float_convert, the nested invoice_generator one,
+  create_invoice safe_float)
+- parse_amount_series on the same cells as an object column, and on numeric,
+  nullable and bool columns, against the legacy parser applied per cell
+
+Then reports throughput in values per second for the scalar path (parse_amount
+in a loop) and the vectorized path (parse_amount_series) for every mode, on two
+data sets: every value distinct (worst case), and a vendor-like column where
+amounts repeat (tariffs per route, ~1% distinct).
+
+Usage: python benchmarks/numeric_parse.py [values] [fuzzed cells]
+"""
+import os
+import sys
+import time
+import random
+import datetime
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.common.numeric import (
+    MODE_PLAIN_FIRST, MODE_DOT_THOUSANDS, MODE_THREE_DIGIT,
+    parse_amount, parse_amount_series,
+)
+
+
+# --- LEGACY PARSERS (as they were in each blueprint) ---
+
+def legacy_reconciliation(val):
+    if val is None:
+        return 0.0
+    if isinstance(val, (int, float)):
+        return float(val)
+    s_val = str(val).lower().replace("rp", "").replace(" ", "")
+    try:
+        return float(s_val)
+    except ValueError:
+        pass
+    if "," in s_val and "." in s_val:
+        s_val = s_val.replace(".", "").replace(",", ".")
+    elif "." in s_val and s_val.count(".") > 1:
+        s_val = s_val.replace(".", "")
+    elif "," in s_val:
+        s_val = s_val.replace(",", ".")
+    try:
+        return float(s_val)
+    except ValueError:
+        return 0.0
+
+
+def legacy_invoice_generator(val):
+    try:
+        if pd.isna(val): return 0.0
+        if isinstance(val, (int, float)):
+            return float(val)
+        s = str(val).strip().replace('Rp', '').replace('IDR', '').strip()
+        if '.' in s and ',' in s:
+            if s.rfind(',') > s.rfind('.'):
+                s = s.replace('.', '').replace(',', '.')
+            else:
+                s = s.replace(',', '')
+        elif '.' in s:
+            s = s.replace('.', '')
+        elif ',' in s:
+            s = s.replace(',', '.')
+        return float(s)
+    except Exception:
+        return None
+
+
+def legacy_create_invoice(val):
+    if val is None:
+        return 0.0
+    if isinstance(val, (int, float)):
+        return float(val)
+    s_val = str(val).strip().replace("Rp", "").replace(" ", "")
+    if not s_val:
+        return 0.0
+    if "," in s_val and "." in s_val:
+        if s_val.rfind(',') > s_val.rfind('.'):
+            s_val = s_val.replace('.', '').replace(',', '.')
+        else:
+            s_val = s_val.replace(',', '')
+    elif "." in s_val:
+        if s_val.count(".") > 1:
+            s_val = s_val.replace(".", "")
+        else:
+            parts = s_val.split(".")
+            if len(parts[1]) == 3:
+                s_val = s_val.replace(".", "")
+    elif "," in s_val:
+        s_val = s_val.replace(",", ".")
+    try:
+        return float(s_val)
+    except:
+        return 0.0
+
+
+LEGACY = {
+    MODE_PLAIN_FIRST: legacy_reconciliation,
+    MODE_DOT_THOUSANDS: legacy_invoice_generator,
+    MODE_THREE_DIGIT: legacy_create_invoice,
+}
+
+
+# --- RANDOMIZED EQUIVALENCE ---
+
+PREFIXES = ['', '', '', 'Rp', 'Rp ', 'Rp. ', 'rp', 'RP ', 'IDR', 'IDR ', 'idr ', ' ', '\t', 'Rp IDR ', 'IDRRp']
+SUFFIXES = ['', '', '', ' ', ',-', '.-', ',00', '.00', 'e3', 'E-2', 'e', '%', ' Rp', 'IDR', '\n']
+SEPARATORS = ['.', ',', ' ', '', "'", '_']
+SPECIAL = [
+    '', ' ', '-', '+', '.', ',', '.,', ',.', '..', ',,', '.5', '5.', ',5', '5,', '-.5', '+,5', '--1', '+-1', '1-',
+    'inf', '-inf', '+inf', 'Infinity', 'INF', 'nan', 'NaN', '-nan', 'none', 'None', 'null', 'Rp', 'IDR', 'RpIDR',
+    '1e', '1e5', '1E+5', '1.5e3', '1,5e3', '0x10', '1_000', '1__0', '١٢٣', '１２３', '1.2.3,4,5', '1,2,3.4.5',
+    'İ1', 'ß', 'Ⅻ', '½', '1\u00a0000', 'Rp\u00a01.000', '1.0000', '1.00', '1.000.000', '1,000,000', '0.000',
+]
+
+
+def random_amount(rng):
+    """One cell as it might appear in a vendor or invoice sheet, well-formed or not."""
+    kind = rng.random()
+    if kind < 0.12:
+        return rng.choice(SPECIAL)
+    if kind < 0.25:
+        return rng.choice([
+            None, float('nan'), np.nan, pd.NA, pd.NaT, True, False, np.bool_(True), float('inf'), float('-inf'),
+            0, -0.0, rng.randint(-10**12, 10**12), rng.uniform(-1e7, 1e7), 2 ** 63, np.int64(rng.randint(0, 10**9)),
+            np.float64(rng.uniform(0, 1e6)), np.float32(1.5), Decimal('1234.50'), datetime.date(2025, 12, 1),
+            datetime.datetime(2025, 12, 1, 8, 30),
+        ])
+    # Digit groups joined by one or two separator styles, with optional decimals
+    groups = [str(rng.randint(1, 999))] + [f"{rng.randint(0, 999):03d}" for _ in range(rng.randint(0, 5))]
+    if rng.random() < 0.15:
+        groups = [str(rng.randint(0, 10 ** rng.randint(1, 20)))]
+    thousands = rng.choice(SEPARATORS)
+    text = groups[0]
+    for group in groups[1:]:
+        text += (rng.choice(SEPARATORS) if rng.random() < 0.1 else thousands) + group
+    if rng.random() < 0.4:
+        text += rng.choice(['.', ',', ',', '.']) + str(rng.randint(0, 10 ** rng.randint(1, 4)))
+    sign = rng.choice(['', '', '', '-', '+', ' -', '- '])
+    text = rng.choice(PREFIXES) + sign + text + rng.choice(SUFFIXES)
+    if rng.random() < 0.05:
+        pos = rng.randint(0, len(text))
+        text = text[:pos] + rng.choice('.,xRpI -') + text[pos:]
+    return text
+
+
+def same(a, b):
+    """Equal floats, both NaN, or both None."""
+    if a is None or b is None:
+        return a is None and b is None
+    return a == b or (a != a and b != b)
+
+
+def expected_series(values, legacy):
+    """The legacy parser mapped over a column, as the blueprints did (None becomes NaN)."""
+    return np.array([np.nan if r is None else r for r in map(legacy, values)], dtype=float)
+
+
+def check(count, seed=5):
+    rng = random.Random(seed)
+    values = [random_amount(rng) for _ in range(count)]
+    numbers = [rng.choice([rng.randint(-10**9, 10**9), rng.uniform(-1e9, 1e9), float('nan'), float('inf')])
+               for _ in range(2000)]
+    columns = {
+        "object": pd.Series(values, dtype=object),
+        "float64": pd.Series([float(v) for v in numbers]),
+        "int64": pd.Series([rng.randint(-10**12, 10**12) for _ in range(2000)]),
+        "Int64": pd.Series([rng.choice([None, rng.randint(-10**6, 10**6)]) for _ in range(2000)], dtype='Int64'),
+        "bool": pd.Series([rng.random() < 0.5 for _ in range(2000)]),
+        "str": pd.Series([v for v in values if isinstance(v, str)], dtype='str'),
+    }
+
+    for mode, legacy in LEGACY.items():
+        for val in values:
+            got, want = parse_amount(val, mode), legacy(val)
+            assert same(got, want), f"{mode}: parse_amount({val!r}) = {got!r}, legacy {want!r}"
+        for dtype, column in columns.items():
+            raw = column.tolist() if dtype not in ('Int64', 'str') else list(column.astype(object))
+            got = parse_amount_series(column, mode).to_numpy()
+            want = expected_series(raw, legacy)
+            bad = np.flatnonzero(~((got == want) | (np.isnan(got) & np.isnan(want))))
+            assert not len(bad), (f"{mode}: parse_amount_series on a {dtype} column differs at {len(bad)} cells, "
+                                  f"e.g. {raw[bad[0]]!r} -> {got[bad[0]]!r}, legacy {want[bad[0]]!r}")
+    print(f"equivalence: {count:,} fuzzed cells and {len(columns)} column types match the legacy parsers in every mode")
+
+
+def make_values(count, distinct=None, seed=11):
+    rng = np.random.default_rng(seed)
+    if distinct:
+        amounts = rng.choice(rng.integers(1_000, 50_000_000, size=distinct), size=count)
+    else:
+        amounts = rng.integers(1_000, 50_000_000, size=count)
+    cents = rng.integers(0, 100, size=count) if not distinct else np.zeros(count, dtype=int)
+    styles = rng.integers(0, 6, size=count)
+
+    values = []
+    for amount, cent, style in zip(amounts.tolist(), cents.tolist(), styles.tolist()):
+        grouped = f"{amount:,}".replace(',', '.')
+        if style == 0:
+            values.append(amount)
+        elif style == 1:
+            values.append(f"Rp {grouped},{cent:02d}")
+        elif style == 2:
+            values.append(grouped)
+        elif style == 3:
+            values.append(f"{amount:,}.{cent:02d}")
+        elif style == 4:
+            values.append(f"{amount},{cent:02d}")
+        else:
+            values.append(None)
+    return pd.Series(values, dtype=object)
+
+
+def best_of(fn, repeat=3):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    check(int(sys.argv[2]) if len(sys.argv) > 2 else 60_000)
+    for label, distinct in (("all distinct", None), ("1% distinct", max(count // 100, 1))):
+        series = make_values(count, distinct)
+        raw = series.tolist()
+
+        print(f"values={count:,} ({label})")
+        for mode in (MODE_PLAIN_FIRST, MODE_DOT_THOUSANDS, MODE_THREE_DIGIT):
+            t_scalar, scalar = best_of(lambda: [parse_amount(v, mode) for v in raw])
+            t_vector, vector = best_of(lambda: parse_amount_series(series, mode))
+
+            expected = np.array([np.nan if v is None else v for v in scalar], dtype=float)
+            assert np.array_equal(vector.to_numpy(), expected, equal_nan=True), f"{mode}: scalar/vector mismatch"
+
+            print(f"  {mode:<14} scalar {count / t_scalar:>12,.0f} values/s   "
+                  f"vectorized {count / t_vector:>12,.0f} values/s   ({t_scalar / t_vector:.1f}x)")
@@ -0,0 +1,64 @@
+"""
+Benchmark: scanning reconciliation invoices (process_single_file) with
+1, 2, 4 and 8 workers on process and thread pools. Reports files per second
+and checks the results match the serial scan in upload order.
+
+Usage: python benchmarks/reconciliation_scan.py [files]
+"""
+import datetime
+import io
+import os
+import sys
+import time
+
+from openpyxl import Workbook
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.common import EXECUTOR_PROCESS, EXECUTOR_THREAD, run_ordered
+from modules.reconciliation.routes import scan_invoice_file
+
+
+def make_invoice(number, detail_rows=300):
+    """An INVOICE sheet with the header cells plus a long RINCIAN sheet, like vendor exports."""
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'INVOICE'
+    ws['B7'] = 'PT GLOBAL JET EXPRESS'
+    ws['B12'] = 'PT GLOBAL JET EXPRESS'
+    ws['J8'] = f'INV/{number:05d}'
+    ws['J13'] = datetime.datetime(2025, 12, 10)
+    ws['K13'] = 'Currency\nIDR'
+    ws['K15'] = datetime.datetime(2026, 1, 10)
+    for row, (label, value) in enumerate([
+        ('Total Diskon', 0),
+        ('Total Dasar Pengenaan Pajak', 8_460_000 + number),
+        ('Total PPN (1.1%)', 93_060),
+        ('Total PPh 23 (2%)', 169_200),
+    ], start=30):
+        ws[f'H{row}'] = label
+        ws[f'K{row}'] = value
+
+    detail = wb.create_sheet('RINCIAN KENDARAAN')
+    for row in range(1, detail_rows + 1):
+        detail.append([row, '01/12/2025', 'BGR-SOC-A001', f'TG{row:08d}', 'CDDL', 'SINGLE TRIP', 'B 1234 XX', 1_410_000])
+
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    template = [make_invoice(n) for n in range(8)]
+    items = [(f'invoice_{n:03d}.xlsx', template[n % len(template)]) for n in range(count)]
+
+    baseline = run_ordered(scan_invoice_file, items, workers=1)
+    print(f"files={count} cpus={os.cpu_count()}")
+    for executor in (EXECUTOR_PROCESS, EXECUTOR_THREAD):
+        for workers in (1, 2, 4, 8):
+            start = time.perf_counter()
+            results = run_ordered(scan_invoice_file, items, workers=workers, executor=executor)
+            elapsed = time.perf_counter() - start
+            assert results == baseline, "Parallel scan returned different results or order"
+            print(f"{executor:<8} workers={workers}  {count / elapsed:8.1f} files/s")
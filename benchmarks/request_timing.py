@@ -0,0 +1,120 @@
+"""
+Check and benchmark: per-stage timings (modules.common.timing).
+
+Sends the processing and export requests inline, as a job and as a stream and
+checks that every one ends up in /metrics, that Server-Timing lists the stages
+(job results included), that the files' stages add up to the per-file records
+and that ?profile=1 writes a profile (for the job, of the work on its thread)
+into a private PROFILE_DIR, with only its file name in X-Profile.
+Then measures what the instrumentation costs: a stage() block outside any
+request, inside one, and a vendor file parsed with and without time_call.
+
+Usage: python benchmarks/request_timing.py [rows per file]
+"""
+import io
+import os
+import re
+import sys
+import time
+import pstats
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from modules.common.timing import STAGES, stage, time_call
+from modules.create_invoice.routes import extract_invoice_rows
+from create_invoice_rows import make_vendor_file
+from create_invoice_export import CONFIG
+from async_jobs import run_job
+
+SAMPLE = re.compile(r'^[a-z_]+(\{[a-z_]+="[^"]*"(,[a-z_]+="[^"]*")*\})? -?[0-9.]+(e[+-]?[0-9]+)?$')
+
+
+def metrics(client):
+    text = client.get('/metrics').get_data(as_text=True)
+    for line in text.splitlines():
+        assert line.startswith('# ') or SAMPLE.match(line), f"bad metrics line: {line}"
+    return text
+
+
+def server_timing(response):
+    header = response.headers.get('Server-Timing', '')
+    return {part.split(';')[0].strip(): float(re.search(r'dur=([0-9.]+)', part).group(1)) for part in header.split(',') if part}
+
+
+def per_call(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    app.config['RESULT_CACHE_BACKEND'] = 'none'
+    app.config['DOWNLOAD_MODE'] = 'server'
+    app.config['SERVER_TIMING'] = True
+    app.config['TIMING_LOG'] = False
+    app.config['PROFILE_DIR'] = os.path.join(tempfile.mkdtemp(prefix='profiles_'), 'profiles') # created by the request
+    vendor = make_vendor_file(rows)
+
+    def upload(**fields):
+        return {'data': dict(fields, files=[(io.BytesIO(vendor), f'1-7 Desember 2025_C{n}_X.xlsx') for n in range(2)]),
+                'content_type': 'multipart/form-data'}
+
+    with app.test_client() as client:
+        inline = client.post('/create-invoice/process?profile=1', **upload(format='columnar'))
+        timing = server_timing(inline)
+        assert {'read', 'clean', 'validate', 'serialize', 'total'} <= set(timing), timing
+        assert os.sep not in inline.headers['X-Profile'], 'X-Profile exposes a server path'
+        profile = os.path.join(app.config['PROFILE_DIR'], inline.headers['X-Profile'])
+        assert os.path.exists(profile), 'no profile written'
+        assert os.stat(app.config['PROFILE_DIR']).st_mode & 0o077 == 0, 'profile directory is not private'
+        pstats.Stats(profile)
+        print(f"create-invoice inline    Server-Timing {', '.join(f'{k}={v:.0f}ms' for k, v in timing.items())}")
+
+        handle = inline.get_json()['handle']
+        export = client.post('/create-invoice/export', json={'handle': handle, 'config': CONFIG})
+        assert {'read', 'write', 'total'} <= set(server_timing(export)), export.headers.get('Server-Timing')
+
+        _, _, _, job_result = run_job(client, '/invoice-generator/api/process', **upload(filename_suffix='W1'))
+        timing = server_timing(job_result)
+        assert set(timing) - {'total'} <= set(STAGES) and 'read' in timing, timing
+        print(f"generator job result     Server-Timing {', '.join(f'{k}={v:.0f}ms' for k, v in timing.items())}")
+
+        accepted = client.post('/create-invoice/process?async=1&profile=1', **upload(format='columnar')).get_json()
+        while client.get(accepted['status_url']).get_json()['status'] not in ('done', 'failed'):
+            time.sleep(0.05)
+        profile = os.path.join(app.config['PROFILE_DIR'], client.get(accepted['result_url']).headers['X-Profile'])
+        functions = {func[2] for func in pstats.Stats(profile).stats}
+        assert 'extract_invoice_rows' in functions or 'run_cached' in functions, 'job profile misses the work'
+
+        streamed = client.post('/create-invoice/process?stream=ndjson', buffered=False, **upload(format='columnar'))
+        assert b'"event": "done"' in b''.join(streamed.response)
+        time.sleep(0.1) # the stream's thread finishes the timings after the last event
+
+        text = metrics(client)
+        for endpoint in ('create_invoice.process_files', 'create_invoice.export_excel', 'invoice_generator.process_files'):
+            assert f'autorecap_request_duration_seconds_count{{endpoint="{endpoint}"}}' in text, endpoint
+        processed = re.search(r'autorecap_request_duration_seconds_count\{endpoint="create_invoice.process_files"\} (\d+)', text)
+        assert int(processed.group(1)) == 3, 'inline, job and stream requests are all counted'
+        print(f"/metrics: {len(text.splitlines())} lines, all samples well-formed")
+
+    # --- OVERHEAD ---
+    item = ('1-7 Desember 2025_C1_X.xlsx', vendor)
+    context = {'tax_mode': 'with_tax'}
+    noop = per_call(lambda: stage('read').__enter__(), 100_000)
+    with app.test_request_context('/'):
+        app.preprocess_request()
+        def timed_block():
+            with stage('read') as size:
+                size["rows"] = 1
+        recorded = per_call(timed_block, 100_000)
+    plain = min(per_call(lambda: extract_invoice_rows(item, context), 1) for _ in range(3))
+    timed = min(per_call(lambda: time_call(extract_invoice_rows, item, context), 1) for _ in range(3))
+    _, record = time_call(extract_invoice_rows, item, context)
+    calls = sum(entry['calls'] for entry in record['stages'].values())
+    print(f"stage() outside a request {noop * 1e6:5.2f} us, recorded {recorded * 1e6:5.2f} us "
+          f"({calls} stage calls per {rows:,}-row file)")
+    print(f"extract_invoice_rows      plain {plain:6.3f} s, timed {timed:6.3f} s ({(timed / plain - 1) * 100:+.1f}%)")
@@ -0,0 +1,58 @@
+"""
+Benchmark: re-uploading a reconciliation batch where only one file changed.
+Posts 30 invoices to /reconciliation/process cold, then again with one file
+replaced, and reports request time plus the result cache hit/miss counters.
+Also checks that a file that fails to parse is not cached (the failure may be
+transient), so uploading it again parses it again.
+
+Usage: python benchmarks/result_cache.py [files] [detail_rows]
+"""
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import app
+from reconciliation_scan import make_invoice
+
+
+def post(client, payloads):
+    files = [(io.BytesIO(data), name) for name, data in payloads]
+    start = time.perf_counter()
+    response = client.post('/reconciliation/process', data={'files': files}, content_type='multipart/form-data')
+    elapsed = time.perf_counter() - start
+    assert response.status_code == 200
+    return response.get_json(), elapsed
+
+
+def check_failures(client):
+    before = client.get('/api/cache-stats').get_json()
+    for _ in range(2):
+        results, _ = post(client, [('broken.xlsx', b'not a workbook')])
+        assert results[0]['status'] == 'failed', results
+    after = client.get('/api/cache-stats').get_json()
+    assert after['entries'] == before['entries'], "A failed file was cached"
+    assert after['misses'] == before['misses'] + 2 and after['hits'] == before['hits'], "A failed file was served from the cache"
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    detail_rows = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    app.config['PARALLEL_WORKERS'] = 1
+    client = app.test_client()
+
+    payloads = [(f'invoice_{n:03d}.xlsx', make_invoice(n, detail_rows)) for n in range(count)]
+    cold, cold_time = post(client, payloads)
+    payloads[-1] = (payloads[-1][0], make_invoice(10_000, detail_rows))
+    warm, warm_time = post(client, payloads)
+    assert warm[:-1] == cold[:-1], "Cached results differ from the parsed ones"
+    check_failures(client)
+
+    stats = client.get('/api/cache-stats').get_json()
+    print(f"files={count} detail_rows={detail_rows} backend={stats['backend']}")
+    print(f"cold upload           {cold_time:8.3f} s")
+    print(f"re-upload, 1 changed  {warm_time:8.3f} s")
+    print(f"hits={stats['hits']} misses={stats['misses']} entries={stats['entries']} size={stats['size_bytes']} bytes")
@@ -0,0 +1,182 @@
+"""
+Benchmark: reading a large vendor workbook with pd.read_excel(header=3) versus
+streaming only the used columns with SheetChunks (modules.common.sheet_reader).
+
+Each reader runs in a fresh subprocess so its peak RSS (VmHWM) is its own;
+the growth over the RSS after imports is what reading the file cost.
+Before timing, the chunks are checked against read_excel: the same frame
+(dtypes included) when the sheet fits in one chunk, the same values with small
+chunks, on the generated file and on an edge-case sheet (blank rows inside and
+after the data, error cells, short rows). The create-invoice and
+invoice-generator per-file results must not depend on the chunk size either.
+With min_width (the routes' 23 columns), a narrow sheet must yield nothing and
+convert only its first chunk, and one widened by a late row must still yield
+every chunk.
+
+Usage: python benchmarks/sheet_reader.py [rows] [chunk rows]
+"""
+import io
+import os
+import sys
+import json
+import time
+import resource
+import subprocess
+from datetime import datetime
+
+import pandas as pd
+from openpyxl import Workbook
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.common.sheet_reader import SheetChunks
+from modules.create_invoice.routes import INVOICE_COLUMNS, extract_invoice_rows
+from modules.invoice_generator.routes import VENDOR_COLUMNS, process_vendor_file
+from create_invoice_rows import make_vendor_file
+
+COLUMNS = sorted(set(INVOICE_COLUMNS) | set(VENDOR_COLUMNS))
+
+
+def edge_file():
+    wb = Workbook()
+    ws = wb.active
+    ws.append(['Vendor report'])
+    ws.append([])
+    ws.append([None] * 25 + ['wide pre-header cell'])
+    ws.append([f'H{i}' for i in range(23)])
+    ws.append([1, 'AGN', None, 'TG1', None, None, 'BGR-SOC-A001', 'B 1 XY', 'CDDL', 'PP', datetime(2025, 12, 3, 4, 5)]
+              + [None] * 4 + ['1.000.000'] + [None] * 4 + [11000.0, -20000.5, 991000])
+    ws.append([])
+    ws.append([2, 'AGN', None, 'TG2', None, None, ' CRN ', None, 'twb', 'Sepihak', '23/12/2025 0:58'])
+    ws.append([3, 'AGN', None, '=1/0', None, None, '#N/A'] + [None] * 15 + ['x'])
+    ws.append([4.0, 'AGN', None, 5.5] + [None] * 18 + [7.0])
+    ws.append(['Sub Total'] + [None] * 21 + [5])
+    ws.append([])
+    ws.append([None, None])
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def read_chunks(data, chunk_rows):
+    reader = SheetChunks(data, COLUMNS, header=3, chunk_rows=chunk_rows)
+    chunks = list(reader)
+    return reader, pd.concat(chunks) if len(chunks) > 1 else chunks[0]
+
+
+def check(data, name):
+    full = pd.read_excel(io.BytesIO(data), header=3, engine='openpyxl')
+    expected = full.iloc[:, [pos for pos in COLUMNS if pos < full.shape[1]]].set_axis(
+        [pos for pos in COLUMNS if pos < full.shape[1]], axis=1).reindex(columns=COLUMNS)
+
+    reader, frame = read_chunks(data, 1_000_000)
+    assert reader.width == full.shape[1], f"{name}: width {reader.width} != {full.shape[1]}"
+    pd.testing.assert_frame_equal(frame, expected, check_dtype=full.shape[1] > max(COLUMNS))
+    for chunk_rows in (1, 3, 1000):
+        _, frame = read_chunks(data, chunk_rows)
+        pd.testing.assert_frame_equal(frame.astype(object), expected.astype(object), check_dtype=False)
+
+    item = (f'1-7 Desember 2025_{name}.xlsx', data)
+    for chunk_rows in (1, 3):
+        for tax_mode in ('with_tax', 'no_tax'):
+            context = {'tax_mode': tax_mode}
+            assert json.dumps(extract_invoice_rows(item, dict(context, chunk_rows=chunk_rows))) == \
+                json.dumps(extract_invoice_rows(item, context)), \
+                f"{name}: create-invoice rows depend on the chunk size"
+        whole = process_vendor_file(item, {})
+        chunked = process_vendor_file(item, {'chunk_rows': chunk_rows})
+        assert json.dumps([chunked['summary'], chunked['missing_codes']]) == json.dumps([whole['summary'], whole['missing_codes']]), \
+            f"{name}: invoice-generator results depend on the chunk size"
+        if whole['frame'] is not None:
+            pd.testing.assert_frame_equal(chunked['frame'].astype(object), whole['frame'].astype(object), check_dtype=False)
+    print(f"{name}: chunks match read_excel ({len(expected)} rows, width {full.shape[1]})")
+
+
+def narrow_file(rows, wide_row=None):
+    """rows of 10 columns under a 10-column header; wide_row (data row index) gets 23 cells."""
+    wb = Workbook()
+    ws = wb.active
+    for _ in range(3):
+        ws.append(['Vendor report'])
+    ws.append([f'H{i}' for i in range(10)])
+    for n in range(rows):
+        ws.append([n, 'AGN', None, f'TG{n}'] + [None] * 5 + ['x'] + ([None] * 12 + [1000] if n == wide_row else []))
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+class CountingChunks(SheetChunks):
+    converted = 0
+
+    def _frame(self, rows, start):
+        self.converted += len(rows)
+        return super()._frame(rows, start)
+
+
+def check_min_width():
+    reader = CountingChunks(narrow_file(50), COLUMNS, header=3, chunk_rows=5, min_width=23)
+    assert list(reader) == [] and reader.width == 10, "narrow sheet: no chunks, width still reported"
+    assert reader.converted == 5, f"narrow sheet: {reader.converted} rows converted, only the first chunk should be"
+
+    data = narrow_file(50, wide_row=40)
+    item = ('1-7 Desember 2025_late.xlsx', data)
+    reader = SheetChunks(data, COLUMNS, header=3, chunk_rows=5, min_width=23)
+    pd.testing.assert_frame_equal(pd.concat(list(reader)), read_chunks(data, 5)[1])
+    assert reader.width == 23
+    context = {'tax_mode': 'with_tax'}
+    assert json.dumps(extract_invoice_rows(item, dict(context, chunk_rows=5))) == json.dumps(extract_invoice_rows(item, context))
+    assert json.dumps(process_vendor_file(item, {'chunk_rows': 5})['summary']) == json.dumps(process_vendor_file(item, {})['summary'])
+    print("min_width: narrow sheet stops converting after its first chunk, a late wide row re-reads it")
+
+
+def peak_rss_mb():
+    # ru_maxrss keeps the parent's high-water mark across fork + exec; VmHWM starts fresh
+    try:
+        with open('/proc/self/status') as f:
+            return next(int(line.split()[1]) for line in f if line.startswith('VmHWM')) / 1024
+    except (OSError, StopIteration):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run(reader, path, chunk_rows):
+    baseline_mb = peak_rss_mb() # interpreter + imports
+    start = time.perf_counter()
+    if reader == 'read_excel':
+        df = pd.read_excel(path, header=3, engine='openpyxl')
+        rows, kept_mb = len(df), df.memory_usage(deep=True).sum() / 2**20
+    else:
+        rows, kept_mb = 0, 0
+        for chunk in SheetChunks(path, COLUMNS, header=3, chunk_rows=chunk_rows):
+            rows += len(chunk)
+            kept_mb = max(kept_mb, chunk.memory_usage(deep=True).sum() / 2**20)
+    print(json.dumps({"seconds": time.perf_counter() - start, "rows": rows, "frame_mb": kept_mb,
+                      "baseline_mb": baseline_mb, "peak_rss_mb": peak_rss_mb()}))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 5 and sys.argv[1] == '--run':
+        run(sys.argv[2], sys.argv[3], int(sys.argv[4]))
+        sys.exit(0)
+
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    chunk_rows = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+    check(edge_file(), 'edge')
+    check(make_vendor_file(2000), 'generated')
+    check_min_width()
+
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), f'_sheet_reader_{rows}.xlsx')
+    with open(path, 'wb') as f:
+        f.write(make_vendor_file(rows))
+    try:
+        print(f"rows={rows:,} ({os.path.getsize(path) / 2**20:.1f} MB), chunk_rows={chunk_rows:,}")
+        for reader in ('read_excel', 'chunks'):
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), '--run', reader, path, str(chunk_rows)],
+                                 capture_output=True, text=True, check=True).stdout
+            result = json.loads(out.strip().splitlines()[-1])
+            label = 'frame' if reader == 'read_excel' else 'largest chunk'
+            print(f"{reader:<11} {result['seconds']:6.1f} s  peak RSS {result['peak_rss_mb']:6.1f} MB "
+                  f"(+{result['peak_rss_mb'] - result['baseline_mb']:5.1f} MB over imports)  "
+                  f"{label} {result['frame_mb']:5.1f} MB  rows={result['rows']:,}")
+    finally:
+        os.remove(path)
@@ -0,0 +1,114 @@
+"""
+Benchmark and correctness check: amounts in Indonesian words (modules.create_invoice.terbilang).
+
+Checks, before timing:
+- every triplet 0-999, alone and at every scale (n * 1000^k, n * 1000^k + 1),
+  against the legacy recursive terbilang (whitespace normalised) below 10^12
+  and against a spelled-out reference for TRILIUN / KUADRILIUN
+- random amounts below 10^12 against the legacy version
+- sen decimals and float noise (x.9999999 rounds to the next rupiah)
+
+Then times the legacy and iterative versions on invoice-like totals.
+
+Usage: python benchmarks/terbilang.py [amounts]
+"""
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.create_invoice.terbilang import SCALES, MAX_AMOUNT, terbilang, terbilang_rupiah, triplet_words
+
+
+def legacy_terbilang(n):
+    satuan = ["", "SATU", "DUA", "TIGA", "EMPAT", "LIMA", "ENAM", "TUJUH", "DELAPAN", "SEMBILAN", "SEPULUH", "SEBELAS"]
+    n = int(n)
+    if n >= 0 and n <= 11:
+        return " " + satuan[n]
+    elif n < 20:
+        return legacy_terbilang(n % 10) + " BELAS"
+    elif n < 100:
+        return legacy_terbilang(n / 10) + " PULUH" + legacy_terbilang(n % 10)
+    elif n < 200:
+        return " SERATUS" + legacy_terbilang(n - 100)
+    elif n < 1000:
+        return legacy_terbilang(n / 100) + " RATUS" + legacy_terbilang(n % 100)
+    elif n < 2000:
+        return " SERIBU" + legacy_terbilang(n - 1000)
+    elif n < 1000000:
+        return legacy_terbilang(n / 1000) + " RIBU" + legacy_terbilang(n % 1000)
+    elif n < 1000000000:
+        return legacy_terbilang(n / 1000000) + " JUTA" + legacy_terbilang(n % 1000000)
+    elif n < 1000000000000:
+        return legacy_terbilang(n / 1000000000) + " MILYAR" + legacy_terbilang(n % 1000000000)
+    else:
+        return ""
+
+
+def legacy_words(n):
+    return " ".join(legacy_terbilang(n).split()) or "NOL"
+
+
+def check():
+    checked = 0
+    for n in range(1000):
+        assert terbilang(n) == legacy_words(n), n
+        assert triplet_words(n) == (legacy_words(n) if n else ""), n
+        for scale in range(1, len(SCALES)):
+            for value in (n * 1000 ** scale, n * 1000 ** scale + 1):
+                if value == 0:
+                    continue
+                if value < 10 ** 12:
+                    expected = legacy_words(value)
+                else:
+                    head = "SERIBU" if (n, scale) == (1, 1) else f"{triplet_words(n)} {SCALES[scale]}"
+                    expected = " ".join(part for part in (head if n else "", "SATU" if value % 1000 else "") if part)
+                assert terbilang(value) == expected, (value, terbilang(value), expected)
+                checked += 1
+
+    rng = random.Random(5)
+    for _ in range(100_000):
+        value = rng.randrange(10 ** rng.randint(1, 12))
+        assert terbilang(value) == legacy_words(value), value
+    checked += 100_000
+
+    assert terbilang(MAX_AMOUNT).startswith("SEMBILAN RATUS SEMBILAN PULUH SEMBILAN KUADRILIUN")
+    assert terbilang(10 ** 12) == "SATU TRILIUN"
+    assert terbilang(-1500) == "MINUS SERIBU LIMA RATUS"
+    assert terbilang(12345678.9999999) == "DUA BELAS JUTA TIGA RATUS EMPAT PULUH LIMA RIBU ENAM RATUS TUJUH PULUH SEMBILAN"
+    assert terbilang(1234.56) == "SERIBU DUA RATUS TIGA PULUH EMPAT"
+    assert terbilang_rupiah(1234.56) == "SERIBU DUA RATUS TIGA PULUH EMPAT RUPIAH"
+    assert terbilang_rupiah(1234.56, sen=True) == "SERIBU DUA RATUS TIGA PULUH EMPAT RUPIAH LIMA PULUH ENAM SEN"
+    assert terbilang_rupiah(1000.0, sen=True) == "SERIBU RUPIAH"
+    assert terbilang_rupiah(0.05, sen=True) == "NOL RUPIAH LIMA SEN"
+    try:
+        terbilang(MAX_AMOUNT + 1)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("MAX_AMOUNT + 1 should raise")
+    print(f"check: {checked:,} amounts, all triplets at every scale, sen and rounding cases OK")
+
+
+if __name__ == '__main__':
+    check()
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rng = random.Random(9)
+    amounts = [rng.randint(1, 5_000_000) * 1000 * 0.991 for _ in range(count)]
+
+    start = time.perf_counter()
+    for amount in amounts:
+        legacy_terbilang(amount)
+    legacy_time = time.perf_counter() - start
+
+    triplet_words.cache_clear()
+    start = time.perf_counter()
+    for amount in amounts:
+        terbilang(amount)
+    fast_time = time.perf_counter() - start
+
+    info = triplet_words.cache_info()
+    print(f"amounts={count:,}  recursive {count / legacy_time:>10,.0f}/s  iterative {count / fast_time:>10,.0f}/s  "
+          f"speedup x{legacy_time / fast_time:.1f}  triplet cache hits={info.hits:,} misses={info.misses}")
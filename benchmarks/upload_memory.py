@@ -0,0 +1,77 @@
+"""
+Benchmark: peak memory of concurrent /create-invoice/process uploads with and
+without the in-flight memory budget (modules.common.uploads).
+
+Several client threads post the same batch of generated vendor workbooks at
+once. Each run happens in a fresh subprocess; it reports wall time, the peak
+RSS of the server process (ru_maxrss), the peak_memory_mb each request reported
+in its summary, and how many requests were queued or rejected.
+
+Usage: python benchmarks/upload_memory.py [clients] [files per request] [rows per file]
+"""
+import io
+import os
+import sys
+import json
+import time
+import resource
+import threading
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def run(budget_mb, clients, files, rows):
+    from app import app
+    from modules.common.uploads import estimate_request_memory, row_factor, MB
+    from modules.create_invoice.routes import RESULT_ROW_BYTES
+    from create_invoice_rows import make_vendor_file
+
+    data = make_vendor_file(rows)
+    app.config['RESULT_CACHE_BACKEND'] = 'none'
+    app.config['UPLOAD_QUEUE_TIMEOUT'] = 600
+    per_request = estimate_request_memory([len(data)] * files, result_factor=row_factor(RESULT_ROW_BYTES)) / MB
+    # 'one' = room for a single request at a time
+    app.config['UPLOAD_MEMORY_BUDGET_MB'] = per_request * 1.01 if budget_mb == 'one' else float(budget_mb)
+
+    statuses, peaks = [], []
+
+    def client():
+        with app.test_client() as c:
+            payload = {'files': [(io.BytesIO(data), f'1-7 Desember 2025_C{n}_X.xlsx') for n in range(files)]}
+            response = c.post('/create-invoice/process', data=payload, content_type='multipart/form-data')
+            statuses.append(response.status_code)
+            if response.status_code == 200:
+                peaks.append(response.get_json()['summary']['peak_memory_mb'])
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print(json.dumps({
+        "seconds": time.perf_counter() - start,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "request_peaks_mb": peaks,
+        "statuses": statuses,
+        "budget_mb": app.config['UPLOAD_MEMORY_BUDGET_MB'],
+        "upload_mb": len(data) * files / MB
+    }))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 6 and sys.argv[1] == '--run':
+        run(sys.argv[2], *map(int, sys.argv[3:]))
+        sys.exit(0)
+
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    files = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    rows = int(sys.argv[3]) if len(sys.argv) > 3 else 5000
+    for label, budget in (('unbounded', 100_000), ('one request', 'one')):
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), '--run', str(budget), str(clients), str(files), str(rows)],
+                             capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        print(f"{label:<12} clients={clients} x {result['upload_mb']:.1f} MB  {result['seconds']:6.1f} s  "
+              f"server peak RSS {result['peak_rss_mb']:7.1f} MB  per-request peak_memory_mb {result['request_peaks_mb']}  "
+              f"statuses {sorted(result['statuses'])}")
@@ -0,0 +1,126 @@
+"""
+Check: streamed processing (?stream=ndjson|sse, modules.common.streaming)
+against the inline responses of the three processing endpoints.
+
+Every upload is sent inline and streamed. The per-file events must come in
+before the final "done" event, one per file, and put back together the way
+the pages do it (create-invoice rows and anomalies per file, reconciliation
+results by upload index, the generator's totals from "done") they must equal
+the inline response. Reports when the first file arrived, when the stream
+ended, the inline time, and the largest event line against the inline body.
+
+Usage: python benchmarks/upload_stream.py [files] [rows per file]
+"""
+import io
+import os
+import sys
+import json
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from modules.create_invoice.transport import decode_trips
+from create_invoice_rows import make_vendor_file
+from reconciliation_scan import make_invoice
+from async_jobs import strip
+
+
+def read_stream(response, mode):
+    """Returns: [(seconds since the request, event)] as the lines arrived."""
+    events = []
+    buffer = ''
+    for chunk in response.response:
+        buffer += chunk.decode('utf-8') if isinstance(chunk, bytes) else chunk
+        separator = '\n\n' if mode == 'sse' else '\n'
+        while separator in buffer:
+            message, buffer = buffer.split(separator, 1)
+            if mode == 'sse':
+                data = [line[len('data: '):] for line in message.splitlines() if line.startswith('data: ')]
+                if not data:
+                    continue # keepalive comment
+                message = data[0]
+            if message.strip():
+                events.append((time.perf_counter(), json.loads(message)))
+    return events
+
+
+def assemble(url, fmt, files, done):
+    """The inline body rebuilt from the per-file events and the final result."""
+    files = sorted(files, key=lambda event: event['index'])
+    if url.startswith('/reconciliation'):
+        return [event['result'] for event in files]
+    if url.startswith('/invoice-generator'):
+        return done
+    anomalies = [message for event in files for message in event['anomalies']]
+    if fmt == 'columnar':
+        decoded = [decode_trips(event['trips']) for event in files]
+        columns = {name: [value for part in decoded for value in part[name]] for name in decoded[0]}
+        return {'columns': columns, 'anomalies': anomalies, 'count': done['count']}
+    return {'data': [row for event in files for row in event['data']], 'anomalies': anomalies, 'count': done['count']}
+
+
+def comparable(url, fmt, body):
+    """The inline body in the shape assemble() gives."""
+    if url.startswith('/create-invoice'):
+        if fmt == 'columnar':
+            body = {'columns': decode_trips(body['trips']), 'anomalies': body['anomalies'], 'count': body['count']}
+        else:
+            body = {k: body[k] for k in ('data', 'anomalies', 'count')}
+    return json.dumps(strip(body), sort_keys=True)
+
+
+def cases(files, rows):
+    vendor = make_vendor_file(rows)
+    invoices = [make_invoice(n) for n in range(files)]
+    # A file that fails on its own must still get its event
+    invoices.append(b'not a workbook')
+
+    def vendor_upload(**fields):
+        return {'data': dict(fields, files=[(io.BytesIO(vendor), f'1-7 Desember 2025_C{n}_X.xlsx') for n in range(files)]),
+                'content_type': 'multipart/form-data'}
+
+    return [
+        ('/create-invoice/process', 'records', lambda: vendor_upload()),
+        ('/create-invoice/process', 'columnar', lambda: vendor_upload(format='columnar')),
+        ('/invoice-generator/api/process', None, lambda: vendor_upload(filename_suffix='W1')),
+        ('/reconciliation/process', None, lambda: {'data': {'files': [(io.BytesIO(data), f'inv{n}.xlsx') for n, data in enumerate(invoices)]
+                                                                      + [(io.BytesIO(b'x'), 'notes.txt')]},
+                                                   'content_type': 'multipart/form-data'}),
+    ]
+
+
+if __name__ == '__main__':
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    app.config['RESULT_CACHE_BACKEND'] = 'none'
+    app.config['DOWNLOAD_MODE'] = 'server'
+    app.config['JOB_BACKEND'] = 'none'
+
+    with app.test_client() as client:
+        for url, fmt, make_kwargs in cases(files, rows):
+            start = time.perf_counter()
+            inline = client.post(url, **make_kwargs())
+            inline_time = time.perf_counter() - start
+            assert inline.status_code == 200, (url, inline.data[:200])
+
+            for mode in ('ndjson', 'sse'):
+                start = time.perf_counter()
+                response = client.post(f'{url}?stream={mode}', buffered=False, **make_kwargs())
+                events = read_stream(response, mode)
+                kinds = [event['event'] for _, event in events]
+                assert kinds[0] == 'start' and kinds[-1] == 'done', (url, mode, kinds)
+                file_events = [event for _, event in events if event['event'] == 'file']
+                assert len(file_events) == events[0][1]['files_total'], (url, mode, 'one event per file')
+                assert sorted(event['index'] for event in file_events) == list(range(len(file_events)))
+                done = events[-1][1]
+                assert done['status'] == 200, (url, mode, done)
+                assembled = json.dumps(strip(assemble(url, fmt, file_events, done['result'])), sort_keys=True)
+                assert assembled == comparable(url, fmt, inline.get_json()), \
+                    f"{url} ({fmt}, {mode}): streamed result differs from the inline response"
+
+                first_file = next(at for at, event in events if event['event'] == 'file') - start
+                largest = max(len(json.dumps(event)) for _, event in events)
+                label = f"{url} {fmt or ''}".strip()
+                print(f"{label:<34} {mode:<6} first file after {first_file:6.2f} s, done after {events[-1][0] - start:6.2f} s "
+                      f"(inline {inline_time:6.2f} s)  largest event {largest / 1024:8.1f} KB vs inline body {len(inline.data) / 1024:8.1f} KB")
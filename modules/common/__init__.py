@@ -0,0 +1,22 @@
+from .numeric import (
+    MODE_PLAIN_FIRST,
+    MODE_DOT_THOUSANDS,
+    MODE_THREE_DIGIT,
+    parse_amount,
+    parse_amount_series,
+)
+from .parallel import (
+    EXECUTOR_PROCESS,
+    EXECUTOR_THREAD,
+    is_serverless,
+    iter_ordered,
+    resolve_workers,
+    run_ordered,
+)
+from .cache import (
+    ResultCache,
+    content_key,
+    fingerprint,
+    get_result_cache,
+    run_cached,
+)
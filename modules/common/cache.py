@@ -0,0 +1,244 @@
+"""
+Content-addressed cache for per-file parse results.
+
+Re-uploading the same workbooks is common (fix one file, upload all 30 again),
+so each endpoint keys the parsed result of a file by the SHA-256 of its bytes,
+its file name, the parser version and whatever request options change the
+result (tax_mode, master data fingerprint, ...). Only cache misses are parsed.
+
+Values are pickled, so a hit always returns a fresh copy. Two backends:
+    memory - in-process LRU (default; per worker process)
+    disk   - one file per entry under RESULT_CACHE_DIR, shared by all workers
+             (a private directory, see storage.py: entries are unpickled on a hit)
+Both evict least recently used entries once RESULT_CACHE_MAX_MB is exceeded.
+"""
+import os
+import json
+import pickle
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from modules.common.parallel import iter_ordered, EXECUTOR_PROCESS
+from modules.common.storage import private_directory
+
+BACKEND_MEMORY = 'memory'
+BACKEND_DISK = 'disk'
+BACKEND_NONE = 'none'
+
+def content_key(data, *parts):
+    """
+    SHA-256 over the file bytes and every extra key part (parser version, options).
+    data may also be a sha256 object already fed with the bytes (spooled uploads).
+    """
+    h = data.copy() if hasattr(data, 'hexdigest') else hashlib.sha256(data)
+    for part in parts:
+        h.update(b'\x00')
+        h.update(str(part).encode('utf-8'))
+    return h.hexdigest()
+
+def fingerprint(obj):
+    """Stable short hash of JSON-like data (e.g. the master mapping)."""
+    if isinstance(obj, dict):
+        obj = sorted(obj.items(), key=lambda kv: str(kv[0]))
+    raw = json.dumps(obj, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:16]
+
+class MemoryBackend:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        blob = self._entries.get(key)
+        if blob is not None:
+            self._entries.move_to_end(key)
+        return blob
+
+    def put(self, key, blob):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.size -= len(old)
+        if len(blob) > self.max_bytes:
+            return
+        self._entries[key] = blob
+        self.size += len(blob)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+class DiskBackend:
+    """
+    <directory>/<key>.pkl per entry. Recency is the file mtime, refreshed on
+    every hit, so several worker processes can share one directory.
+    """
+    def __init__(self, directory, max_bytes):
+        self.directory = private_directory(directory)
+        self.max_bytes = max_bytes
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.pkl'):
+                try:
+                    st = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, name))
+        return entries
+
+    @property
+    def size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                blob = f.read()
+            os.utime(path)
+            return blob
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, blob):
+        if len(blob) > self.max_bytes:
+            return
+        # Write then rename so a concurrent reader never sees a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(blob)
+        os.replace(tmp_path, self._path(key))
+        self._evict()
+
+    def _evict(self):
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        for _, _, name in self._entries():
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+    def __len__(self):
+        return len(self._entries())
+
+class ResultCache:
+    """Thread-safe front for a backend, with hit/miss counters."""
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            blob = self.backend.get(key)
+            if blob is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return pickle.loads(blob)
+
+    def put(self, key, value):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self.backend.put(key, blob)
+
+    def clear(self):
+        with self._lock:
+            self.backend.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": type(self.backend).__name__,
+                "entries": len(self.backend),
+                "size_bytes": self.backend.size,
+                "max_bytes": self.backend.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+def create_cache(config):
+    """
+    Builds the cache described by RESULT_CACHE_BACKEND / RESULT_CACHE_MAX_MB / RESULT_CACHE_DIR.
+    Returns None when caching is disabled.
+    """
+    backend = (config.get('RESULT_CACHE_BACKEND') or BACKEND_MEMORY).lower()
+    max_bytes = int(float(config.get('RESULT_CACHE_MAX_MB') or 256) * 1024 * 1024)
+    if backend == BACKEND_NONE or max_bytes <= 0:
+        return None
+    if backend == BACKEND_DISK:
+        directory = config.get('RESULT_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'result_cache')
+        return ResultCache(DiskBackend(directory, max_bytes))
+    if backend == BACKEND_MEMORY:
+        return ResultCache(MemoryBackend(max_bytes))
+    raise ValueError(f"Unknown RESULT_CACHE_BACKEND '{backend}'")
+
+def get_result_cache(app):
+    """The app-wide cache, created on first use. Returns None when disabled."""
+    if 'result_cache' not in app.extensions:
+        app.extensions['result_cache'] = create_cache(app.config)
+    return app.extensions['result_cache']
+
+def run_cached(fn, items, keys, cache=None, workers=1, context=None, executor=EXECUTOR_PROCESS, on_result=None, timings=None,
+               cacheable=None):
+    """
+    run_ordered() that skips items whose key is already cached.
+    keys: one cache key per item (None = never cached). Fresh results are stored.
+    cacheable: optional predicate(result); results it rejects (e.g. a file that failed with an
+        exception, which may be transient) are returned but not stored.
+    on_result: optional callback(position, result) for each result as soon as it is available
+        (cached ones first, then fresh ones in input order), e.g. to report progress per file.
+    timings: optional RequestTimings; fresh items are timed per file, cached ones counted as cache hits.
+    Returns: results in input order
+    """
+    items = list(items)
+    keys = list(keys) if cache is not None else [None] * len(items)
+
+    results = [None] * len(items)
+    todo = []
+    for pos, key in enumerate(keys):
+        cached = cache.get(key) if key is not None else None
+        if cached is not None:
+            results[pos] = cached
+            if timings is not None:
+                timings.add_cached()
+            if on_result is not None:
+                on_result(pos, cached)
+        else:
+            todo.append(pos)
+
+    fresh = iter_ordered(fn, [items[pos] for pos in todo], workers=min(workers, max(1, len(todo))),
+                         context=context, executor=executor, timings=timings)
+    for pos, result in zip(todo, fresh):
+        results[pos] = result
+        if keys[pos] is not None and (cacheable is None or cacheable(result)):
+            cache.put(keys[pos], result)
+        if on_result is not None:
+            on_result(pos, result)
+    return results
@@ -0,0 +1,107 @@
+"""
+Short-lived server-side storage for generated files.
+
+Instead of base64-encoding a workbook into the JSON response, an endpoint
+stores it here and returns a token; the browser then fetches the raw bytes
+from a download route on demand. Files live under DOWNLOAD_DIR (shared by all
+workers of one machine, private to the server's user; see storage.py) and are
+evicted DOWNLOAD_TTL_SECONDS after creation.
+
+Serverless runtimes cannot guarantee the download request reaches the same
+instance, so there the endpoints keep sending the file inline (see inline_downloads()).
+"""
+import os
+import re
+import json
+import time
+import secrets
+import tempfile
+from modules.common.parallel import is_serverless
+from modules.common.storage import private_directory
+
+DEFAULT_TTL_SECONDS = 15 * 60
+
+_TOKEN_PATTERN = re.compile(r'^[A-Za-z0-9_-]{16,64}$')
+
+class DownloadStore:
+    def __init__(self, directory, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.directory = private_directory(directory)
+        self.ttl_seconds = ttl_seconds
+
+    def _paths(self, token):
+        base = os.path.join(self.directory, token)
+        return base + '.bin', base + '.json'
+
+    def put(self, data, filename, mimetype):
+        """
+        Stores bytes (or a BytesIO) and returns the download token.
+        """
+        self.evict_expired()
+        token = secrets.token_urlsafe(24)
+        data_path, meta_path = self._paths(token)
+        if hasattr(data, 'getbuffer'):
+            data = data.getbuffer()
+        with open(data_path, 'wb') as f:
+            f.write(data)
+        meta = {
+            "filename": filename,
+            "mimetype": mimetype,
+            "expires": time.time() + self.ttl_seconds
+        }
+        # Metadata last: a token only resolves once its file is complete
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        return token
+
+    def get(self, token):
+        """
+        Returns: (file path, meta dict) or None when the token is unknown or expired
+        """
+        if not token or not _TOKEN_PATTERN.match(token):
+            return None
+        data_path, meta_path = self._paths(token)
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if meta.get("expires", 0) < time.time() or not os.path.exists(data_path):
+            self._remove(token)
+            return None
+        return data_path, meta
+
+    def _remove(self, token):
+        for path in self._paths(token):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def evict_expired(self):
+        now = time.time()
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            token = name[:-len('.json')]
+            try:
+                with open(os.path.join(self.directory, name), encoding='utf-8') as f:
+                    expires = json.load(f).get("expires", 0)
+            except (FileNotFoundError, ValueError):
+                expires = 0
+            if expires < now:
+                self._remove(token)
+
+def inline_downloads(config):
+    """True when files must travel inside the JSON response (serverless, or DOWNLOAD_MODE=inline)."""
+    mode = (config.get('DOWNLOAD_MODE') or '').lower()
+    if mode:
+        return mode == 'inline'
+    return is_serverless()
+
+def get_download_store(app):
+    """The app-wide store under DOWNLOAD_DIR, created on first use."""
+    if 'download_store' not in app.extensions:
+        directory = app.config.get('DOWNLOAD_DIR') or os.path.join(tempfile.gettempdir(), 'downloads')
+        ttl = int(app.config.get('DOWNLOAD_TTL_SECONDS') or DEFAULT_TTL_SECONDS)
+        app.extensions['download_store'] = DownloadStore(directory, ttl)
+    return app.extensions['download_store']
@@ -0,0 +1,342 @@
+"""
+Background jobs for long-running uploads and exports.
+
+Every endpoint used to do all of its work inside the HTTP request, so a large
+batch ran into the gunicorn worker timeout. With ?async=1 the endpoints
+validate and spool the request as before, then hand the rest of the work to a
+JobManager and answer 202 with a job id at once:
+
+    GET /api/jobs/<id>         status, stage, files done / total, rows processed
+    GET /api/jobs/<id>/result  the response the endpoint would have sent (JSON
+                               or workbook), replayed byte for byte
+
+Jobs run on a thread pool of JOB_WORKERS in the submitting process (the
+per-file work still uses the PARALLEL_WORKERS process pools). Job state and
+results live in a key-value store with native expiry, JOB_TTL_SECONDS after
+the last update:
+
+    memory - in-process dict (default; one gunicorn worker, or sticky clients)
+    local  - files under JOB_DIR (a private directory, see storage.py), shared
+             by all workers of one machine; a local stand-in for Redis with the
+             same set/get/delete calls
+    redis  - JOB_REDIS_URL via the redis package (optional dependency)
+    none   - no jobs; ?async=1 is ignored and requests answer inline
+
+Serverless runtimes cannot keep working after the response, so jobs are off there too.
+"""
+import os
+import re
+import json
+import time
+import struct
+import hashlib
+import secrets
+import tempfile
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import copy_current_request_context, current_app, jsonify, request, url_for
+
+from modules.common.parallel import is_serverless
+from modules.common.storage import private_directory
+from modules.common.streaming import stream_mode, stream_response
+from modules.common.timing import deferred
+
+try:
+    import redis
+except ImportError: # only needed for JOB_BACKEND=redis
+    redis = None
+
+BACKEND_MEMORY = 'memory'
+BACKEND_LOCAL = 'local'
+BACKEND_REDIS = 'redis'
+BACKEND_NONE = 'none'
+
+DEFAULT_TTL_SECONDS = 60 * 60
+DEFAULT_JOB_WORKERS = 2
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+FINISHED = (STATUS_DONE, STATUS_FAILED)
+
+_JOB_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{16,64}$')
+
+# --- KEY-VALUE STORES ---
+# The subset of the redis-py client the job manager uses: set(key, bytes, ex=seconds), get(key), delete(key)
+
+class MemoryKV:
+    def __init__(self):
+        self._entries = {} # key -> (value, expires)
+        self._lock = threading.Lock()
+
+    def set(self, key, value, ex=None):
+        now = time.time()
+        with self._lock:
+            for stale in [k for k, (_, expires) in self._entries.items() if expires < now]:
+                del self._entries[stale]
+            self._entries[key] = (value, now + ex if ex else float('inf'))
+        return True
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.time():
+                del self._entries[key]
+                return None
+            return entry[0]
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(self._entries.pop(key, None) is not None for key in keys)
+
+class LocalKV:
+    """
+    One file per key under a directory: an 8-byte expiry timestamp, then the value.
+    Written to a temporary file and renamed, so other processes never read a partial value.
+    """
+    SWEEP_INTERVAL = 60
+
+    def __init__(self, directory):
+        self.directory = private_directory(directory)
+        self._last_sweep = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.kv')
+
+    def set(self, key, value, ex=None):
+        expires = time.time() + ex if ex else float('inf')
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(struct.pack('<d', expires))
+            f.write(value)
+        os.replace(tmp_path, self._path(key))
+        self._sweep()
+        return True
+
+    def _read(self, path):
+        try:
+            with open(path, 'rb') as f:
+                raw = f.read()
+        except FileNotFoundError:
+            return None
+        if len(raw) < 8 or struct.unpack('<d', raw[:8])[0] < time.time():
+            self._remove(path)
+            return None
+        return raw[8:]
+
+    def get(self, key):
+        return self._read(self._path(key))
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def delete(self, *keys):
+        return sum(self._remove(self._path(key)) for key in keys)
+
+    def _sweep(self):
+        # Expired keys are dropped on read; this removes the ones nobody asks for again
+        now = time.time()
+        if now - self._last_sweep < self.SWEEP_INTERVAL:
+            return
+        self._last_sweep = now
+        for name in os.listdir(self.directory):
+            if name.endswith('.kv'):
+                self._read(os.path.join(self.directory, name))
+
+def create_kv(config):
+    """
+    The store described by JOB_BACKEND / JOB_DIR / JOB_REDIS_URL.
+    Returns None when jobs are disabled.
+    """
+    backend = (config.get('JOB_BACKEND') or BACKEND_MEMORY).lower()
+    if backend == BACKEND_NONE:
+        return None
+    if backend == BACKEND_MEMORY:
+        return MemoryKV()
+    if backend == BACKEND_LOCAL:
+        return LocalKV(config.get('JOB_DIR') or os.path.join(tempfile.gettempdir(), 'jobs'))
+    if backend == BACKEND_REDIS:
+        if redis is None:
+            raise ValueError("JOB_BACKEND=redis needs the redis package (pip install redis)")
+        return redis.Redis.from_url(config.get('JOB_REDIS_URL') or 'redis://localhost:6379/0')
+    raise ValueError(f"Unknown JOB_BACKEND '{backend}'")
+
+# --- JOBS ---
+
+class JobProgress:
+    """Handed to a job's work function; every call is saved so pollers see it."""
+    streaming = False
+
+    def __init__(self, manager, job_id):
+        self.manager = manager
+        self.job_id = job_id
+
+    def update(self, stage=None, files_total=None, rows=None):
+        changes = {"stage": stage, "files_total": files_total, "rows": rows}
+        self.manager._update(self.job_id, **{k: v for k, v in changes.items() if v is not None})
+
+    def file_done(self, rows=0, event=None, data=None):
+        """
+        Counts a finished file. event (file name, rows, status, anomalies) is appended to the
+        job's "files" list so pollers can show each file before the job ends; data (the file's
+        rows) is only sent by streaming responses and is ignored here.
+        """
+        self.manager._file_done(self.job_id, rows, event)
+
+class NullProgress:
+    """Progress reporter of work that runs inline in the request."""
+    streaming = False
+
+    def update(self, stage=None, files_total=None, rows=None):
+        pass
+
+    def file_done(self, rows=0, event=None, data=None):
+        pass
+
+NO_PROGRESS = NullProgress()
+
+class JobManager:
+    def __init__(self, kv, workers=DEFAULT_JOB_WORKERS, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.kv = kv
+        self.ttl_seconds = max(1, int(ttl_seconds))
+        self.pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='job')
+        self._lock = threading.Lock() # serialises read-modify-write of job records in this process
+
+    def _save(self, job):
+        self.kv.set(f"job:{job['id']}", json.dumps(job).encode('utf-8'), ex=self.ttl_seconds)
+
+    def status(self, job_id):
+        """
+        Returns: job dict (id, kind, status, stage, files_total, files_done, rows, files (one event
+        per finished file), error, created/started/finished timestamps) or None when unknown or expired
+        """
+        if not job_id or not _JOB_ID_PATTERN.match(job_id):
+            return None
+        raw = self.kv.get(f"job:{job_id}")
+        return json.loads(raw) if raw is not None else None
+
+    def _update(self, job_id, **changes):
+        with self._lock:
+            job = self.status(job_id)
+            if job is None:
+                return
+            job.update(changes)
+            self._save(job)
+
+    def _file_done(self, job_id, rows, event):
+        with self._lock:
+            job = self.status(job_id)
+            if job is None:
+                return
+            job["files_done"] += 1
+            job["rows"] += rows
+            if event is not None:
+                job["files"].append(event)
+            self._save(job)
+
+    def submit(self, kind, work, files_total=0):
+        """
+        Queues work(progress) on the pool. work returns a Flask Response (see respond()).
+        Returns: the new job dict
+        """
+        job = {
+            "id": secrets.token_urlsafe(18),
+            "kind": kind,
+            "status": STATUS_QUEUED,
+            "stage": STATUS_QUEUED,
+            "files_total": files_total,
+            "files_done": 0,
+            "rows": 0,
+            "files": [],
+            "error": None,
+            "created": time.time(),
+            "started": None,
+            "finished": None
+        }
+        self._save(job)
+        self.pool.submit(self._run, job["id"], work)
+        return job
+
+    def _run(self, job_id, work):
+        self._update(job_id, status=STATUS_RUNNING, stage='starting', started=time.time())
+        try:
+            response = work(JobProgress(self, job_id))
+            # send_file responses stream from their file; the result is stored as plain bytes
+            response.direct_passthrough = False
+            # Status and headers as one JSON line, then the body bytes (never a pickle:
+            # the stored value is read back for whoever asks for the job id)
+            head = json.dumps({"status": response.status_code, "headers": list(response.headers.items())})
+            self.kv.set(f"job:{job_id}:result", head.encode('utf-8') + b'\n' + response.get_data(), ex=self.ttl_seconds)
+            self._update(job_id, status=STATUS_DONE, stage=STATUS_DONE, finished=time.time())
+        except Exception as e:
+            traceback.print_exc()
+            self._update(job_id, status=STATUS_FAILED, stage=STATUS_FAILED, error=str(e), finished=time.time())
+
+    def result(self, job_id):
+        """
+        Returns: {"status", "headers", "body"} of a finished job, or None
+        """
+        if not job_id or not _JOB_ID_PATTERN.match(job_id):
+            return None
+        raw = self.kv.get(f"job:{job_id}:result")
+        if raw is None:
+            return None
+        head, body = raw.split(b'\n', 1)
+        result = json.loads(head)
+        result["body"] = body
+        return result
+
+def get_job_manager(app):
+    """The app-wide manager, created on first use. Returns None when jobs are disabled or on serverless."""
+    if 'job_manager' not in app.extensions:
+        kv = None if is_serverless() else create_kv(app.config)
+        manager = None
+        if kv is not None:
+            workers = int(app.config.get('JOB_WORKERS') or DEFAULT_JOB_WORKERS)
+            ttl = int(app.config.get('JOB_TTL_SECONDS') or DEFAULT_TTL_SECONDS)
+            manager = JobManager(kv, workers, ttl)
+        app.extensions['job_manager'] = manager
+    return app.extensions['job_manager']
+
+def wants_async():
+    """True when the client asked for a background job (?async=1)."""
+    return request.args.get('async', '').lower() in ('1', 'true', 'yes')
+
+def respond(kind, work, files_total=0, streamable=False):
+    """
+    Runs work(progress) for the current request: inline, as a background job when the client
+    asked for one and jobs are enabled, or otherwise as a stream of per-file events when the
+    endpoint is streamable and the client asked for it (?stream=..., see modules.common.streaming). work must not read request.files / request.stream
+    (they are closed once the 202 or the stream starts); parse and spool them before calling this.
+    Returns: the view's response, (job JSON, 202) or the streamed response
+    """
+    manager = get_job_manager(current_app)
+    if manager is not None and wants_async():
+        # Runs on a pool thread inside a copy of this request's context (current_app, url_for, send_file);
+        # the request's timings end with the job
+        timed_work = deferred(lambda progress: current_app.make_response(work(progress)))
+
+        @copy_current_request_context
+        def run(progress):
+            return timed_work(progress)
+
+        job = manager.submit(kind, run, files_total)
+        return jsonify(job_payload(job)), 202
+
+    mode = stream_mode() if streamable else None
+    if mode is not None:
+        return stream_response(deferred(lambda progress: current_app.make_response(work(progress))), files_total, mode)
+    return work(NO_PROGRESS)
+
+def job_payload(job):
+    """Job dict plus the URLs to poll it and fetch its result."""
+    return dict(job, status_url=url_for('job_status', job_id=job["id"]), result_url=url_for('job_result', job_id=job["id"]))
@@ -0,0 +1,157 @@
+"""
+Shared Indonesian currency parsing ("Rp 1.234.567,89" -> 1234567.89).
+
+The blueprints historically disagree on ambiguous strings such as "1.500",
+so each keeps its own rules as a named mode:
+
+- MODE_PLAIN_FIRST   (reconciliation): try float() first, so "1.500" -> 1.5
+- MODE_DOT_THOUSANDS (invoice_generator): a lone dot is a thousands separator, "1.500" -> 1500
+- MODE_THREE_DIGIT   (create_invoice): a lone dot followed by 3 digits is thousands, "1.500" -> 1500, "1.5" -> 1.5
+
+parse_amount() is the scalar fast path; parse_amount_series() converts a whole
+pandas Series to float64, parsing each distinct cell once, and returns exactly
+what parse_amount would return per cell (None becomes NaN).
+"""
+import numpy as np
+import pandas as pd
+
+MODE_PLAIN_FIRST = 'plain_first'
+MODE_DOT_THOUSANDS = 'dot_thousands'
+MODE_THREE_DIGIT = 'three_digit'
+
+# Cells the scalar parsers turn into float() directly (np.integer round-trips through str() unchanged)
+NUMBER_TYPES = (int, float, np.integer)
+
+# --- SCALAR PARSERS ---
+
+def _parse_plain_first(val):
+    if val is None:
+        return 0.0
+    if isinstance(val, (int, float)):
+        return float(val)
+
+    s_val = str(val).lower().replace("rp", "").replace(" ", "")
+    try:
+        return float(s_val)
+    except ValueError:
+        pass
+
+    if "," in s_val and "." in s_val:
+        s_val = s_val.replace(".", "").replace(",", ".")
+    elif "." in s_val and s_val.count(".") > 1: # Multiple dots = thousands
+        s_val = s_val.replace(".", "")
+    elif "," in s_val: # Comma is decimal
+        s_val = s_val.replace(",", ".")
+
+    try:
+        return float(s_val)
+    except ValueError:
+        return 0.0
+
+def _parse_dot_thousands(val):
+    try:
+        if pd.isna(val):
+            return 0.0
+        if isinstance(val, (int, float)):
+            return float(val)
+
+        s = str(val).strip().replace('Rp', '').replace('IDR', '').strip()
+
+        if '.' in s and ',' in s:
+            if s.rfind(',') > s.rfind('.'): # 1.234,56
+                s = s.replace('.', '').replace(',', '.')
+            else: # 1,234.56
+                s = s.replace(',', '')
+        elif '.' in s: # 1.234 -> thousands separator
+            s = s.replace('.', '')
+        elif ',' in s:
+            s = s.replace(',', '.')
+
+        return float(s)
+    except Exception:
+        return None
+
+def _parse_three_digit(val):
+    if val is None:
+        return 0.0
+    if isinstance(val, (int, float)):
+        return float(val)
+
+    s_val = str(val).strip().replace("Rp", "").replace(" ", "")
+    if not s_val:
+        return 0.0
+
+    if "," in s_val and "." in s_val:
+        if s_val.rfind(',') > s_val.rfind('.'): # 1.234,56
+            s_val = s_val.replace('.', '').replace(',', '.')
+        else:
+            s_val = s_val.replace(',', '')
+    elif "." in s_val:
+        if s_val.count(".") > 1:
+            s_val = s_val.replace(".", "")
+        elif len(s_val.split(".")[1]) == 3: # 1.000 -> thousands, 1.5 -> decimal
+            s_val = s_val.replace(".", "")
+    elif "," in s_val:
+        s_val = s_val.replace(",", ".")
+
+    try:
+        return float(s_val)
+    except Exception:
+        return 0.0
+
+_SCALAR_PARSERS = {
+    MODE_PLAIN_FIRST: _parse_plain_first,
+    MODE_DOT_THOUSANDS: _parse_dot_thousands,
+    MODE_THREE_DIGIT: _parse_three_digit,
+}
+
+def parse_amount(val, mode=MODE_DOT_THOUSANDS):
+    """Convert a single cell to float using the rules of `mode`."""
+    if type(val) is float or type(val) is int:
+        # Fast path: every mode returns plain numbers unchanged (except NaN)
+        if val == val or mode != MODE_DOT_THOUSANDS:
+            return float(val)
+    return _SCALAR_PARSERS[mode](val)
+
+# --- VECTORIZED PARSERS ---
+
+# Per mode: result for float NaN cells in a numeric column
+_NAN_VALUES = {
+    MODE_PLAIN_FIRST: np.nan,
+    MODE_DOT_THOUSANDS: 0.0,
+    MODE_THREE_DIGIT: np.nan,
+}
+
+def parse_amount_series(series, mode=MODE_DOT_THOUSANDS):
+    """
+    Vectorized parse_amount() for a whole column.
+    Numeric columns are converted directly; other cells are parsed once per
+    distinct value with parse_amount() and broadcast back.
+    Returns: float64 Series aligned with series.index
+    """
+    nan_value = _NAN_VALUES[mode]
+
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_numeric_dtype(series):
+        if isinstance(series.dtype, pd.api.extensions.ExtensionDtype):
+            # Nullable columns (Int64, boolean, ...) hold pd.NA, which every mode turns into 0.0 like None
+            return series.astype('float64').fillna(0.0)
+        return series.astype('float64').fillna(nan_value)
+
+    values = series.to_numpy(dtype=object)
+    result = np.zeros(len(values))
+
+    # Numbers go straight to float(); float NaN follows the mode
+    is_null = pd.isna(values)
+    is_number = np.fromiter((isinstance(val, NUMBER_TYPES) for val in values), dtype=bool, count=len(values))
+    numbers = is_number & ~is_null
+    result[numbers] = values[numbers].astype('float64')
+    result[is_number & is_null] = nan_value
+
+    # None / NaT / pd.NA end up as 0.0 in every mode; text and other objects are parsed per distinct value
+    rest = ~is_number & ~is_null
+    if rest.any():
+        codes, uniques = pd.factorize(values[rest])
+        parsed = np.array([parse_amount(val, mode) for val in uniques], dtype=float)
+        result[rest] = parsed[codes]
+
+    return pd.Series(result, index=series.index)
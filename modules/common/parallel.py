@@ -0,0 +1,97 @@
+"""
+Pool helpers for processing uploaded files concurrently.
+
+run_ordered() maps a per-file function over the uploads and always returns the
+results in upload order. Shared, read-only context (e.g. the master mapping)
+is shipped to each process worker once through the pool initializer instead
+of once per file. iter_ordered() yields the same results one by one, so a
+response can be streamed while later items are still running. Serverless
+runtimes (Vercel, Lambda) and workers <= 1 fall back to a plain serial loop in
+the request thread. With timings (a RequestTimings, see timing.py) each call is
+timed where it runs and its stage record is added to the request.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from modules.common.timing import time_call
+
+EXECUTOR_PROCESS = 'process'
+EXECUTOR_THREAD = 'thread'
+
+# Env vars set by serverless platforms where process pools are unavailable or unhelpful
+SERVERLESS_ENV_VARS = ('VERCEL', 'AWS_LAMBDA_FUNCTION_NAME', 'FUNCTIONS_WORKER_RUNTIME')
+
+_worker_context = None
+
+def is_serverless():
+    return any(os.environ.get(var) for var in SERVERLESS_ENV_VARS)
+
+def resolve_workers(config, item_count, key='PARALLEL_WORKERS'):
+    """
+    Pool size for one request: the configured size capped by the number of items.
+    Returns 1 (serial) on serverless runtimes or when nothing is configured.
+    """
+    if is_serverless():
+        return 1
+    try:
+        workers = int(config.get(key) or 1)
+    except (TypeError, ValueError):
+        workers = 1
+    return max(1, min(workers, item_count))
+
+def _init_worker(context):
+    global _worker_context
+    _worker_context = context
+
+def _call(fn, item, context, timed=False):
+    """fn(item, context), or (result, file timings) when timed."""
+    return time_call(fn, item, context) if timed else fn(item, context)
+
+def _call_in_worker(fn, item, timed=False):
+    return _call(fn, item, _worker_context, timed)
+
+def iter_ordered(fn, items, workers=1, context=None, executor=EXECUTOR_PROCESS, timings=None):
+    """
+    Like run_ordered, but yields each result (in input order) as soon as it and
+    all earlier ones are done, so the caller can stream them out.
+    """
+    items = list(items)
+    timed = timings is not None
+    for value in _iter_calls(fn, items, workers, context, executor, timed):
+        if timed:
+            value, record = value
+            timings.add_file(record)
+        yield value
+
+def _iter_calls(fn, items, workers, context, executor, timed):
+    if workers <= 1 or len(items) <= 1:
+        for item in items:
+            yield _call(fn, item, context, timed)
+        return
+
+    if executor == EXECUTOR_THREAD:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            yield from pool.map(lambda item: _call(fn, item, context, timed), items)
+        return
+
+    done = 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(context,)) as pool:
+            for result in pool.map(_call_in_worker, [fn] * len(items), items, [timed] * len(items)):
+                yield result
+                done += 1
+    except BrokenProcessPool as e:
+        # A worker died (e.g. killed for memory); finish the remaining items serially rather than fail them
+        print(f"Process pool failed ({e}), falling back to serial processing.")
+        for item in items[done:]:
+            yield _call(fn, item, context, timed)
+
+def run_ordered(fn, items, workers=1, context=None, executor=EXECUTOR_PROCESS, timings=None):
+    """
+    Run fn(item, context) for every item and return the results in input order.
+    fn must be a module-level function (picklable) for the process executor,
+    and should catch its own errors so one bad file cannot fail the batch.
+    timings: optional RequestTimings; each call's stages are added to it as one file.
+    """
+    return list(iter_ordered(fn, items, workers, context, executor, timings))
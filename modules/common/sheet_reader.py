@@ -0,0 +1,143 @@
+"""
+Chunked reader for large vendor sheets.
+
+pd.read_excel(header=3) builds every cell of the sheet (a quarter of vendor
+data is 300k+ rows x ~24 columns) before the endpoints slice out the dozen
+columns they use. SheetChunks streams the first worksheet in openpyxl
+read-only mode, converts only the requested column positions, and hands out
+DataFrames of at most chunk_rows rows, so memory grows with the chunk size and
+the columns kept, not with the file.
+
+Cells are converted like pd.read_excel does (empty -> NaN, whole floats ->
+int, error cells -> NaN, the same na_values) and each chunk keeps the row index
+read_excel would have given (0 = first row under the header; blank rows inside
+the data are kept, trailing blank rows dropped). Column dtypes come from the
+cell types alone (infer_objects): numeric cells give int64/float64 columns,
+dates datetime64, anything mixed stays object. Unlike read_excel, text that
+looks numeric is never parsed per column - read_excel turned a column of text
+amounts like '811.000' into 811.0 whenever no other cell in it was
+non-numeric, which with chunks would depend on where the chunk boundaries fall.
+The only other difference is that dtypes are per chunk: an integer column with
+blanks in a later chunk is int64 in the first one and float64 there.
+"""
+import io
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from pandas.io.parsers import TextParser
+
+DEFAULT_CHUNK_ROWS = 10_000
+
+# Error cells come back as these strings with values_only; read_excel turns them into NaN
+ERROR_VALUES = frozenset(['#NULL!', '#DIV/0!', '#VALUE!', '#REF!', '#NAME?', '#NUM!', '#N/A', '#GETTING_DATA'])
+
+def convert_cell(value):
+    """Cell value as read_excel's openpyxl reader gives it ('' for empty, whole floats as int)."""
+    if value is None:
+        return ""
+    if type(value) is float:
+        whole = int(value)
+        return whole if whole == value else value
+    if type(value) is str and value in ERROR_VALUES:
+        return np.nan
+    return value
+
+class SheetChunks:
+    """
+    Iterates DataFrames of the rows below the header row of the first worksheet.
+    Chunk columns are labelled by their 0-based sheet position (columns=[1, 3, 22] ->
+    chunk[22] is column W); positions past the end of a row are empty (NaN).
+    At least one (possibly empty) chunk is yielded, unless the sheet is narrower than
+    min_width: then none is, so a wrong file is never converted past its first chunk.
+    After iterating, width is the column count read_excel would report (df.shape[1])
+    and rows the number of data rows.
+    """
+
+    def __init__(self, source, columns, header=3, chunk_rows=DEFAULT_CHUNK_ROWS, min_width=0):
+        if isinstance(source, bytes):
+            source = io.BytesIO(source)
+        self.source = source
+        self.columns = list(columns)
+        self.header = header
+        self.chunk_rows = max(1, int(chunk_rows))
+        self.min_width = min_width
+        self.width = 0
+        self.rows = 0
+        self._convert = True
+
+    def _frame(self, rows, start):
+        if rows:
+            parser = TextParser(rows, header=None, names=list(range(len(self.columns))), dtype=object, skip_blank_lines=False)
+            frame = parser.read().infer_objects()
+            parser.close()
+        else:
+            frame = pd.DataFrame({pos: pd.Series([], dtype=object) for pos in range(len(self.columns))})
+        frame.columns = self.columns
+        frame.index = pd.RangeIndex(start, start + len(frame))
+        return frame
+
+    def __iter__(self):
+        self._convert = True
+        for frame in self._scan():
+            if self.width < self.min_width:
+                # Narrower than required after the header and the first chunk (almost always the
+                # wrong file): the rest is only scanned for its width, no more rows are converted
+                self._convert = False
+                continue
+            yield frame
+        if not self._convert and self.width >= self.min_width:
+            # A row further down widened the sheet after all: read it again from the top
+            self._convert = True
+            yield from self._scan()
+
+    def _scan(self):
+        if hasattr(self.source, 'seek'):
+            self.source.seek(0)
+        self.width = 0
+        wb = load_workbook(self.source, read_only=True, data_only=True, keep_links=False)
+        try:
+            ws = wb.worksheets[0]
+            ws.reset_dimensions()
+            columns = self.columns
+            buffered = []  # converted rows of the current chunk
+            blanks = 0     # blank rows seen since the last row with data (dropped if nothing follows)
+            start = 0
+            header_seen = False
+
+            for row_number, row in enumerate(ws.iter_rows(values_only=True)):
+                length = len(row)
+                while length and (row[length - 1] is None or row[length - 1] == ""):
+                    length -= 1
+                if length > self.width:
+                    self.width = length
+                if row_number <= self.header:
+                    header_seen = header_seen or row_number == self.header
+                    continue
+                if not self._convert:
+                    continue
+
+                if length == 0:
+                    blanks += 1
+                    continue
+                # Blank rows between data rows are kept as all-NaN rows
+                for _ in range(blanks):
+                    buffered.append([""] * len(columns))
+                    if len(buffered) == self.chunk_rows:
+                        yield self._frame(buffered, start)
+                        start += len(buffered)
+                        buffered = []
+                blanks = 0
+                buffered.append([convert_cell(row[pos]) if pos < length else "" for pos in columns])
+                if len(buffered) == self.chunk_rows:
+                    yield self._frame(buffered, start)
+                    start += len(buffered)
+                    buffered = []
+
+            if not header_seen:
+                raise ValueError(f"Sheet has no header row {self.header + 1}")
+            self.rows = start + len(buffered)
+            if buffered or start == 0:
+                yield self._frame(buffered, start)
+        finally:
+            wb.close()
@@ -0,0 +1,42 @@
+"""
+Directories for the files the app writes and later reads back.
+
+Downloads, previews, trip handles, the disk result cache, local jobs and
+spooled uploads all default to folders under the shared system temp dir.
+Another local user could create such a folder first, or write into it, and
+plant files the server then trusts as its own. private_directory() creates
+the folder readable by this user only and refuses one that somebody else owns
+or can write to.
+"""
+import os
+import stat
+
+def _writable_by_others(info):
+    return bool(info.st_mode & (stat.S_IWGRP | stat.S_IWOTH))
+
+def private_directory(path):
+    """
+    Creates path (mode 0o700) unless it exists, then checks it is safe to use:
+    owned by this user and not writable by group/others. Its parents must be
+    owned by this user or root and, unless sticky like /tmp, not writable by others.
+    Returns: the absolute path; raises PermissionError otherwise
+    """
+    path = os.path.abspath(path)
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    if not hasattr(os, 'getuid'):
+        return path # No POSIX owners/modes (Windows)
+    uid = os.getuid()
+
+    info = os.stat(path)
+    if info.st_uid != uid or os.lstat(path).st_uid != uid:
+        raise PermissionError(f"Directory {path} is owned by another user; refusing to use it")
+    if _writable_by_others(info):
+        raise PermissionError(f"Directory {path} is writable by other users; refusing to use it")
+
+    child, parent = path, os.path.dirname(path)
+    while parent != child:
+        info = os.stat(parent)
+        if info.st_uid not in (uid, 0) or (_writable_by_others(info) and not info.st_mode & stat.S_ISVTX):
+            raise PermissionError(f"Directory {path} lies in {parent}, which other users can modify; refusing to use it")
+        child, parent = parent, os.path.dirname(parent)
+    return path
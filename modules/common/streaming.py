@@ -0,0 +1,123 @@
+"""
+Streamed responses for the processing endpoints.
+
+With ?stream=ndjson (or ?stream=1) an endpoint answers at once with a chunked
+application/x-ndjson body, one JSON event per line; ?stream=sse gives the
+same events as text/event-stream (event: <type> / data: <json>):
+
+    {"event": "start", "files_total": 3}
+    {"event": "progress", "stage": "reading files", "files_done": 0, "files_total": 3, "rows": 0}
+    {"event": "file", "index": 0, "file": "a.xlsx", "rows": 1200, "status": "Success",
+     "anomalies": [...], "files_done": 1, "files_total": 3, "rows_total": 1200, ...file data}
+    ...
+    {"event": "done", "status": 200, "result": {...consolidated totals...}}
+
+Each file's event (index = its position in the upload) is written as soon as
+that file is parsed, with its rows when the endpoint has any to send, and
+only the totals come last, so the server never holds the full result set for
+the response. The work runs on a thread in a copy of the request context
+while the response generator drains a queue; a heartbeat line goes out when
+nothing happened for HEARTBEAT_SECONDS so proxies keep the connection open.
+If the work fails the last event is {"event": "error", "error": "..."}.
+"""
+import queue
+import threading
+import traceback
+
+from flask import Response, copy_current_request_context, current_app, request, stream_with_context
+
+MODE_NDJSON = 'ndjson'
+MODE_SSE = 'sse'
+
+HEARTBEAT_SECONDS = 15
+
+_FINISHED = object() # queue sentinel after the last event
+
+def stream_mode():
+    """'ndjson' / 'sse' when the client asked for a streamed response (?stream=...), else None."""
+    value = request.args.get('stream', '').lower()
+    if value in ('1', 'true', 'yes', MODE_NDJSON):
+        return MODE_NDJSON
+    if value == MODE_SSE:
+        return MODE_SSE
+    return None
+
+class StreamProgress:
+    """Progress reporter that turns every call into an event of the response stream."""
+    streaming = True
+
+    def __init__(self, files_total=0):
+        self.events = queue.Queue()
+        self.stage = None
+        self.files_total = files_total
+        self.files_done = 0
+        self.rows = 0
+        self._lock = threading.Lock() # file_done can be called from result callbacks
+
+    def emit(self, event, **fields):
+        self.events.put(dict(fields, event=event))
+
+    def update(self, stage=None, files_total=None, rows=None):
+        with self._lock:
+            if stage is not None:
+                self.stage = stage
+            if files_total is not None:
+                self.files_total = files_total
+            if rows is not None:
+                self.rows = rows
+            self.emit('progress', stage=self.stage, files_done=self.files_done, files_total=self.files_total, rows=self.rows)
+
+    def file_done(self, rows=0, event=None, data=None):
+        with self._lock:
+            self.files_done += 1
+            self.rows += rows
+            fields = dict(event or {}, **(data or {}))
+            fields.setdefault("rows", rows)
+            self.emit('file', **fields, files_done=self.files_done, files_total=self.files_total, rows_total=self.rows)
+
+def frame(event, mode):
+    """One event as an NDJSON line or an SSE message."""
+    payload = current_app.json.dumps(event)
+    if mode == MODE_SSE:
+        return f"event: {event['event']}\ndata: {payload}\n\n"
+    return payload + "\n"
+
+def heartbeat(mode):
+    return ": keepalive\n\n" if mode == MODE_SSE else '{"event": "heartbeat"}\n'
+
+def stream_response(work, files_total=0, mode=MODE_NDJSON):
+    """
+    Runs work(progress) on a thread and streams its events; the response work returns
+    becomes the final "done" event (its JSON body as result, None for files).
+    Returns: the streamed Response
+    """
+    progress = StreamProgress(files_total)
+
+    @copy_current_request_context
+    def run():
+        try:
+            response = current_app.make_response(work(progress))
+            result = response.get_json(silent=True) if response.is_json else None
+            progress.emit('done', status=response.status_code, result=result)
+        except Exception as e:
+            traceback.print_exc()
+            progress.emit('error', error=f"Processing failed: {str(e)}")
+        finally:
+            progress.events.put(_FINISHED)
+
+    def generate():
+        yield frame({"event": "start", "files_total": files_total}, mode)
+        while True:
+            try:
+                event = progress.events.get(timeout=HEARTBEAT_SECONDS)
+            except queue.Empty:
+                yield heartbeat(mode)
+                continue
+            if event is _FINISHED:
+                break
+            yield frame(event, mode)
+
+    threading.Thread(target=run, name='stream', daemon=True).start()
+    mimetype = 'text/event-stream' if mode == MODE_SSE else 'application/x-ndjson'
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream_with_context(generate()), mimetype=mimetype, headers=headers)
@@ -0,0 +1,399 @@
+"""
+Per-request, per-file and per-stage timings.
+
+The endpoints time the stages of their work with
+
+    with stage(STAGE_READ) as size:
+        ...
+        size["rows"] = len(df)
+
+Inside a per-file function (run through iter_ordered / run_cached with
+timings=...) the stage is recorded for that file, in whichever worker process
+or thread it runs, and the file's record travels back with its result; in the
+request itself it is recorded for the request. Outside both it is a no-op, so
+the per-file functions cost nothing extra when called directly.
+
+Stages: read, clean, resolve, validate, aggregate, write, serialize, each with
+seconds, calls, rows and bytes. File stages are summed into the request's
+totals, so with several workers a stage can add up to more than the wall time.
+
+When a request ends (or its background job / stream, which finish after the
+response) its timings are
+
+    - printed as one JSON line (TIMING_LOG, on by default),
+    - sent as a Server-Timing header (SERVER_TIMING, off by default; job results
+      carry it too, streams cannot),
+    - added to the per-process counters served at /metrics in the Prometheus
+      text format.
+
+With PROFILE_DIR set, a request with ?profile=1 is also profiled and the dump
+written there: cProfile (.prof, open with pstats or snakeviz) by default,
+pyinstrument (.html) with PROFILER=pyinstrument when it is installed. PROFILE_DIR
+is private to the server's user (see storage.py); the file name is in the
+X-Profile header, the full path in the timing log.
+"""
+import os
+import json
+import time
+import cProfile
+import threading
+from contextlib import contextmanager
+
+from flask import current_app, has_request_context, request
+
+from modules.common.storage import private_directory
+
+try:
+    import pyinstrument
+except ImportError: # only needed for PROFILER=pyinstrument
+    pyinstrument = None
+
+STAGE_READ = 'read'
+STAGE_CLEAN = 'clean'
+STAGE_RESOLVE = 'resolve'
+STAGE_VALIDATE = 'validate'
+STAGE_AGGREGATE = 'aggregate'
+STAGE_WRITE = 'write'
+STAGE_SERIALIZE = 'serialize'
+STAGES = (STAGE_READ, STAGE_CLEAN, STAGE_RESOLVE, STAGE_VALIDATE, STAGE_AGGREGATE, STAGE_WRITE, STAGE_SERIALIZE)
+
+PROFILER_CPROFILE = 'cprofile'
+PROFILER_PYINSTRUMENT = 'pyinstrument'
+
+METRIC_PREFIX = 'autorecap'
+# Upper bounds (seconds) of the request duration histogram buckets
+DURATION_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_ENVIRON_KEY = 'autorecap.timings'
+_local = threading.local() # .current: the Timings of the file being processed in this thread
+
+# --- RECORDING ---
+
+class Timings:
+    """Stage totals: name -> {"seconds", "calls", "rows", "bytes"}."""
+
+    def __init__(self):
+        self.stages = {}
+        self._lock = threading.Lock() # a request's stages can come from its job/stream thread and callbacks
+
+    def add(self, name, seconds, calls=1, rows=0, nbytes=0):
+        with self._lock:
+            entry = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0, "rows": 0, "bytes": 0})
+            entry["seconds"] += seconds
+            entry["calls"] += calls
+            entry["rows"] += rows or 0
+            entry["bytes"] += nbytes or 0
+
+    def merge(self, stages):
+        for name, entry in stages.items():
+            self.add(name, entry["seconds"], entry["calls"], entry["rows"], entry["bytes"])
+
+class RequestTimings(Timings):
+    """Timings of one request: its own stages, the files' stages summed in, and one record per file."""
+
+    def __init__(self, endpoint):
+        super().__init__()
+        self.endpoint = endpoint or 'unknown'
+        self.started = time.perf_counter()
+        self.files = []       # {"file", "seconds", "stages"} per parsed file
+        self.cache_hits = 0   # files served from the result cache (not timed)
+        self.deferred = False # the work finishes after the response (job or stream)
+        self.profiler = None
+        self.profile_path = None
+        self.finished = False
+
+    def add_file(self, record):
+        self.merge(record["stages"])
+        with self._lock:
+            self.files.append(record)
+
+    def add_cached(self):
+        with self._lock:
+            self.cache_hits += 1
+
+def _current():
+    timings = getattr(_local, 'current', None)
+    if timings is None and has_request_context():
+        timings = request.environ.get(_ENVIRON_KEY)
+    return timings
+
+@contextmanager
+def stage(name, rows=0, nbytes=0):
+    """
+    Times the block as a stage of the current file or request; the yielded dict
+    takes the sizes found inside the block ("rows", "bytes").
+    """
+    size = {"rows": rows, "bytes": nbytes}
+    start = time.perf_counter()
+    try:
+        yield size
+    finally:
+        timings = _current()
+        if timings is not None:
+            timings.add(name, time.perf_counter() - start, rows=size["rows"], nbytes=size["bytes"])
+
+def timed_iter(name, iterable, rows=len, nbytes=0):
+    """Yields from iterable, timing each step as stage name (rows(item) rows each, nbytes once)."""
+    iterator = iter(iterable)
+    while True:
+        with stage(name, nbytes=nbytes) as size:
+            nbytes = 0
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            size["rows"] = rows(item) if rows else 0
+        yield item
+
+def file_label(item):
+    """File name of a per-file item ((filename, source) in this app)."""
+    if isinstance(item, tuple) and item and isinstance(item[0], str):
+        return item[0]
+    return str(item)
+
+def time_call(fn, item, context):
+    """
+    Runs fn(item, context) with its stages recorded for this file.
+    Returns: (result, {"file", "seconds", "stages"})
+    """
+    previous = getattr(_local, 'current', None)
+    timings = Timings()
+    _local.current = timings
+    start = time.perf_counter()
+    try:
+        result = fn(item, context)
+    finally:
+        _local.current = previous
+    return result, {"file": file_label(item), "seconds": time.perf_counter() - start, "stages": timings.stages}
+
+def source_size(source):
+    """Bytes of an upload given as a path, raw bytes or a file object (0 when unknown)."""
+    try:
+        if isinstance(source, str):
+            return os.path.getsize(source)
+        if isinstance(source, (bytes, bytearray)):
+            return len(source)
+        return source.getbuffer().nbytes
+    except (OSError, AttributeError, TypeError):
+        return 0
+
+# --- REQUESTS ---
+
+def request_timings():
+    """The current request's RequestTimings (None outside a request, or before begin_request)."""
+    return request.environ.get(_ENVIRON_KEY) if has_request_context() else None
+
+def begin_request():
+    """before_request hook: starts the request's timings (and its profiler with ?profile=1)."""
+    timings = RequestTimings(request.endpoint)
+    request.environ[_ENVIRON_KEY] = timings
+    if current_app.config.get('PROFILE_DIR') and request.args.get('profile', '').lower() in ('1', 'true', 'yes'):
+        timings.profiler = RequestProfiler(current_app.config.get('PROFILER'))
+        timings.profiler.start()
+
+def end_request(response):
+    """after_request hook: finishes the timings unless the work goes on after the response."""
+    timings = request_timings()
+    if timings is None or timings.deferred:
+        return response
+    return finish(timings, response)
+
+def deferred(fn):
+    """
+    Wraps the part of the request that runs after its response (a job or a stream):
+    its stages still count for the request, and the timings are finished when it ends.
+    fn returns the Response it produced (or raises).
+    """
+    timings = request_timings()
+    if timings is None:
+        return fn
+    timings.deferred = True
+    if timings.profiler is not None:
+        timings.profiler.stop() # resumed on the thread that runs fn
+
+    def run(*args):
+        if timings.profiler is not None:
+            timings.profiler.start()
+        response = None
+        try:
+            response = fn(*args)
+            return response
+        finally:
+            finish(timings, response)
+    return run
+
+def finish(timings, response=None):
+    """Logs the timings, adds them to the metrics and (optionally) the response headers. Returns: response"""
+    if timings.finished:
+        return response
+    timings.finished = True
+    seconds = time.perf_counter() - timings.started
+    status = response.status_code if response is not None else 500
+    config = current_app.config
+
+    if timings.profiler is not None:
+        timings.profiler.stop()
+        timings.profile_path = timings.profiler.dump(config.get('PROFILE_DIR'), timings.endpoint)
+        if response is not None:
+            # Only the file name: the client does not need to learn the server's paths
+            response.headers['X-Profile'] = os.path.basename(timings.profile_path)
+
+    METRICS.observe(timings, status, seconds)
+
+    # Only requests that did measurable work get the header and the log line (not status polls,
+    # static files, or the replayed job result, which keeps the header of the job)
+    if not (timings.stages or timings.files or timings.cache_hits):
+        return response
+    if response is not None and config.get('SERVER_TIMING'):
+        response.headers['Server-Timing'] = server_timing(timings, seconds)
+    if config.get('TIMING_LOG', True):
+        print(json.dumps(timing_record(timings, status, seconds)), flush=True)
+    return response
+
+def timing_record(timings, status, seconds):
+    """The structured log line of a finished request."""
+    return {
+        "event": "request_timing",
+        "endpoint": timings.endpoint,
+        "status": status,
+        "seconds": round(seconds, 4),
+        "stages": {name: dict(entry, seconds=round(entry["seconds"], 4)) for name, entry in timings.stages.items()},
+        "files": [{"file": record["file"], "seconds": round(record["seconds"], 4),
+                   "stages": {name: round(entry["seconds"], 4) for name, entry in record["stages"].items()}}
+                  for record in timings.files],
+        "cache_hits": timings.cache_hits,
+        "profile": timings.profile_path
+    }
+
+def server_timing(timings, seconds):
+    """Server-Timing header value: one metric per stage (milliseconds), then the total."""
+    parts = []
+    for name in sorted(timings.stages, key=lambda name: STAGES.index(name) if name in STAGES else len(STAGES)):
+        entry = timings.stages[name]
+        desc = f"calls={entry['calls']} rows={entry['rows']} bytes={entry['bytes']}"
+        parts.append(f'{name};dur={entry["seconds"] * 1000:.1f};desc="{desc}"')
+    parts.append(f"total;dur={seconds * 1000:.1f}")
+    return ", ".join(parts)
+
+# --- PROFILING ---
+
+class RequestProfiler:
+    """cProfile or pyinstrument around one request; start/stop may be called from different threads."""
+
+    def __init__(self, kind=None):
+        kind = (kind or PROFILER_CPROFILE).lower()
+        if kind == PROFILER_PYINSTRUMENT and pyinstrument is None:
+            print("PROFILER=pyinstrument needs the pyinstrument package; using cProfile.")
+            kind = PROFILER_CPROFILE
+        self.kind = kind
+        self.profiler = pyinstrument.Profiler() if kind == PROFILER_PYINSTRUMENT else cProfile.Profile()
+        self.running = False
+
+    def start(self):
+        if not self.running:
+            if self.kind == PROFILER_PYINSTRUMENT:
+                self.profiler.start()
+            else:
+                self.profiler.enable()
+            self.running = True
+
+    def stop(self):
+        if self.running:
+            if self.kind == PROFILER_PYINSTRUMENT:
+                self.profiler.stop()
+            else:
+                self.profiler.disable()
+            self.running = False
+
+    def dump(self, directory, endpoint):
+        """Writes the profile under directory. Returns: its path"""
+        directory = private_directory(directory)
+        name = f"{endpoint.replace('.', '-')}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{threading.get_ident()}"
+        if self.kind == PROFILER_PYINSTRUMENT:
+            path = os.path.join(directory, name + '.html')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(self.profiler.output_html())
+        else:
+            path = os.path.join(directory, name + '.prof')
+            self.profiler.dump_stats(path)
+        return path
+
+# --- METRICS ---
+
+def _labels(**labels):
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+class Metrics:
+    """Per-process counters of finished requests, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}  # (endpoint, status) -> count
+        self.durations = {} # endpoint -> {"buckets": [...], "sum", "count"}
+        self.stages = {}    # (endpoint, stage) -> {"seconds", "calls", "rows", "bytes"}
+        self.files = {}     # endpoint -> {"parsed", "cached", "seconds"}
+
+    def observe(self, timings, status, seconds):
+        endpoint = timings.endpoint
+        with self._lock:
+            key = (endpoint, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            duration = self.durations.setdefault(endpoint, {"buckets": [0] * len(DURATION_BUCKETS), "sum": 0.0, "count": 0})
+            for pos, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    duration["buckets"][pos] += 1
+            duration["sum"] += seconds
+            duration["count"] += 1
+            for name, entry in timings.stages.items():
+                totals = self.stages.setdefault((endpoint, name), {"seconds": 0.0, "calls": 0, "rows": 0, "bytes": 0})
+                for field in totals:
+                    totals[field] += entry[field]
+            if timings.files or timings.cache_hits:
+                files = self.files.setdefault(endpoint, {"parsed": 0, "cached": 0, "seconds": 0.0})
+                files["parsed"] += len(timings.files)
+                files["cached"] += timings.cache_hits
+                files["seconds"] += sum(record["seconds"] for record in timings.files)
+
+    def render(self, extra=None):
+        """
+        Returns: the metrics as Prometheus text; extra is a list of (name, type, help, [(labels dict, value)])
+        appended after the request metrics.
+        """
+        p = METRIC_PREFIX
+        lines = []
+
+        def family(name, kind, help_text, samples):
+            lines.append(f"# HELP {p}_{name} {help_text}")
+            lines.append(f"# TYPE {p}_{name} {kind}")
+            for suffix, labels, value in samples:
+                lines.append(f"{p}_{name}{suffix}{_labels(**labels) if labels else ''} {value}")
+
+        with self._lock:
+            family('requests_total', 'counter', 'Finished requests by endpoint and status.',
+                   [('', {"endpoint": endpoint, "status": status}, count) for (endpoint, status), count in sorted(self.requests.items())])
+            samples = []
+            for endpoint, duration in sorted(self.durations.items()):
+                for bound, count in zip(DURATION_BUCKETS, duration["buckets"]):
+                    samples.append(('_bucket', {"endpoint": endpoint, "le": bound}, count))
+                samples.append(('_bucket', {"endpoint": endpoint, "le": "+Inf"}, duration["count"]))
+                samples.append(('_sum', {"endpoint": endpoint}, round(duration["sum"], 6)))
+                samples.append(('_count', {"endpoint": endpoint}, duration["count"]))
+            family('request_duration_seconds', 'histogram', 'Request duration, including work finished after the response (jobs, streams).', samples)
+            for field, kind, help_text in (('seconds', 'counter', 'Time spent per stage (file stages summed over workers).'),
+                                           ('calls', 'counter', 'Timed calls per stage.'),
+                                           ('rows', 'counter', 'Rows handled per stage.'),
+                                           ('bytes', 'counter', 'Bytes handled per stage.')):
+                family(f'stage_{field}_total', kind, help_text,
+                       [('', {"endpoint": endpoint, "stage": name}, round(totals[field], 6))
+                        for (endpoint, name), totals in sorted(self.stages.items())])
+            family('files_total', 'counter', 'Uploaded files parsed or served from the result cache.',
+                   [('', {"endpoint": endpoint, "source": source}, files[field])
+                    for endpoint, files in sorted(self.files.items()) for source, field in (('parsed', 'parsed'), ('cache', 'cached'))])
+            family('file_seconds_total', 'counter', 'Time spent parsing files.',
+                   [('', {"endpoint": endpoint}, round(files["seconds"], 6)) for endpoint, files in sorted(self.files.items())])
+
+        for name, kind, help_text, samples in extra or []:
+            family(name, kind, help_text, [('', labels, value) for labels, value in samples])
+        return "\n".join(lines) + "\n"
+
+METRICS = Metrics()
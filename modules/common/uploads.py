@@ -0,0 +1,306 @@
+"""
+Upload ingestion with bounded memory.
+
+The upload endpoints used to read every uploaded workbook into bytes up front
+(file.read() per file), so a 100MB batch sat in memory once as bytes, again in
+each worker, and again as parsed DataFrames - per concurrent request. Now:
+
+- spool_uploads() copies each upload to UPLOAD_SPOOL_DIR (a private directory,
+  see storage.py) in 1MB chunks, hashing on the way (content_key accepts the
+  hash, so cache keys are unchanged). The
+  per-file functions get the path and read one workbook at a time, so at most
+  one file per worker is parsed in memory at once.
+- MemoryBudget is a process-wide budget (UPLOAD_MEMORY_BUDGET_MB) for the
+  estimated peak of all requests in flight. A request that does not fit waits
+  up to UPLOAD_QUEUE_TIMEOUT seconds for others to finish (503 after that);
+  one that could never fit is rejected with 413.
+- MemoryMonitor samples the RSS of this process and its pool workers while the
+  request runs; the increase is reported as peak_memory_mb.
+
+ingest_uploads() ties the three together for a route.
+"""
+import os
+import re
+import time
+import hashlib
+import tempfile
+import threading
+
+from modules.common.storage import private_directory
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+DEFAULT_QUEUE_TIMEOUT = 30
+SPOOL_CHUNK_SIZE = 1024 * 1024
+SAFE_EXTENSION = re.compile(r'^\.[a-z0-9]{1,5}$')
+
+# Measured on a 50k-row vendor workbook (benchmarks/sheet_reader.py): streaming a
+# 3.3 MB .xlsx in SHEET_CHUNK_ROWS chunks peaks ~18 MB over the idle process (~72 MB
+# with a whole-sheet pd.read_excel); the parsed rows of a file keep ~38 MB.
+PARSE_MEMORY_FACTOR = 8
+RESULT_MEMORY_FACTOR = 12
+
+# A vendor sheet row (23-24 columns) takes ~70 bytes of .xlsx; the endpoints size their
+# result factor as the bytes one parsed row keeps in flight over this (see row_factor)
+XLSX_ROW_BYTES = 70
+
+MB = 1024 * 1024
+
+class UploadRejected(Exception):
+    """The request does not fit in the memory budget; status is the HTTP code to answer with."""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+# --- SPOOLING ---
+
+class SpooledUpload:
+    def __init__(self, filename, path, size, digest):
+        self.filename = filename
+        self.path = path
+        self.size = size
+        self.digest = digest # hashlib.sha256 over the bytes (see content_key)
+
+def spool_uploads(files, directory):
+    """
+    Copies uploaded FileStorage objects to temporary files without holding them in memory.
+    Returns: [SpooledUpload] in upload order
+    """
+    private_directory(directory)
+    uploads = []
+    try:
+        for file in files:
+            digest = hashlib.sha256()
+            size = 0
+            # Keep the extension: openpyxl picks (and checks) the format from a path's suffix
+            ext = os.path.splitext(file.filename or '')[1].lower()
+            fd, path = tempfile.mkstemp(suffix=ext if SAFE_EXTENSION.match(ext) else '.upload', dir=directory)
+            uploads.append(SpooledUpload(file.filename, path, 0, digest))
+            with os.fdopen(fd, 'wb') as out:
+                while True:
+                    chunk = file.stream.read(SPOOL_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+            uploads[-1].size = size
+            file.close()
+    except Exception:
+        remove_uploads(uploads)
+        raise
+    return uploads
+
+def remove_uploads(uploads):
+    for upload in uploads:
+        try:
+            os.remove(upload.path)
+        except FileNotFoundError:
+            pass
+
+def row_factor(row_bytes):
+    """Result memory factor of an endpoint whose parsed vendor rows keep row_bytes each."""
+    return row_bytes / XLSX_ROW_BYTES
+
+def estimate_request_memory(sizes, workers=1, parse_factor=PARSE_MEMORY_FACTOR, result_factor=RESULT_MEMORY_FACTOR):
+    """
+    Expected peak bytes of one request: the largest files parsed at the same time
+    (one per worker, parse_factor times their size) plus the results of all files
+    (result_factor times the total upload size).
+    """
+    in_parse = sum(sorted(sizes, reverse=True)[:max(1, workers)])
+    return int(in_parse * parse_factor + sum(sizes) * result_factor)
+
+# --- MEMORY BUDGET ---
+
+class MemoryBudget:
+    def __init__(self, limit_bytes, queue_timeout=DEFAULT_QUEUE_TIMEOUT):
+        self.limit_bytes = limit_bytes
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, nbytes):
+        """
+        Reserves nbytes, waiting up to queue_timeout for other requests to release theirs.
+        Raises UploadRejected (413 larger than the whole budget, 503 still busy after the wait).
+        """
+        if nbytes > self.limit_bytes:
+            raise UploadRejected(
+                f"Upload needs about {nbytes / MB:,.0f} MB to process, over the server limit of "
+                f"{self.limit_bytes / MB:,.0f} MB. Please upload fewer or smaller files at once.", 413)
+        deadline = time.monotonic() + self.queue_timeout
+        with self._cond:
+            self.waiting += 1
+            try:
+                while self.in_flight + nbytes > self.limit_bytes:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise UploadRejected("Server is busy processing other uploads, please try again shortly.", 503)
+                    self._cond.wait(remaining)
+                self.in_flight += nbytes
+            finally:
+                self.waiting -= 1
+
+    def release(self, nbytes):
+        with self._cond:
+            self.in_flight = max(0, self.in_flight - nbytes)
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "limit_mb": round(self.limit_bytes / MB, 1),
+                "in_flight_mb": round(self.in_flight / MB, 1),
+                "waiting": self.waiting
+            }
+
+def default_budget_mb():
+    """Half of the physical memory (1024 MB when it cannot be read)."""
+    try:
+        return os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') / 2 / MB
+    except (ValueError, OSError, AttributeError):
+        return 1024
+
+def get_memory_budget(app):
+    """The process-wide budget from UPLOAD_MEMORY_BUDGET_MB / UPLOAD_QUEUE_TIMEOUT, created on first use."""
+    if 'memory_budget' not in app.extensions:
+        limit_mb = float(app.config.get('UPLOAD_MEMORY_BUDGET_MB') or default_budget_mb())
+        timeout = float(app.config.get('UPLOAD_QUEUE_TIMEOUT') or DEFAULT_QUEUE_TIMEOUT)
+        app.extensions['memory_budget'] = MemoryBudget(int(limit_mb * MB), timeout)
+    return app.extensions['memory_budget']
+
+# --- PEAK MEMORY ---
+
+def _rss_bytes(pid='self'):
+    with open(f'/proc/{pid}/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+def _child_pids():
+    pids = []
+    try:
+        for task in os.listdir('/proc/self/task'):
+            with open(f'/proc/self/task/{task}/children') as f:
+                pids.extend(f.read().split())
+    except OSError:
+        pass
+    return pids
+
+def process_tree_rss():
+    """RSS of this process plus its direct children (pool workers), or None off Linux."""
+    try:
+        total = _rss_bytes()
+    except OSError:
+        return None
+    for pid in _child_pids():
+        try:
+            total += _rss_bytes(pid)
+        except OSError:
+            pass # worker exited between listing and reading
+    return total
+
+class MemoryMonitor:
+    """
+    Samples process_tree_rss() every interval seconds in a background thread.
+    Without /proc, falls back to the growth of ru_maxrss (this process only; None on Windows).
+    """
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self.baseline = None
+        self.peak = None
+
+    def __enter__(self):
+        self.baseline = process_tree_rss()
+        if self.baseline is None:
+            self._maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else 0
+            return self
+        self.peak = self.baseline
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self._update()
+
+    def _update(self):
+        rss = process_tree_rss()
+        if rss is not None and rss > self.peak:
+            self.peak = rss
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._update()
+
+    @property
+    def peak_mb(self):
+        """Peak memory growth since the start, in MB."""
+        if self.baseline is None:
+            if resource is None:
+                return None
+            grown_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - self._maxrss
+            return round(max(0, grown_kb) / 1024, 1)
+        if self._thread is not None and not self._stop.is_set():
+            self._update()
+        return round(max(0, self.peak - self.baseline) / MB, 1)
+
+# --- REQUEST INGESTION ---
+
+class IngestedUploads:
+    """
+    Spooled uploads of one request holding a memory reservation. Use as a context
+    manager: on exit the reservation is released and the temporary files deleted.
+    """
+
+    def __init__(self, uploads, budget, reserved):
+        self.uploads = uploads
+        self.budget = budget
+        self.reserved = reserved
+        self.monitor = MemoryMonitor()
+
+    @property
+    def items(self):
+        """(filename, path) per upload, for the per-file functions."""
+        return [(upload.filename, upload.path) for upload in self.uploads]
+
+    @property
+    def peak_memory_mb(self):
+        return self.monitor.peak_mb
+
+    def __enter__(self):
+        self.monitor.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        self.monitor.__exit__(*exc)
+        self.budget.release(self.reserved)
+        remove_uploads(self.uploads)
+
+def ingest_uploads(app, files, workers=1, parse_factor=PARSE_MEMORY_FACTOR, result_factor=RESULT_MEMORY_FACTOR):
+    """
+    Spools the request's files to disk and reserves their estimated memory.
+    parse_factor / result_factor: the endpoint's memory per uploaded byte (see estimate_request_memory).
+    Returns: IngestedUploads; raises UploadRejected when the budget refuses the request
+    """
+    directory = app.config.get('UPLOAD_SPOOL_DIR') or os.path.join(tempfile.gettempdir(), 'uploads')
+    uploads = spool_uploads(files, directory)
+    budget = get_memory_budget(app)
+    reserved = estimate_request_memory([upload.size for upload in uploads], workers, parse_factor, result_factor)
+    try:
+        budget.acquire(reserved)
+    except UploadRejected:
+        remove_uploads(uploads)
+        raise
+    print(f"Uploads: {len(uploads)} files, {sum(u.size for u in uploads) / MB:.1f} MB spooled, "
+          f"{reserved / MB:.0f} MB reserved ({budget.in_flight / MB:.0f}/{budget.limit_bytes / MB:.0f} MB in flight)")
+    return IngestedUploads(uploads, budget, reserved)
@@ -0,0 +1,115 @@
+"""
+Batch export: one INVOICE workbook per city code (or per source file) in a ZIP.
+
+The trips are split by a partition key taken from the vendor file name
+("22-31 Desember 2025_BGR_CSF_REPORT W4.xlsx" -> BGR), each partition gets the
+next invoice number (INV/2025/12/007, INV/2025/12/008, ...), the workbooks are
+built in worker processes and the ZIP is streamed to the client entry by entry
+as they finish, in partition order.
+"""
+import re
+import zipfile
+
+PARTITION_CITY = 'city'
+PARTITION_FILE = 'file'
+PARTITIONS = (PARTITION_CITY, PARTITION_FILE)
+
+# Same Date_Code_ pattern the export uses for the project and file names
+CITY_CODE_PATTERN = re.compile(r'^.+?_([A-Za-z0-9]+)_')
+INVOICE_NO_PATTERN = re.compile(r'^(.*?)(\d+)(\D*)$')
+
+# --- PARTITIONING ---
+
+def partition_key(source_file, partition):
+    """
+    City code (upper case) for PARTITION_CITY; files without one, and PARTITION_FILE, use the file name.
+    """
+    if partition == PARTITION_CITY:
+        match = CITY_CODE_PATTERN.match(source_file)
+        if match:
+            return match.group(1).upper()
+    return source_file
+
+def partition_trips(trips, partition):
+    """
+    Splits trip columns by partition key.
+    Returns: [(key, trips columns)] in order of first appearance
+    """
+    keys = {}
+    rows = {}
+    for pos, source_file in enumerate(trips['source_file']):
+        if source_file not in keys:
+            keys[source_file] = partition_key(source_file, partition)
+        rows.setdefault(keys[source_file], []).append(pos)
+    return [
+        (key, {name: [values[pos] for pos in positions] for name, values in trips.items()})
+        for key, positions in rows.items()
+    ]
+
+def invoice_number(base, offset):
+    """
+    The offset-th invoice number after base, keeping zero padding: ('INV/2025/12/007', 2) -> 'INV/2025/12/009'.
+    A base without a trailing number gets '-2', '-3', ... from the second invoice on.
+    """
+    if not base or offset == 0:
+        return base
+    match = INVOICE_NO_PATTERN.match(base)
+    if not match:
+        return f"{base}-{offset + 1}"
+    prefix, digits, suffix = match.groups()
+    return f"{prefix}{int(digits) + offset:0{len(digits)}d}{suffix}"
+
+# --- ZIP STREAMING ---
+
+class ZipStream:
+    """
+    Write-only target for zipfile. It has no seek(), so zipfile writes data
+    descriptors after each entry and never goes back; take() hands out the bytes
+    written since the last call.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def unique_name(name, used):
+    """'A.xlsx', 'A (2).xlsx', ... so two partitions never overwrite each other in the ZIP."""
+    name = name.replace('/', '_').replace('\\', '_') # no folders from uploaded file names
+    stem, dot, ext = name.rpartition('.')
+    if not dot:
+        stem, ext = name, ''
+    candidate, n = name, 1
+    while candidate in used:
+        n += 1
+        candidate = f"{stem} ({n}){dot}{ext}"
+    used.add(candidate)
+    return candidate
+
+def stream_zip(entries):
+    """
+    Yields a ZIP archive chunk by chunk from (file name, bytes) pairs, one chunk per entry
+    plus the central directory. Workbooks are already compressed, so entries are stored.
+    """
+    stream = ZipStream()
+    used = set()
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for name, data in entries:
+            archive.writestr(unique_name(name, used), data)
+            yield stream.take()
+    yield stream.take()
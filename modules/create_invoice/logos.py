@@ -0,0 +1,109 @@
+"""
+Company logos for the INVOICE and KWITANSI sheets, read from disk once per process.
+
+Each export used to open the PNG twice (os.path.exists + Image(path)), work out
+the aspect ratio, and openpyxl read the file a third time when saving. The
+registry keeps every logo's bytes and pixel size in memory, pre-scales it for
+each target height once, and hands out a fresh LogoImage per sheet (openpyxl
+numbers and anchors images on the instance, so one object cannot be shared),
+which saves the cached bytes instead of re-reading the file.
+"""
+import io
+import os
+
+from openpyxl.drawing.image import Image
+
+try:
+    from PIL import Image as PILImage
+except ImportError: # openpyxl needs Pillow for images; without it exports just have no logo
+    PILImage = None
+
+# Company key (config 'company') -> file under static/create_invoice
+COMPANY_LOGOS = {
+    'chijun': 'chijun_sm_f.png',
+}
+DEFAULT_COMPANY = 'chijun'
+
+# Heights the sheets use: INVOICE at A2, KWITANSI at A4
+INVOICE_LOGO_HEIGHT = 85
+KWITANSI_LOGO_HEIGHT = 60
+LOGO_HEIGHTS = (INVOICE_LOGO_HEIGHT, KWITANSI_LOGO_HEIGHT)
+
+_registries = {}
+
+class LogoImage(Image):
+    """openpyxl Image over bytes already in memory, with a precomputed size."""
+
+    def __init__(self, data, fmt, width, height):
+        self.ref = data
+        self.format = fmt
+        self.width = width
+        self.height = height
+
+    def _data(self):
+        return self.ref
+
+class LogoRegistry:
+    def __init__(self, directory, logos=None):
+        self.directory = directory
+        self._sources = {} # company -> (bytes, format, pixel width, pixel height)
+        self._sizes = {}   # (company, height) -> (width, height)
+        for company, filename in (logos or COMPANY_LOGOS).items():
+            self.register(company, os.path.join(directory, filename))
+
+    def register(self, company, source):
+        """
+        Loads a logo (path or bytes) and pre-scales it for LOGO_HEIGHTS.
+        Returns: True when loaded; a missing or unreadable file is logged and skipped
+        """
+        if PILImage is None:
+            print(f"Error loading logo {company}: Pillow is not installed")
+            return False
+        try:
+            if isinstance(source, bytes):
+                data = source
+            else:
+                with open(source, 'rb') as f:
+                    data = f.read()
+            with PILImage.open(io.BytesIO(data)) as img:
+                width, height = img.size
+                fmt = (img.format or 'png').lower()
+        except Exception as e:
+            print(f"Error loading logo {company}: {e}")
+            return False
+        self._sources[company] = (data, fmt, width, height)
+        for target_height in LOGO_HEIGHTS:
+            self._sizes.pop((company, target_height), None)
+            self.size(company, target_height)
+        return True
+
+    def size(self, company, target_height):
+        """
+        Logo size at a target height, keeping the aspect ratio (width truncated like before).
+        Returns: (width, height) or None when the company has no logo
+        """
+        key = (company, target_height)
+        if key not in self._sizes:
+            source = self._sources.get(company)
+            if source is None:
+                return None
+            _, _, width, height = source
+            self._sizes[key] = (int(target_height * (width / height)), target_height)
+        return self._sizes[key]
+
+    def image(self, company, target_height):
+        """
+        A new LogoImage for one sheet.
+        Returns: LogoImage or None when the company has no logo
+        """
+        size = self.size(company, target_height)
+        if size is None:
+            return None
+        data, fmt, _, _ = self._sources[company]
+        return LogoImage(data, fmt, *size)
+
+def get_logo_registry(root_path):
+    """Registry of the app's static/create_invoice logos, created once per process."""
+    if root_path not in _registries:
+        _registries[root_path] = LogoRegistry(os.path.join(root_path, 'static', 'create_invoice'))
+    return _registries[root_path]
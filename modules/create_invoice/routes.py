@@ -1,78 +1,264 @@
-import os
 import io
+import numpy as np
 import pandas as pd
-from flask import Blueprint, render_template, request, jsonify, send_file, current_app
+from flask import Blueprint, Response, render_template, request, jsonify, send_file, current_app
 from werkzeug.utils import secure_filename
 from openpyxl import load_workbook
-from openpyxl.drawing.image import Image
-from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
+from openpyxl.styles import PatternFill, Font, Alignment, Border, Side, NamedStyle
+from openpyxl.styles.fonts import DEFAULT_FONT
 from datetime import datetime, date
 import re
+from functools import lru_cache
+from modules.common import (
+    parse_amount_series, MODE_THREE_DIGIT, content_key, get_result_cache, run_cached,
+    iter_ordered, resolve_workers
+)
+from modules.common.downloads import inline_downloads
+from modules.common.jobs import respond
+from modules.common.sheet_reader import DEFAULT_CHUNK_ROWS, SheetChunks
+from modules.common.timing import (
+    STAGE_AGGREGATE, STAGE_CLEAN, STAGE_READ, STAGE_SERIALIZE, STAGE_VALIDATE, STAGE_WRITE,
+    request_timings, source_size, stage, timed_iter
+)
+from modules.common.uploads import UploadRejected, ingest_uploads, row_factor
+from modules.create_invoice.batch import PARTITION_CITY, PARTITIONS, partition_trips, invoice_number, stream_zip
+from modules.create_invoice.logos import DEFAULT_COMPANY, INVOICE_LOGO_HEIGHT, KWITANSI_LOGO_HEIGHT, get_logo_registry
+from modules.create_invoice.terbilang import terbilang_rupiah
+from modules.create_invoice.transport import (
+    FORMAT_COLUMNAR, TRIP_COLUMNS, empty_columns, columns_to_records, records_to_columns,
+    encode_trips, decode_trips, get_trip_store, save_trips, load_trips
+)
 from . import create_invoice_bp
 
+# Bump when row extraction changes so cached per-file results are not reused
+PARSER_VERSION = 2
+
+# Memory a parsed trip row keeps in flight until the response is sent (trip columns, then
+# records and their JSON): ~1.5 KB measured on 4 x 50k-row uploads (see modules/common/uploads.py)
+RESULT_ROW_BYTES = 1500
+
+# --- STYLES ---
+# Built once at import and shared by every export
+ORANGE_FILL = PatternFill(start_color="ED7D31", end_color="ED7D31", fill_type="solid")
+BLACK_FONT_BOLD = Font(color="000000", bold=True, name="Calibri", size=11)
+THIN_BORDER = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
+CENTER_ALIGN = Alignment(horizontal='center', vertical='center')
+ACCOUNTING_ALIGN = Alignment(horizontal='right', vertical='center')
+
+# Header, bank and signature blocks
+THIN_SIDE = Side(style='thin')
+BOLD_FONT = Font(bold=True)
+BOLD_FONT_11 = Font(bold=True, size=11)
+CALIBRI_FONT = Font(name='Calibri', size=11)
+CALIBRI_FONT_BOLD = Font(name='Calibri', size=11, bold=True)
+CENTER_WRAP_ALIGN = Alignment(horizontal='center', vertical='center', wrap_text=True)
+CENTER_H_ALIGN = Alignment(horizontal='center')
+LEFT_ALIGN = Alignment(horizontal='left')
+RIGHT_ALIGN = Alignment(horizontal='right')
+RIGHT_TOP_ALIGN = Alignment(horizontal='right', vertical='top')
+TOP_WRAP_ALIGN = Alignment(wrap_text=True, vertical='top')
+TOP_LEFT_WRAP_ALIGN = Alignment(wrap_text=True, vertical='top', horizontal='left')
+BOTTOM_BORDER = Border(bottom=THIN_SIDE)
+DOUBLE_BOTTOM_BORDER = Border(bottom=Side(style='double'))
+OPEN_BOTTOM_BORDER = Border(left=THIN_SIDE, right=THIN_SIDE, top=THIN_SIDE)
+OPEN_TOP_BORDER = Border(left=THIN_SIDE, right=THIN_SIDE, bottom=THIN_SIDE)
+
+@lru_cache(maxsize=None)
+def edge_border(left=False, right=False, top=False, bottom=False):
+    """Thin border on the given edges of a box; one shared object per combination."""
+    return Border(left=THIN_SIDE if left else None, right=THIN_SIDE if right else None,
+                  top=THIN_SIDE if top else None, bottom=THIN_SIDE if bottom else None)
+
+# Defaults for the parts a named style leaves unset
+NO_FILL = PatternFill()
+NO_BORDER = Border()
+NO_ALIGN = Alignment()
+
+# Accounting Format with Rp: _("Rp"* #,##0_);_("Rp"* (#,##0);_("Rp"* "-"??_);_(@_)
+ACCOUNTING_FORMAT = '_("Rp"* #,##0_);_("Rp"* (#,##0);_("Rp"* "-"??_);_(@_)'
+RUPIAH_FORMAT = 'Rp #,##0'
+
+# Named styles for the repeated table cells. Assigning one (cell.style = name) copies a
+# precomputed style index instead of hashing a Font/Border/Alignment per attribute per cell.
+TABLE_STYLES = {
+    'ci_header': {"font": BLACK_FONT_BOLD, "fill": ORANGE_FILL, "border": THIN_BORDER, "alignment": CENTER_ALIGN},
+    'ci_total_fill': {"fill": ORANGE_FILL, "border": THIN_BORDER},
+    'ci_total_amount': {"font": BLACK_FONT_BOLD, "fill": ORANGE_FILL, "border": THIN_BORDER, "number_format": RUPIAH_FORMAT},
+    'ci_cell': {"border": THIN_BORDER, "alignment": CENTER_ALIGN},
+    'ci_cell_number': {"border": THIN_BORDER, "alignment": CENTER_ALIGN, "number_format": '#,##0'},
+    'ci_cell_rupiah': {"border": THIN_BORDER, "alignment": CENTER_ALIGN, "number_format": RUPIAH_FORMAT},
+    'ci_amount': {"border": THIN_BORDER, "alignment": ACCOUNTING_ALIGN, "number_format": ACCOUNTING_FORMAT},
+}
+
+@create_invoice_bp.record_once
+def preload_logos(state):
+    # Read and size the logos at startup instead of on the first export
+    get_logo_registry(state.app.root_path)
+
 @create_invoice_bp.route('/')
 def index():
     return render_template('create_invoice_index.html')
 
-def safe_float(val):
-    """Safely convert value to float, handling Indonesian formats."""
-    if val is None:
-        return 0.0
-    if isinstance(val, (int, float)):
-        return float(val)
-    
-    s_val = str(val).strip().replace("Rp", "").replace(" ", "")
-    if not s_val:
-        return 0.0
-        
-    # Handle Indonesia thousands separator (.) and decimal (,)
-    if "," in s_val and "." in s_val:
-        if s_val.rfind(',') > s_val.rfind('.'): # 1.234,56
-             s_val = s_val.replace('.', '').replace(',', '.')
+def register_table_styles(workbook):
+    """
+    Adds the TABLE_STYLES named styles to a new export workbook.
+    NamedStyle objects are bound to one workbook, so they are created per export
+    from the shared style objects above.
+    """
+    for name, spec in TABLE_STYLES.items():
+        workbook.add_named_style(NamedStyle(
+            name=name,
+            font=spec.get("font", DEFAULT_FONT),
+            fill=spec.get("fill", NO_FILL),
+            border=spec.get("border", NO_BORDER),
+            alignment=spec.get("alignment", NO_ALIGN),
+            number_format=spec.get("number_format", 'General')
+        ))
+
+# Footer/signature/subtotal rows are recognised by these words in column A or D
+EXCLUDE_KEYWORDS = ['total', 'dibuatkan', 'disetujui', 'sub total', 'grand total', 'manager', 'finance']
+EXCLUDE_PATTERN = re.compile('|'.join(re.escape(k) for k in EXCLUDE_KEYWORDS))
+
+VALID_VEHICLE_TYPES = ['CDDL', 'TWB']
+
+def map_text(series, fn, missing="", dtype=object):
+    """
+    fn(str(cell)) for every present cell, computed once per distinct text.
+    Missing cells (NaN/None/NaT) get `missing`.
+    Returns: ndarray
+    """
+    out = np.full(len(series), missing, dtype=dtype)
+    present = series.notna().to_numpy()
+    if present.any():
+        codes, uniques = pd.factorize(series[present].astype(str))
+        mapped = np.empty(len(uniques), dtype=dtype)
+        mapped[:] = [fn(text) for text in np.asarray(uniques, dtype=object)]
+        out[present] = mapped[codes]
+    return out
+
+def _format_trip_date(raw_date):
+    """Waktu Berangkat -> DD/MM/YYYY for dates; other cells keep their date part, e.g. "23/12/2025 0:58"."""
+    try:
+        if isinstance(raw_date, (pd.Timestamp, datetime, date)):
+            return raw_date.strftime("%d/%m/%Y")
+        return str(raw_date).split()[0] # Take date part
+    except Exception:
+        return str(raw_date)
+
+def format_trip_dates(series):
+    """
+    Column K (Waktu Berangkat) as display strings, '' when empty.
+    Returns: object ndarray
+    """
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        return series.dt.strftime("%d/%m/%Y").fillna("").to_numpy(dtype=object)
+    out = np.full(len(series), "", dtype=object)
+    present = series.notna().to_numpy()
+    out[present] = [_format_trip_date(value) for value in series[present].to_numpy(dtype=object)]
+    return out
+
+# Sheet positions read from vendor files (0-based):
+# A = 0 and D = 3 (footer check, D = No. Surat Jalan)
+# G = 6 (Rute), H = 7 (PlatNo), I = 8 (Jenis Mobil), J = 9 (Trip)
+# K = 10 (Waktu Berangkat)
+# P = 15 (Tarif Sistem, base amount)
+# U = 20 (PPN)
+# V = 21 (PPH)
+# W = 22 (Total)
+INVOICE_COLUMNS = [0, 3, 6, 7, 8, 9, 10, 15, 20, 21, 22]
+
+def extract_chunk_rows(df, filename, tax_mode):
+    """
+    Trip rows of one chunk of a vendor sheet (columns labelled by sheet position, see INVOICE_COLUMNS).
+    Returns: ({field: list}, anomalies)
+    """
+    anomalies = []
+
+    with stage(STAGE_CLEAN, rows=len(df)):
+        # Check for Footer/Signature/Subtotal
+        is_excluded = lambda text: EXCLUDE_PATTERN.search(text.lower()) is not None
+        excluded = map_text(df[0], is_excluded, False, bool) | map_text(df[3], is_excluded, False, bool)
+
+        # Valid Row Logic: Must have No. Surat Jalan (Col D)
+        surat_jalan = map_text(df[3], str.strip)
+        keep = ~excluded & (surat_jalan != "")
+        rows = df[keep]
+        row_nums = (df.index[keep] + 5).tolist() # 1-based, adjusted for header
+
+        strip_upper = lambda text: text.strip().upper()
+        base_amount = parse_amount_series(rows[15], mode=MODE_THREE_DIGIT).tolist() # Col P (Changed from O based on user feedback)
+        columns = {
+            "source_file": [filename] * len(rows),
+            "surat_jalan": surat_jalan[keep].tolist(),
+            "plat_nomor": map_text(rows[7], str.strip).tolist(),
+            "jenis_mobil": map_text(rows[8], strip_upper).tolist(),
+            "rute": map_text(rows[6], str.strip).tolist(), # Col G
+            "trip_type": map_text(rows[9], strip_upper).tolist(), # Col J
+            "date": format_trip_dates(rows[10]).tolist(),
+            "dpp": base_amount,
+            "base_amount_raw": base_amount,
+        }
+
+        # Apply Tax Mode Logic
+        if tax_mode == 'no_tax':
+            # Col P (Tarif Sistem) is the base; without tax the total is the base amount
+            columns["ppn"] = [0] * len(rows)
+            columns["pph"] = [0] * len(rows)
+            columns["base_amount"] = base_amount
+            columns["final_total"] = base_amount
         else:
-             s_val = s_val.replace(',', '')
-    elif "." in s_val: # Check if multiple dots (thousands)
-         if s_val.count(".") > 1:
-             s_val = s_val.replace(".", "")
-         else:
-             # Ambiguous: 1.000 vs 1.5
-             # Assumption: If 3 decimals, likely thousands. If <3, likely decimal.
-             parts = s_val.split(".")
-             if len(parts[1]) == 3:
-                 s_val = s_val.replace(".", "")
-             # Else assume standard float
-    elif "," in s_val:
-        s_val = s_val.replace(",", ".")
-        
+            columns["ppn"] = parse_amount_series(rows[20], mode=MODE_THREE_DIGIT).tolist()
+            columns["pph"] = parse_amount_series(rows[21], mode=MODE_THREE_DIGIT).tolist()
+            columns["base_amount"] = base_amount
+            columns["final_total"] = parse_amount_series(rows[22], mode=MODE_THREE_DIGIT).tolist()
+
+    # Anomaly Checks
+    # 1. Jenis Mobil
+    with stage(STAGE_VALIDATE, rows=len(row_nums)):
+        for row_num, jenis_mobil in zip(row_nums, columns["jenis_mobil"]):
+            if jenis_mobil not in VALID_VEHICLE_TYPES:
+                anomalies.append(f"File {filename} Row {row_num}: Jenis Mobil '{jenis_mobil}' invalid (Expected CDDL/TWB).")
+
+    return columns, anomalies
+
+def extract_invoice_rows(upload, context):
+    """
+    Reads the trip rows of one vendor workbook.
+    The sheet is streamed in chunks of context['chunk_rows'] rows (SheetChunks); every step
+    (exclusion, surat jalan filter, dates, amounts, tax mode) runs column-wise per chunk and
+    text cells are cleaned once per distinct value.
+    upload: (filename, raw bytes or path of the spooled upload)
+    context: {'tax_mode': 'with_tax' or 'no_tax', 'chunk_rows': int or None}
+    Returns: dict with 'columns' ({field: list}, see TRIP_COLUMNS) and 'anomalies' (list of messages)
+    """
+    filename, data = upload
+    tax_mode = context['tax_mode']
+    columns = empty_columns()
+    anomalies = []
+    
     try:
-        return float(s_val)
-    except:
-        return 0.0
-
-def terbilang(n):
-    """Convert number to Indonesian text."""
-    satuan = ["", "SATU", "DUA", "TIGA", "EMPAT", "LIMA", "ENAM", "TUJUH", "DELAPAN", "SEMBILAN", "SEPULUH", "SEBELAS"]
-    n = int(n)
-    if n >= 0 and n <= 11:
-        return " " + satuan[n]
-    elif n < 20:
-        return terbilang(n % 10) + " BELAS"
-    elif n < 100:
-        return terbilang(n / 10) + " PULUH" + terbilang(n % 10)
-    elif n < 200:
-        return " SERATUS" + terbilang(n - 100)
-    elif n < 1000:
-        return terbilang(n / 100) + " RATUS" + terbilang(n % 100)
-    elif n < 2000:
-        return " SERIBU" + terbilang(n - 1000)
-    elif n < 1000000:
-        return terbilang(n / 1000) + " RIBU" + terbilang(n % 1000)
-    elif n < 1000000000:
-        return terbilang(n / 1000000) + " JUTA" + terbilang(n % 1000000)
-    elif n < 1000000000000:
-        return terbilang(n / 1000000000) + " MILYAR" + terbilang(n % 1000000000)
-    else:
-        return ""
+        # Header at row 4 (index 3); only the used columns are converted
+        # A sheet narrower than column W yields no chunks (checked after its first one), so a wrong
+        # file is neither extracted nor buffered before the validation below rejects it
+        reader = SheetChunks(data, INVOICE_COLUMNS, header=3, chunk_rows=context.get('chunk_rows') or DEFAULT_CHUNK_ROWS,
+                             min_width=23)
+        for df in timed_iter(STAGE_READ, reader, nbytes=source_size(data)):
+            chunk_columns, chunk_anomalies = extract_chunk_rows(df, filename, tax_mode)
+            with stage(STAGE_AGGREGATE):
+                for name in TRIP_COLUMNS:
+                    columns[name].extend(chunk_columns[name])
+                anomalies.extend(chunk_anomalies)
+        
+        # Basic validation
+        if reader.width < 23:
+            return {"columns": empty_columns(), "anomalies": [f"File {filename}: Invalid format (columns missing)."]}
+            
+    except Exception as e:
+        # Flagged so the result cache does not keep a failure that may be transient
+        anomalies.append(f"File {filename}: Error processing ({str(e)})")
+        return {"columns": empty_columns(), "anomalies": anomalies, "error": str(e)}
+
+    return {"columns": columns, "anomalies": anomalies}
 
 @create_invoice_bp.route('/process', methods=['POST'])
 def process_files():
@@ -81,126 +267,285 @@ def process_files():
     
     files = request.files.getlist('files')
     tax_mode = request.form.get('tax_mode', 'with_tax') # 'with_tax' or 'no_tax'
+    # 'records' (default): data is a list of row dicts
+    # 'columnar': trips are column arrays, plus a handle /export can use instead of the rows
+    response_format = request.form.get('format', 'records')
     
-    all_data = []
-    anomalies = []
-    
-    # Target Columns (Based on Image)
-    # Col indices (0-based):
-    # D = 3 (No. Surat Jalan)
-    # H = 7 (PlatNo)
-    # I = 8 (Jenis Mobil)
-    # U = 20 (PPN)
-    # V = 21 (PPH)
-    # W = 22 (Total)
-    
-    for file in files:
-        filename = file.filename
-        try:
-            # Load with header at row 4 (index 3)
-            df = pd.read_excel(file, header=3, engine='openpyxl')
-            
-            # Basic validation
-            if df.shape[1] < 23:
-                anomalies.append(f"File {filename}: Invalid format (columns missing).")
-                continue
-                
-            # Iterate and clean
-            for idx, row in df.iterrows():
-                row_num = idx + 5 # 1-based, adjusted for header
-                
-                # Check for Footer/Signature/Subtotal
-                col_a = str(row.iloc[0]).lower() if pd.notna(row.iloc[0]) else ""
-                col_d = str(row.iloc[3]).lower() if pd.notna(row.iloc[3]) else ""
-                
-                # Exclusion keywords
-                exclude_keywords = ['total', 'dibuatkan', 'disetujui', 'sub total', 'grand total', 'manager', 'finance']
-                if any(k in col_a for k in exclude_keywords) or any(k in col_d for k in exclude_keywords):
-                    continue
-                
-                # Valid Row Logic: Must have No. Surat Jalan (Col D)
-                surat_jalan = row.iloc[3]
-                if pd.isna(surat_jalan) or str(surat_jalan).strip() == "":
-                    continue
-                    
-                # Extract Data
-                # Date Processing: Col K (Index 10) "Waktu Berangkat"
-                raw_date = row.iloc[10]
-                fmt_date = ""
-                try:
-                    if pd.notna(raw_date):
-                        # If datetime object
-                        if isinstance(raw_date, (pd.Timestamp, datetime, date)):
-                             fmt_date = raw_date.strftime("%d/%m/%Y")
-                        else:
-                             # String parsing if needed, e.g. "23/12/2025 0:58"
-                             # For now, keep as string or try basic parse
-                             s_date = str(raw_date).split()[0] # Take date part
-                             fmt_date = s_date
-                except:
-                    fmt_date = str(raw_date)
-
-                item = {
-                    "source_file": filename,
-                    "surat_jalan": str(surat_jalan).strip(),
-                    "plat_nomor": str(row.iloc[7]).strip() if pd.notna(row.iloc[7]) else "",
-                    "jenis_mobil": str(row.iloc[8]).strip().upper() if pd.notna(row.iloc[8]) else "",
-                    "rute": str(row.iloc[6]).strip() if pd.notna(row.iloc[6]) else "", # Col G
-                    "trip_type": str(row.iloc[9]).strip().upper() if pd.notna(row.iloc[9]) else "", # Col J
-                    "date": fmt_date,
-                    "dpp": safe_float(row.iloc[15]) if df.shape[1] > 15 else 0,
-                    "base_amount_raw": safe_float(row.iloc[15]), # Col P (Changed from O based on user feedback)
-                }
-                
-                raw_ppn = safe_float(row.iloc[20])
-                raw_pph = safe_float(row.iloc[21])
-                raw_total = safe_float(row.iloc[22])
-                
-                # Apply Tax Mode Logic
-                if tax_mode == 'no_tax':
-                    item['ppn'] = 0
-                    item['pph'] = 0
-                    # Recalculate Total: Start with Total, subtract tax? 
-                    # Or is Total Column W inclusive? 
-                    # Formula in header: "Total setelah tax".
-                    # If No Tax, we should probably take the Pre-Tax value?
-                    # Col P (Tarif Sistem) seems to be the base. Or Col O (Harga sebulum tax)?
-                    # User said Col P is correct base.
-                    base_amount = safe_float(row.iloc[15])
-                    item['base_amount'] = base_amount
-                    item['final_total'] = base_amount # No Tax
+    # Uploads are spooled to disk and parsed one at a time within the memory budget
+    try:
+        uploads = ingest_uploads(current_app, files, result_factor=row_factor(RESULT_ROW_BYTES))
+    except UploadRejected as e:
+        return jsonify({"error": str(e)}), e.status
+
+    # The parsing runs inline, as a background job with ?async=1 or streamed per file with
+    # ?stream=ndjson|sse (see modules/common/jobs.py and modules/common/streaming.py)
+    def work(progress):
+        columns = empty_columns()
+        anomalies = []
+        count = 0
+        # A stream sends each file's trips as it is parsed; they are only kept for the handle
+        keep_columns = not progress.streaming or (response_format == FORMAT_COLUMNAR and not inline_downloads(current_app.config))
+
+        def report_file(pos, result):
+            file_columns = result["columns"]
+            rows = len(file_columns["surat_jalan"])
+            event = {
+                "index": pos,
+                "file": uploads.uploads[pos].filename,
+                "rows": rows,
+                "status": "Warning" if result["anomalies"] else "Success",
+                "anomalies": result["anomalies"]
+            }
+            data = None
+            if progress.streaming:
+                with stage(STAGE_SERIALIZE, rows=rows):
+                    data = {"trips": encode_trips(file_columns)} if response_format == FORMAT_COLUMNAR else {"data": columns_to_records(file_columns)}
+            progress.file_done(rows=rows, event=event, data=data)
+
+        with uploads:
+            # Unchanged re-uploads (same bytes, name and tax mode) are served from the result cache
+            keys = [content_key(upload.digest, upload.filename, PARSER_VERSION, tax_mode) for upload in uploads.uploads]
+            progress.update(stage='reading files')
+            for result in run_cached(extract_invoice_rows, uploads.items, keys, cache=get_result_cache(current_app),
+                                     context={"tax_mode": tax_mode, "chunk_rows": current_app.config.get('SHEET_CHUNK_ROWS')},
+                                     on_result=report_file, timings=request_timings(),
+                                     cacheable=lambda result: "error" not in result):
+                with stage(STAGE_AGGREGATE):
+                    count += len(result["columns"]["surat_jalan"])
+                    if keep_columns:
+                        for name in TRIP_COLUMNS:
+                            columns[name].extend(result["columns"][name])
+                    anomalies.extend(result["anomalies"])
+            progress.update(stage='encoding', rows=count)
+
+            # Serverless instances cannot serve the handle later; the browser then posts the trips back
+            handle = None
+            if response_format == FORMAT_COLUMNAR and count and not inline_downloads(current_app.config):
+                with stage(STAGE_WRITE, rows=count):
+                    handle = save_trips(get_trip_store(current_app), columns)
+
+            with stage(STAGE_SERIALIZE, rows=0 if progress.streaming else count) as size:
+                if progress.streaming:
+                    # The trips and anomalies already went out with each file
+                    body = {"handle": handle, "anomaly_count": len(anomalies), "count": count}
+                elif response_format == FORMAT_COLUMNAR:
+                    body = {
+                        "trips": encode_trips(columns),
+                        "handle": handle,
+                        "anomalies": anomalies,
+                        "count": count
+                    }
                 else:
-                    item['ppn'] = raw_ppn
-                    item['pph'] = raw_pph
-                    item['base_amount'] = safe_float(row.iloc[15])
-                    item['final_total'] = raw_total
-                
-                # Anomaly Checks
-                # 1. Jenis Mobil
-                if item['jenis_mobil'] not in ['CDDL', 'TWB']:
-                     anomalies.append(f"File {filename} Row {row_num}: Jenis Mobil '{item['jenis_mobil']}' invalid (Expected CDDL/TWB).")
-                
-                all_data.append(item)
-                
-        except Exception as e:
-            anomalies.append(f"File {filename}: Error processing ({str(e)})")
-
-    return jsonify({
-        "data": all_data,
-        "anomalies": anomalies,
-        "count": len(all_data)
-    })
+                    body = {
+                        "data": columns_to_records(columns),
+                        "anomalies": anomalies,
+                        "count": count
+                    }
+                body["summary"] = {"total_files": len(files), "peak_memory_mb": uploads.peak_memory_mb}
+                response = jsonify(body)
+                size["bytes"] = response.content_length or 0
+
+        return response
+
+    return respond('create_invoice.process', work, files_total=len(files), streamable=True)
+
+MONTHS_ID = {
+    1: 'Januari', 2: 'Februari', 3: 'Maret', 4: 'April', 5: 'Mei', 6: 'Juni',
+    7: 'Juli', 8: 'Agustus', 9: 'September', 10: 'Oktober', 11: 'November', 12: 'Desember'
+}
+
+RINCIAN_COLUMNS = ["NO", "TANGGAL", "RUTE", "KODE TUGAS", "TIPE UNIT", "TRIP", "NO POLISI", "HARGA"]
+
+def period_labels(min_date, max_date):
+    """
+    Period strings for a date range (None, None when there are no dates).
+    Returns: (INVOICE label with English month names, RINCIAN RITASE label with Indonesian month names)
+    """
+    if min_date is None:
+        return "Periode -", "Periode -"
+
+    # Format: 15-21 December 2025 (English %B names on the INVOICE sheet)
+    period_en = f"Periode {min_date.strftime('%d %B %Y')} - {max_date.strftime('%d %B %Y')}"
+    # Simplified "15-21 Month Year" if same month/year
+    if min_date.month == max_date.month and min_date.year == max_date.year:
+        period_en = f"Periode {min_date.day}-{max_date.day} {min_date.strftime('%B %Y')}"
+
+    m_start = MONTHS_ID[min_date.month]
+    m_end = MONTHS_ID[max_date.month]
+    if min_date.month == max_date.month and min_date.year == max_date.year:
+        period_id = f"Periode {min_date.day}-{max_date.day} {m_start} {min_date.year}"
+    elif min_date.year == max_date.year:
+        period_id = f"Periode {min_date.day} {m_start} - {max_date.day} {m_end} {min_date.year}"
+    else:
+        period_id = f"Periode {min_date.day} {m_start} {min_date.strftime('%Y')} - {max_date.day} {m_end} {max_date.strftime('%Y')}"
+    return period_en, period_id
+
+def aggregate_trips(trips, tax_mode):
+    """
+    Single aggregation pass over the exported trips, shared by every sheet writer.
+    trips: export columns ({field: list}, see transport.EXPORT_DEFAULTS)
+    Returns: dict with
+        trips: RINCIAN KENDARAAN frame (RINCIAN_COLUMNS, one row per trip)
+        groups: one row per RUTE / TIPE UNIT / TRIP, sorted by RUTE, with TOTAL_RITASE,
+                HARGA_RIT, TOTAL_HARGA and PPN (the index is the group's position before sorting)
+        period, period_id: period labels (see period_labels)
+        total_dpp, total_ppn, total_pph, final_payment
+    """
+    # The frame is built from the columns directly; the trips never become per-row dicts
+    trip_types = [trip.upper() for trip in trips['trip_type']]
+    dates = trips['date']
+    frame = pd.DataFrame({
+        "NO": range(1, len(dates) + 1),
+        "TANGGAL": dates,
+        "RUTE": trips['rute'],
+        "KODE TUGAS": trips['surat_jalan'],
+        "TIPE UNIT": trips['jenis_mobil'],
+        "TRIP": ['SINGLE TRIP' if 'SEPIHAK' in trip else trip for trip in trip_types],
+        "NO POLISI": trips['plat_nomor'],
+        "HARGA": trips['base_amount_raw']
+    }, columns=RINCIAN_COLUMNS)
+
+    # Date range: each distinct DD/MM/YYYY string is parsed once
+    parsed = []
+    for d_str in set(d for d in dates if d):
+        try:
+            parsed.append(datetime.strptime(d_str, "%d/%m/%Y"))
+        except (TypeError, ValueError):
+            pass
+    period, period_id = period_labels(min(parsed), max(parsed)) if parsed else period_labels(None, None)
+
+    if not frame.empty:
+        groups = frame.groupby(['RUTE', 'TIPE UNIT', 'TRIP']).agg(
+            TOTAL_RITASE=('NO', 'count'),
+            HARGA_RIT=('HARGA', 'first'), # Assume same price for same group
+            TOTAL_HARGA=('HARGA', 'sum')
+        ).reset_index().sort_values(by=['RUTE'])
+    else:
+        groups = pd.DataFrame(columns=['RUTE', 'TIPE UNIT', 'TRIP', 'TOTAL_RITASE', 'HARGA_RIT', 'TOTAL_HARGA'])
+
+    # PPN Calculation (1.1% based on image)
+    # Image: DPP 8.460.000, PPN 93.060 (approx 1.1%)
+    groups['PPN'] = groups['TOTAL_HARGA'] * 0.011 if tax_mode == 'with_tax' else 0
+
+    # Summed in group order, like the per-row totals of the INVOICE sheet
+    total_dpp = sum(groups['TOTAL_HARGA'].tolist())
+    total_ppn = sum(groups['PPN'].tolist())
+    total_pph = total_dpp * 0.02
+    # New Tax Logic: Final = DPP + PPN - PPh
+    final_payment = total_dpp + total_ppn - total_pph if tax_mode == 'with_tax' else total_dpp
+
+    return {
+        "trips": frame,
+        "groups": groups,
+        "period": period,
+        "period_id": period_id,
+        "total_dpp": total_dpp,
+        "total_ppn": total_ppn,
+        "total_pph": total_pph,
+        "final_payment": final_payment
+    }
+
+def load_request_trips(req_data):
+    """
+    Trips of an export request: a /process handle, columnar trips, or the legacy record list ('data').
+    Returns: (trips columns, None) or (None, error response)
+    """
+    if req_data.get('handle'):
+        trips = load_trips(get_trip_store(current_app), req_data['handle'])
+        if trips is None:
+            return None, (jsonify({"error": "Processed data expired, please send the trips again"}), 410)
+    elif 'trips' in req_data:
+        trips = decode_trips(req_data['trips'])
+        if trips is None:
+            return None, (jsonify({"error": "Invalid trips payload"}), 400)
+    else:
+        trips = records_to_columns(req_data.get('data') or [])
+
+    if not trips['surat_jalan']:
+        return None, (jsonify({"error": "No data"}), 400)
+    return trips, None
 
 @create_invoice_bp.route('/export', methods=['POST'])
 def export_excel():
     req_data = request.json
-    data = req_data.get('data', [])
     config = req_data.get('config', {}) # {bill_to, ship_to, inv_no, inv_date, due_date, bank_info, currency, tax_rate}
+    with stage(STAGE_READ, nbytes=request.content_length or 0) as size:
+        trips, error = load_request_trips(req_data)
+        size["rows"] = len(trips['surat_jalan']) if trips else 0
+    if error:
+        return error
+
+    # Built inline, or as a background job with ?async=1
+    def work(progress):
+        progress.update(stage='building workbook', rows=len(trips['surat_jalan']))
+        with stage(STAGE_WRITE, rows=len(trips['surat_jalan'])) as size:
+            output, export_name = build_invoice_workbook(trips, config, current_app.root_path)
+            size["bytes"] = output.getbuffer().nbytes
+        return send_file(
+            output,
+            download_name=export_name,
+            as_attachment=True,
+            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+
+    return respond('create_invoice.export', work)
+
+@create_invoice_bp.route('/export-batch', methods=['POST'])
+def export_batch():
+    """
+    One workbook per partition ('city' code from the file name, or 'file') in a streamed ZIP.
+    Invoice numbers count up from config.invoice_no in partition order; 'overrides'
+    ({partition key: {config fields}}) adjusts single invoices, e.g. another bill_to.
+    """
+    req_data = request.json
+    config = req_data.get('config', {})
+    partition = req_data.get('partition', PARTITION_CITY)
+    if partition not in PARTITIONS:
+        return jsonify({"error": f"Unknown partition '{partition}'"}), 400
+    trips, error = load_request_trips(req_data)
+    if error:
+        return error
+
+    partitions = partition_trips(trips, partition)
+    items = [(key, part, invoice_number(config.get('invoice_no', ''), pos)) for pos, (key, part) in enumerate(partitions)]
+    workers = resolve_workers(current_app.config, len(items))
+    context = {"config": config, "overrides": req_data.get('overrides') or {}, "root_path": current_app.root_path}
+    print(f"Batch export: {len(items)} invoices by {partition}, {workers} worker(s)")
+
+    workbooks = iter_ordered(build_partition_workbook, items, workers=workers, context=context)
+    return Response(
+        stream_zip(workbooks),
+        mimetype='application/zip',
+        headers={
+            "Content-Disposition": 'attachment; filename="Invoice_Batch.zip"',
+            "X-Invoice-Count": str(len(items))
+        }
+    )
+
+def build_partition_workbook(item, context):
+    """
+    Batch worker: the workbook for one partition.
+    Returns: (file name, bytes); a text file with the error when the workbook fails
+    """
+    key, trips, invoice_no = item
+    config = {**context["config"], "invoice_no": invoice_no, **context["overrides"].get(key, {})}
+    try:
+        output, export_name = build_invoice_workbook(trips, config, context["root_path"])
+        return export_name, output.getvalue()
+    except Exception as e:
+        print(f"Batch export failed for {key}: {e}")
+        return f"ERROR {key}.txt", f"Invoice {invoice_no} for {key} could not be generated: {e}".encode('utf-8')
+
+def build_invoice_workbook(trips, config, root_path):
+    """
+    INVOICE, KWITANSI, RINCIAN RITASE and RINCIAN KENDARAAN workbook for one set of trips.
+    root_path is the app root (for the logos), so this also runs in batch worker processes.
+    Returns: (BytesIO at position 0, download file name)
+    """
     tax_mode = config.get('tax_mode', 'with_tax') # Default to with_tax or no_tax based on pref, defaulting safely
-    
-    if not data:
-        return jsonify({"error": "No data"}), 400
-        
+    logos = get_logo_registry(root_path)
+    company = config.get('company') or DEFAULT_COMPANY
+
     def format_date_indo(date_str):
         if not date_str: return ""
         try:
@@ -218,62 +563,16 @@ def export_excel():
     # Create Workbook
     with pd.ExcelWriter(output, engine='openpyxl') as writer:
         # Styles
-        orange_fill = PatternFill(start_color="ED7D31", end_color="ED7D31", fill_type="solid")
-        white_font_bold = Font(color="FFFFFF", bold=True, name="Calibri", size=11)
-        black_font_bold = Font(color="000000", bold=True, name="Calibri", size=11)
-        title_font = Font(color="000000", bold=True, name="Calibri", size=11)
-        subtitle_font = Font(color="000000", bold=True, name="Calibri", size=11)
-        thin_border = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
-        center_align = Alignment(horizontal='center', vertical='center')
-        left_align = Alignment(horizontal='left', vertical='center')
-        right_align = Alignment(horizontal='right', vertical='center')
+        register_table_styles(writer.book)
+        black_font_bold = BLACK_FONT_BOLD
+        thin_border = THIN_BORDER
+        center_align = CENTER_ALIGN
         
         # --- PREPARE DATA ---
-        rincian_data = []
-        all_dates = []
-        
-        for idx, item in enumerate(data):
-            trip_map = item.get('trip_type', '').upper()
-            if 'SEPIHAK' in trip_map: trip_map = 'SINGLE TRIP'
-            
-            price = item.get('base_amount_raw', 0)
-            
-            # Collect dates for range
-            d_str = item.get('date', '')
-            if d_str:
-                try:
-                    # Try parse DD/MM/YYYY
-                    dt = datetime.strptime(d_str, "%d/%m/%Y")
-                    all_dates.append(dt)
-                except:
-                    pass
-
-            rincian_data.append({
-                "NO": idx + 1,
-                "TANGGAL": d_str,
-                "RUTE": item.get('rute', ''),
-                "KODE TUGAS": item.get('surat_jalan', ''),
-                "TIPE UNIT": item.get('jenis_mobil', ''),
-                "TRIP": trip_map,
-                "NO POLISI": item.get('plat_nomor', ''),
-                "HARGA": price
-            })
-            
-        df_rk = pd.DataFrame(rincian_data)
-        
-        # Determine Period String
-        period_str = "Periode -"
-        if all_dates:
-            min_date = min(all_dates)
-            max_date = max(all_dates)
-            # Format: 15-21 Desember 2025
-            # Basic mapping for Month if needed, or just use English for now
-            # To match screenshot "Desember", we might need a locale map, but let's stick to standard format for now
-            period_str = f"Periode {min_date.strftime('%d %B %Y')} - {max_date.strftime('%d %B %Y')}"
-            
-            # Simplified "15-21 Month Year" if same month/year
-            if min_date.month == max_date.month and min_date.year == max_date.year:
-                 period_str = f"Periode {min_date.day}-{max_date.day} {min_date.strftime('%B %Y')}"
+        # Groups, totals and the period are computed once for all four sheets
+        agg = aggregate_trips(trips, tax_mode)
+        df_rk = agg["trips"]
+        period_str = agg["period"]
 
         # --- SHEET 1: INVOICE ---
         # Ensure INVOICE is the first sheet by using the default 'Sheet' if it exists
@@ -289,36 +588,22 @@ def export_excel():
         # Header Info
         # Row 2-6: Company Info (Centered C to I)
         # Logo in A2 (No Merge)
-        # Logo
-        try:
-            logo_path = os.path.join(current_app.root_path, 'static', 'create_invoice', 'chijun_sm_f.png')
-            if os.path.exists(logo_path):
-                img = Image(logo_path)
-                
-                # Resize keeping aspect ratio
-                # Target height matches merge area A2:B5 (4 rows approx 60-80px)
-                target_height = 85 
-                aspect_ratio = img.width / img.height
-                new_width = int(target_height * aspect_ratio)
-                
-                img.height = target_height
-                img.width = new_width
-                
-                ws_inv.add_image(img, 'A2')
-        except Exception as e:
-            print(f"Error loading logo: {e}")
+        # Target height matches merge area A2:B5 (4 rows approx 60-80px)
+        logo = logos.image(company, INVOICE_LOGO_HEIGHT)
+        if logo:
+            ws_inv.add_image(logo, 'A2')
         
         # ws_inv['A2'] = "LOGO"  # Removed placeholder
 
         # Company Text
         ws_inv.merge_cells('C2:H2')
         ws_inv['C2'] = "PT CHIJUN SMART FREIGHT"
-        ws_inv['C2'].font = Font(bold=True, size=11)
+        ws_inv['C2'].font = BOLD_FONT_11
         ws_inv['C2'].alignment = center_align
         
         ws_inv.merge_cells('C3:H4')
         ws_inv['C3'] = "GEDUNG LANDMARK PLUIT TOWER D2 LT 9 RT.0600 RW.000 PLUIT, PENJARINGAN, KOTA ADM. JAKARTA UTARA, DKI JAKARTA\nPhone: (+62) 821-2459-6308"
-        ws_inv['C3'].alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
+        ws_inv['C3'].alignment = CENTER_WRAP_ALIGN
         
         # Row 5: NPWP (Shifted up)
         ws_inv.merge_cells('C5:H5')
@@ -328,7 +613,7 @@ def export_excel():
         # Invoice Title (J-K)
         ws_inv.merge_cells('J3:K5') 
         ws_inv['J3'] = "Invoice"
-        ws_inv['J3'].font = Font(bold=True, size=11)
+        ws_inv['J3'].font = BOLD_FONT_11
         ws_inv['J3'].alignment = center_align
         
         # --- Bill To / Ship To ---
@@ -336,52 +621,44 @@ def export_excel():
         ws_inv['A7'] = "Tagihan Kepada :"
         ws_inv.merge_cells('B7:H7')
         ws_inv['B7'] = config.get('bill_to', '')
-        ws_inv['B7'].font = Font(bold=True)
+        ws_inv['B7'].font = BOLD_FONT
         # Full Border for B7 (Merged B7:H7)
         for c in range(2, 9): # B(2) to H(8)
-            ws_inv.cell(row=7, column=c).border = Border(top=Side(style='thin'), bottom=Side(style='thin'), left=Side(style='thin') if c==2 else None, right=Side(style='thin') if c==8 else None)
+            ws_inv.cell(row=7, column=c).border = edge_border(left=c==2, right=c==8, top=True, bottom=True)
 
         default_address = "Gedung Landmark Pluit Tower, Blok B1 Lantai 8,9A,10A, Jl. Pluit Selatan Raya RT.000, RW.000, Penjaringan\nKota ADM Jakarta Utara, DKI Jakarta"
 
         ws_inv.merge_cells('B8:H10')
         ws_inv['B8'] = config.get('bill_address', default_address)
-        ws_inv['B8'].alignment = Alignment(wrap_text=True, vertical='top')
+        ws_inv['B8'].alignment = TOP_WRAP_ALIGN
         # Box Border for Address B8:H10
         for r_addr in range(8, 11):
             for c in range(2, 9):
-                 border_style = Border(
-                     left=Side(style='thin') if c==2 else None, 
-                     right=Side(style='thin') if c==8 else None,
-                     bottom=Side(style='thin') if r_addr==10 else None
-                 )
+                 border_style = edge_border(left=c==2, right=c==8, bottom=r_addr==10)
                  # Merge existing? No, overwrite safe.
                  ws_inv.cell(row=r_addr, column=c).border = border_style
         
         ws_inv.merge_cells('B11:H11')
         ws_inv['B11'] = "NPWP : " + config.get('bill_npwp', '0735697740041000')
         for c in range(2, 9):
-            ws_inv.cell(row=11, column=c).border = Border(bottom=Side(style='thin'), left=Side(style='thin') if c==2 else None, right=Side(style='thin') if c==8 else None)
+            ws_inv.cell(row=11, column=c).border = edge_border(left=c==2, right=c==8, bottom=True)
         
         ws_inv['A12'] = "Dikirim ke :"
         
         ws_inv.merge_cells('B12:H12')
         ws_inv['B12'] = config.get('ship_to', '')
-        ws_inv['B12'].font = Font(bold=True)
+        ws_inv['B12'].font = BOLD_FONT
         # Full Border for B12
         for c in range(2, 9): 
-            ws_inv.cell(row=12, column=c).border = Border(top=Side(style='thin'), bottom=Side(style='thin'), left=Side(style='thin') if c==2 else None, right=Side(style='thin') if c==8 else None)
+            ws_inv.cell(row=12, column=c).border = edge_border(left=c==2, right=c==8, top=True, bottom=True)
         
         ws_inv.merge_cells('B13:H15')
         ws_inv['B13'] = config.get('ship_address', default_address)
-        ws_inv['B13'].alignment = Alignment(wrap_text=True, vertical='top')
+        ws_inv['B13'].alignment = TOP_WRAP_ALIGN
         # Box Border for Address B13:H15
         for r_addr in range(13, 16):
             for c in range(2, 9):
-                 border_style = Border(
-                     left=Side(style='thin') if c==2 else None, 
-                     right=Side(style='thin') if c==8 else None,
-                     bottom=Side(style='thin') if r_addr==15 else None
-                 )
+                 border_style = edge_border(left=c==2, right=c==8, bottom=r_addr==15)
                  ws_inv.cell(row=r_addr, column=c).border = border_style
 
         # Row 16: No Merge (User Request)
@@ -412,7 +689,7 @@ def export_excel():
         ws_inv['J10'] = "No. Faktur"
         ws_inv['J10'].alignment = center_align
         # No bottom border for Row 10 (User request)
-        no_bottom = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'))
+        no_bottom = OPEN_BOTTOM_BORDER
         ws_inv['J10'].border = no_bottom
         ws_inv['K10'].border = no_bottom
         
@@ -420,7 +697,7 @@ def export_excel():
         ws_inv.merge_cells('J11:K11')
         ws_inv['J11'] = "" 
         # To visually look like one box with Row 10, Row 11 needs NO Top Border.
-        no_top = Border(left=Side(style='thin'), right=Side(style='thin'), bottom=Side(style='thin'))
+        no_top = OPEN_TOP_BORDER
         ws_inv['J11'].border = no_top
         ws_inv['K11'].border = no_top
         
@@ -469,102 +746,51 @@ def export_excel():
         ws_inv['K17'] = "Total Biaya"
         
         for col in ['A', 'B', 'F', 'G', 'H', 'I', 'J', 'K']:
-             c = ws_inv[f'{col}17']
-             c.fill = orange_fill
-             c.font = black_font_bold
-             c.alignment = center_align
-             c.border = thin_border
-             if col == 'B': 
-                 for sub_c in range(2, 6): 
-                     ws_inv.cell(row=17, column=sub_c).border = thin_border
-                     ws_inv.cell(row=17, column=sub_c).fill = orange_fill
-
-        # Aggregation Logic
-        inv_rows = []
-        if not df_rk.empty:
-            grouped = df_rk.groupby(['RUTE', 'TIPE UNIT', 'TRIP']).agg(
-                TOTAL_RITASE=('NO', 'count'),
-                HARGA_RIT=('HARGA', 'first'),
-                TOTAL_HARGA=('HARGA', 'sum')
-            ).reset_index().sort_values(by=['RUTE'])
-            
-            for i, row in grouped.iterrows():
-                desc_1 = f"Biaya Transportasi {period_str}" # Line 1
-                desc_2 = f"{row['RUTE']}" # Line 2 (Route)
-                # desc_3 = "Jasa Angkutan Umum (Plat Kuning)"
-                
-                # Image Logic:
-                # Desc looks like: "Biaya Transportasi Periode 1-7 Desember 2025" (Newline) "CRN-CKP-SMI"
-                
-                # PPN Calculation (1.1% based on image)
-                # Image: DPP 8.460.000, PPN 93.060 (approx 1.1%)
-                # 8460000 * 0.011 = 93060. Exact.
-                ppn_val = row['TOTAL_HARGA'] * 0.011 if tax_mode == 'with_tax' else 0
-                
-                inv_rows.append({
-                    "no": i + 1,
-                    "desc_lines": [desc_1, desc_2],
-                    "type": row['TIPE UNIT'],
-                    "rit": row['TOTAL_RITASE'],
-                    "price_rit": row['HARGA_RIT'],
-                    "disc": "-",
-                    "ppn": ppn_val,
-                    "total": row['TOTAL_HARGA']
-                })
-        
-        start_row = 18
-        if not inv_rows:
-             inv_rows.append({"no": 1, "desc_lines": ["No Data"], "type": "", "rit": "", "price_rit": 0, "disc": "-", "ppn": 0, "total": 0})
+             ws_inv[f'{col}17'].style = 'ci_header'
+        for sub_c in range(3, 6): # Rest of the merged B17:E17
+             ws_inv.cell(row=17, column=sub_c).style = 'ci_total_fill'
 
-        for item in inv_rows:
-            ws_inv[f'A{start_row}'] = item['no']
-            ws_inv[f'A{start_row}'].alignment = Alignment(horizontal='center', vertical='center')
-            ws_inv[f'A{start_row}'].border = thin_border
+        # Line items: one per route/unit/trip group
+        groups = agg["groups"]
+        if not groups.empty:
+            # Desc looks like: "Biaya Transportasi Periode 1-7 Desember 2025" (Newline) "CRN-CKP-SMI"
+            desc_1 = f"Biaya Transportasi {period_str}"
+            inv_rows = zip(
+                (groups.index + 1).tolist(),
+                [[desc_1, f"{route}"] for route in groups['RUTE'].tolist()],
+                groups['TIPE UNIT'].tolist(),
+                groups['TOTAL_RITASE'].tolist(),
+                groups['HARGA_RIT'].tolist(),
+                groups['PPN'].tolist(),
+                groups['TOTAL_HARGA'].tolist()
+            )
+        else:
+            inv_rows = [(1, ["No Data"], "", "", 0, 0, 0)]
+
+        start_row = 18
+        for no, desc_lines, unit_type, rit, price_rit, ppn, total in inv_rows:
+            ws_inv[f'A{start_row}'] = no
+            ws_inv[f'A{start_row}'].style = 'ci_cell'
             
             ws_inv.merge_cells(f'B{start_row}:E{start_row}')
-            ws_inv[f'B{start_row}'] = "\n".join(item['desc_lines'])
-            ws_inv[f'B{start_row}'].alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
+            ws_inv[f'B{start_row}'] = "\n".join(desc_lines)
+            ws_inv[f'B{start_row}'].alignment = CENTER_WRAP_ALIGN
             for c in range(2, 6): ws_inv.cell(row=start_row, column=c).border = thin_border
             
-            ws_inv[f'F{start_row}'] = item['type']
-            ws_inv[f'F{start_row}'].alignment = center_align
-            ws_inv[f'F{start_row}'].border = thin_border
+            ws_inv[f'F{start_row}'] = unit_type
+            ws_inv[f'F{start_row}'].style = 'ci_cell'
             
-            ws_inv[f'G{start_row}'] = item['rit']
-            ws_inv[f'G{start_row}'].alignment = center_align
-            ws_inv[f'G{start_row}'].border = thin_border
+            ws_inv[f'G{start_row}'] = rit
+            ws_inv[f'G{start_row}'].style = 'ci_cell'
             
             # User request: Col H-K Middle Align (Vertical Center) with Accounting Format
-            # Accounting Format with Rp: _("Rp"* #,##0_);_("Rp"* (#,##0);_("Rp"* "-"??_);_(@_)
-            res_accounting_fmt = '_("Rp"* #,##0_);_("Rp"* (#,##0);_("Rp"* "-"??_);_(@_)'
-            align_acc = Alignment(horizontal='right', vertical='center') 
-            
-            ws_inv[f'H{start_row}'] = item['price_rit']
-            ws_inv[f'H{start_row}'].number_format = res_accounting_fmt
-            ws_inv[f'H{start_row}'].alignment = align_acc
-            ws_inv[f'H{start_row}'].border = thin_border
-            
-            # Disc (I)
-            ws_inv[f'I{start_row}'] = item['disc']
-            # If disc is "-", accounting format handles it if it's text/zero? 
-            # If text "-", format might treat as text. If 0, it shows "-".
-            # The value is item['disc'] which is "-" string. 
-            # To use accounting format effectively for '-', value should ideally be 0.
-            # But let's stick to what we have. Align center if text?
-            # User asked H-K accounting.
-            ws_inv[f'I{start_row}'].number_format = res_accounting_fmt
-            ws_inv[f'I{start_row}'].alignment = align_acc
-            ws_inv[f'I{start_row}'].border = thin_border
-            
-            ws_inv[f'J{start_row}'] = item['ppn']
-            ws_inv[f'J{start_row}'].number_format = res_accounting_fmt
-            ws_inv[f'J{start_row}'].alignment = align_acc
-            ws_inv[f'J{start_row}'].border = thin_border
-            
-            ws_inv[f'K{start_row}'] = item['total']
-            ws_inv[f'K{start_row}'].number_format = res_accounting_fmt
-            ws_inv[f'K{start_row}'].alignment = align_acc
-            ws_inv[f'K{start_row}'].border = thin_border
+            ws_inv[f'H{start_row}'] = price_rit
+            # Disc (I) is the string "-"; it keeps the accounting format like H-K
+            ws_inv[f'I{start_row}'] = "-"
+            ws_inv[f'J{start_row}'] = ppn
+            ws_inv[f'K{start_row}'] = total
+            for col in 'HIJK':
+                ws_inv[f'{col}{start_row}'].style = 'ci_amount'
             
             ws_inv.row_dimensions[start_row].height = 30
             start_row += 1
@@ -572,20 +798,18 @@ def export_excel():
         # Summary Section
         sum_row = start_row
         
-        total_dpp = sum(x['total'] for x in inv_rows)
-        total_ppn = sum(x['ppn'] for x in inv_rows)
-        total_pph = total_dpp * 0.02
-        
-        # New Tax Logic: Final = DPP + PPN - PPh
-        final_payment = total_dpp + total_ppn - total_pph if tax_mode == 'with_tax' else total_dpp
+        total_dpp = agg["total_dpp"]
+        total_ppn = agg["total_ppn"]
+        total_pph = agg["total_pph"]
+        final_payment = agg["final_payment"]
         
-        terbilang_txt = terbilang(final_payment).strip() + " RUPIAH"
+        terbilang_txt = terbilang_rupiah(final_payment, sen=bool(config.get('terbilang_sen')))
         
         # Terbilang Box (Rows sum_row, sum_row+1 | Cols A-G)
         ws_inv.merge_cells(f'A{sum_row}:G{sum_row+1}')
         ws_inv[f'A{sum_row}'] = terbilang_txt.upper()
-        ws_inv[f'A{sum_row}'].font = Font(bold=True)
-        ws_inv[f'A{sum_row}'].alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
+        ws_inv[f'A{sum_row}'].font = BOLD_FONT
+        ws_inv[f'A{sum_row}'].alignment = CENTER_WRAP_ALIGN
         for r_tb in range(sum_row, sum_row+2):
             for c_tb in range(1, 8): ws_inv.cell(row=r_tb, column=c_tb).border = thin_border
         
@@ -595,41 +819,35 @@ def export_excel():
         ws_inv.merge_cells(f'H{sum_row}:J{sum_row}')
         ws_inv[f'H{sum_row}'] = "Total Diskon"
         ws_inv[f'K{sum_row}'] = "-" # Or 0 if we want accounting dash
-        ws_inv[f'K{sum_row}'].number_format = res_accounting_fmt
-        ws_inv[f'K{sum_row}'].alignment = align_acc
+        ws_inv[f'K{sum_row}'].style = 'ci_amount'
         
         # 2. Total DPP (Row sum_row+1)
         ws_inv.merge_cells(f'H{sum_row+1}:J{sum_row+1}')
         ws_inv[f'H{sum_row+1}'] = "Total Dasar Pengenaan Pajak"
         ws_inv[f'K{sum_row+1}'] = total_dpp
-        ws_inv[f'K{sum_row+1}'].number_format = res_accounting_fmt
-        ws_inv[f'K{sum_row+1}'].alignment = align_acc
+        ws_inv[f'K{sum_row+1}'].style = 'ci_amount'
 
         # 3. Total PPN (Row sum_row+2)
         ws_inv.merge_cells(f'H{sum_row+2}:J{sum_row+2}')
         ws_inv[f'H{sum_row+2}'] = "Total PPN (1.1%)"
         ws_inv[f'K{sum_row+2}'] = total_ppn
-        ws_inv[f'K{sum_row+2}'].number_format = res_accounting_fmt
-        ws_inv[f'K{sum_row+2}'].alignment = align_acc
+        ws_inv[f'K{sum_row+2}'].style = 'ci_amount'
         
         # 4. Total PPh (Row sum_row+3) 
         ws_inv.merge_cells(f'H{sum_row+3}:J{sum_row+3}')
         ws_inv[f'H{sum_row+3}'] = "Total PPh 23 (2%)"
         ws_inv[f'K{sum_row+3}'] = total_pph
-        ws_inv[f'K{sum_row+3}'].number_format = res_accounting_fmt
-        ws_inv[f'K{sum_row+3}'].alignment = align_acc
+        ws_inv[f'K{sum_row+3}'].style = 'ci_amount'
         
         # 5. Total Bayar (Row sum_row+4)
         ws_inv.merge_cells(f'H{sum_row+4}:J{sum_row+4}')
         ws_inv[f'H{sum_row+4}'] = "Total Bayar"
         ws_inv[f'K{sum_row+4}'] = final_payment
-        ws_inv[f'K{sum_row+4}'].number_format = res_accounting_fmt
-        ws_inv[f'K{sum_row+4}'].alignment = align_acc
+        ws_inv[f'K{sum_row+4}'].style = 'ci_amount'
         
         # Apply Borders to Right Side (H-K, Rows sum_row to sum_row+4)
         for r_tot in range(sum_row, sum_row+5):
-            for c_tot in range(8, 12): # H(8) to K(11)
-                bs = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
+            for c_tot in range(8, 11): # H(8) to J(10); K already has ci_amount
                 # Handle merged cells borders
                 ws_inv.cell(row=r_tot, column=c_tot).border = thin_border
         
@@ -646,16 +864,16 @@ def export_excel():
                         f"{bank_account}"
                         
         ws_inv[f'A{sum_row+2}'] = combined_text
-        ws_inv[f'A{sum_row+2}'].alignment = Alignment(wrap_text=True, vertical='top', horizontal='left')
+        ws_inv[f'A{sum_row+2}'].alignment = TOP_LEFT_WRAP_ALIGN
         
         # User request: Bottom border for Row 23 (sum_row+4) Cols A-G
         # Also Left border for A(sum_row+2) to A(sum_row+4)
         for r_bank in range(sum_row+2, sum_row+5):
              # Left Border for Col A
-             ws_inv.cell(row=r_bank, column=1).border = Border(left=Side(style='thin'), bottom=Side(style='thin') if r_bank==sum_row+4 else None)
+             ws_inv.cell(row=r_bank, column=1).border = edge_border(left=True, bottom=r_bank==sum_row+4)
              
         for c_bank in range(2, 8): # B-G (Bottom border only for last row)
-            ws_inv.cell(row=sum_row+4, column=c_bank).border = Border(bottom=Side(style='thin'))
+            ws_inv.cell(row=sum_row+4, column=c_bank).border = BOTTOM_BORDER
         
         # Signatures
         # Spacer Row (sum_row+5)
@@ -665,35 +883,35 @@ def export_excel():
         # 1. Prepared By (A-B)
         ws_inv.merge_cells(f'A{sig_starting_row}:B{sig_starting_row}')
         ws_inv[f'A{sig_starting_row}'] = "Prepared By"
-        ws_inv[f'A{sig_starting_row}'].alignment = Alignment(horizontal='left')
+        ws_inv[f'A{sig_starting_row}'].alignment = LEFT_ALIGN
         
         # 2. Checked By (D-E) - Spacer C
         ws_inv.merge_cells(f'D{sig_starting_row}:E{sig_starting_row}')
         ws_inv[f'D{sig_starting_row}'] = "Checked By"
-        ws_inv[f'D{sig_starting_row}'].alignment = Alignment(horizontal='left')
+        ws_inv[f'D{sig_starting_row}'].alignment = LEFT_ALIGN
         
         # 3. Approved By (G-H) - Spacer F
         ws_inv.merge_cells(f'G{sig_starting_row}:H{sig_starting_row}')
         ws_inv[f'G{sig_starting_row}'] = "Approved By"
-        ws_inv[f'G{sig_starting_row}'].alignment = Alignment(horizontal='left')
+        ws_inv[f'G{sig_starting_row}'].alignment = LEFT_ALIGN
         
         # 4. Received By (J-K) - Spacer I
         ws_inv.merge_cells(f'J{sig_starting_row}:K{sig_starting_row}')
         ws_inv[f'J{sig_starting_row}'] = "Received By"
-        ws_inv[f'J{sig_starting_row}'].alignment = Alignment(horizontal='left')
+        ws_inv[f'J{sig_starting_row}'].alignment = LEFT_ALIGN
         
         # Signature Space
         line_row = sig_starting_row + 7
         
         # Draw Bottom Borders for lines
         # Group 1: A-B
-        for c in range(1, 3): ws_inv.cell(row=line_row, column=c).border = Border(bottom=Side(style='thin'))
+        for c in range(1, 3): ws_inv.cell(row=line_row, column=c).border = BOTTOM_BORDER
         # Group 2: D-E (4, 5)
-        for c in range(4, 6): ws_inv.cell(row=line_row, column=c).border = Border(bottom=Side(style='thin'))
+        for c in range(4, 6): ws_inv.cell(row=line_row, column=c).border = BOTTOM_BORDER
         # Group 3: G-H (7, 8)
-        for c in range(7, 9): ws_inv.cell(row=line_row, column=c).border = Border(bottom=Side(style='thin'))
+        for c in range(7, 9): ws_inv.cell(row=line_row, column=c).border = BOTTOM_BORDER
         # Group 4: J-K (10, 11)
-        for c in range(10, 12): ws_inv.cell(row=line_row, column=c).border = Border(bottom=Side(style='thin'))
+        for c in range(10, 12): ws_inv.cell(row=line_row, column=c).border = BOTTOM_BORDER
         
         # Date Row (line_row + 1)
         date_row = line_row + 1
@@ -743,22 +961,14 @@ def export_excel():
         ws_kw.sheet_view.showGridLines = False
         
         # Styles
-        kw_font_bold = Font(name='Calibri', size=11, bold=True)
-        kw_font_reg = Font(name='Calibri', size=11)
+        kw_font_bold = CALIBRI_FONT_BOLD
+        kw_font_reg = CALIBRI_FONT
         
         # --- HEADER (Rows 4-8) ---
         # Logo at A4
-        try:
-            if os.path.exists(logo_path):
-                img_kw = Image(logo_path)
-                # Keep same size as Invoice or slightly larger
-                target_h_kw = 60
-                ar_kw = img_kw.width / img_kw.height
-                img_kw.height = target_h_kw
-                img_kw.width = int(target_h_kw * ar_kw)
-                ws_kw.add_image(img_kw, 'A4')
-        except:
-            pass
+        logo_kw = logos.image(company, KWITANSI_LOGO_HEIGHT)
+        if logo_kw:
+            ws_kw.add_image(logo_kw, 'A4')
 
         # C4: Company Name
         ws_kw['C4'] = "PT CHIJUN SMART FREIGHT"
@@ -768,7 +978,7 @@ def export_excel():
         # Assuming layout is wide
         ws_kw['J4'] = "NO: " + config.get('invoice_no', '')
         ws_kw['J4'].font = kw_font_bold
-        ws_kw['J4'].alignment = Alignment(horizontal='right')
+        ws_kw['J4'].alignment = RIGHT_ALIGN
         
         # Row 8: Title "KWITANSI"
         ws_kw.merge_cells('A8:L8') # Center across sheet
@@ -777,7 +987,7 @@ def export_excel():
         ws_kw['A8'].alignment = center_align
         # Double bottom border for Row 8
         for c_k in range(1, 13): # A-L
-            ws_kw.cell(row=8, column=c_k).border = Border(bottom=Side(style='double'))
+            ws_kw.cell(row=8, column=c_k).border = DOUBLE_BOTTOM_BORDER
 
         # --- BODY (Rows 10-14) ---
         ws_kw['A10'] = "Untuk transaksi tersebut dibawah ini"
@@ -805,7 +1015,7 @@ def export_excel():
         # B18: Rp, C18: Amount (Bold)
         ws_kw['B18'] = "Rp"
         ws_kw['B18'].font = kw_font_bold
-        ws_kw['B18'].alignment = Alignment(horizontal='right')
+        ws_kw['B18'].alignment = RIGHT_ALIGN
         
         ws_kw['C18'] = f"{final_payment:,.0f}".replace(",", ".")
         ws_kw['C18'].font = kw_font_bold
@@ -813,13 +1023,13 @@ def export_excel():
         # B19: Terbilang
         ws_kw['B19'] = "Terbilang"
         ws_kw['B19'].font = kw_font_bold
-        ws_kw['B19'].alignment = Alignment(horizontal='right', vertical='top')
+        ws_kw['B19'].alignment = RIGHT_TOP_ALIGN
         
         # C19: Text (Merged C19:L20)
         ws_kw.merge_cells('C19:L20')
         ws_kw['C19'] = terbilang_txt
         ws_kw['C19'].font = kw_font_reg
-        ws_kw['C19'].alignment = Alignment(wrap_text=True, vertical='top')
+        ws_kw['C19'].alignment = TOP_WRAP_ALIGN
 
         # --- DATE & SIGNATURE (Row 21) ---
         # Date at J21 (Right aligned)
@@ -835,7 +1045,7 @@ def export_excel():
              date_str = config.get('invoice_date', '')
              
         ws_kw['I21'] = f"Jakarta, {date_str}"
-        ws_kw['I21'].alignment = Alignment(horizontal='center') # Looks somewhat centered in right area
+        ws_kw['I21'].alignment = CENTER_H_ALIGN # Looks somewhat centered in right area
         ws_kw.merge_cells('I21:L21')
 
         # --- PAYMENT BOXES (Rows 22-24) ---
@@ -845,7 +1055,7 @@ def export_excel():
         ws_kw['A23'].font = kw_font_reg
         
         # Boxes at C22, C23, C24
-        box_border = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
+        box_border = THIN_BORDER
         
         ws_kw['C22'] = "Cek :"
         ws_kw['C22'].border = box_border
@@ -875,17 +1085,9 @@ def export_excel():
         ws_kw.column_dimensions['D'].width = 30
         
         # --- SHEET 3: RINCIAN RITASE ---
-        # Aggregation Logic
-        # Group by RUTE, TIPE UNIT, TRIP
-        if not df_rk.empty:
-            grouped = df_rk.groupby(['RUTE', 'TIPE UNIT', 'TRIP']).agg(
-                TOTAL_RITASE=('NO', 'count'),
-                HARGA_RIT=('HARGA', 'first'), # Assume same price for same group
-                TOTAL_HARGA=('HARGA', 'sum')
-            ).reset_index()
-            
-            # Sort for consistency
-            grouped = grouped.sort_values(by=['RUTE'])
+        # Same route/unit/trip groups as the INVOICE line items
+        if not groups.empty:
+            grouped = groups.copy()
             
             # Add NO and TANGGAL columns
             grouped['NO'] = range(1, len(grouped) + 1)
@@ -911,33 +1113,11 @@ def export_excel():
         grouped.to_excel(writer, sheet_name='RINCIAN RITASE', index=False, startrow=5)
         ws_rit = writer.sheets['RINCIAN RITASE']
         
-        # Helper for Indonesian Months
-        months_id = {
-            1: 'Januari', 2: 'Februari', 3: 'Maret', 4: 'April', 5: 'Mei', 6: 'Juni',
-            7: 'Juli', 8: 'Agustus', 9: 'September', 10: 'Oktober', 11: 'November', 12: 'Desember'
-        }
-        
-        # Determine Period String for Header
-        period_str = "Periode -"
-        if all_dates:
-            min_date = min(all_dates)
-            max_date = max(all_dates)
-            
-            m_start = months_id[min_date.month]
-            m_end = months_id[max_date.month]
-            
-            if min_date.month == max_date.month and min_date.year == max_date.year:
-                 period_str = f"Periode {min_date.day}-{max_date.day} {m_start} {min_date.year}"
-            elif min_date.year == max_date.year:
-                 period_str = f"Periode {min_date.day} {m_start} - {max_date.day} {m_end} {min_date.year}"
-            else:
-                 period_str = f"Periode {min_date.day} {m_start} {min_date.strftime('%Y')} - {max_date.day} {m_end} {max_date.strftime('%Y')}"
-
         # Determine Project Name from Filename Code
         # Default
         project_name = "PROJEK J&T EXPRESS"
-        if data:
-            first_file = data[0].get('source_file', '')
+        if trips['source_file']:
+            first_file = trips['source_file'][0]
             match = re.match(r'^.+?_([A-Za-z0-9]+)_', first_file)
             if match:
                 city_code = match.group(1).upper()
@@ -951,35 +1131,32 @@ def export_excel():
         # Add Titles (Rows 1-5)
         ws_rit.merge_cells('A1:H1')
         ws_rit['A1'] = "RINCIAN RITASE"
-        ws_rit['A1'].font = Font(name='Calibri', size=11, bold=True)
+        ws_rit['A1'].font = CALIBRI_FONT_BOLD
         ws_rit['A1'].alignment = center_align
 
         ws_rit.merge_cells('A2:H2')
         ws_rit['A2'] = project_name
-        ws_rit['A2'].font = Font(name='Calibri', size=11, bold=False) # Or bold? Screenshot looks normal/bold? Let's go normal based on prev, or bold if title.
+        ws_rit['A2'].font = CALIBRI_FONT # Or bold? Screenshot looks normal/bold? Let's go normal based on prev, or bold if title.
         ws_rit['A2'].alignment = center_align
 
         ws_rit.merge_cells('A3:H3')
         ws_rit['A3'] = "LAPORAN PEMAKAIAN KENDARAAN"
-        ws_rit['A3'].font = Font(name='Calibri', size=11, bold=False)
+        ws_rit['A3'].font = CALIBRI_FONT
         ws_rit['A3'].alignment = center_align
         
         ws_rit.merge_cells('A4:H4')
         ws_rit['A4'] = "PT CHIJUN SMART FREIGHT"
-        ws_rit['A4'].font = Font(name='Calibri', size=11, bold=False)
+        ws_rit['A4'].font = CALIBRI_FONT
         ws_rit['A4'].alignment = center_align
 
         ws_rit.merge_cells('A5:H5')
-        ws_rit['A5'] = period_str
-        ws_rit['A5'].font = Font(name='Calibri', size=11, bold=False)
+        ws_rit['A5'] = agg["period_id"] # Indonesian month names
+        ws_rit['A5'].font = CALIBRI_FONT
         ws_rit['A5'].alignment = center_align
             
         # Style Table Header (Row 6)
         for cell in ws_rit[6]:
-            cell.fill = orange_fill
-            cell.font = black_font_bold
-            cell.alignment = center_align
-            cell.border = thin_border
+            cell.style = 'ci_header'
             
         # Style Data (Starts Row 7)
         rit_data_len = len(grouped)
@@ -987,39 +1164,31 @@ def export_excel():
         
         for row in ws_rit.iter_rows(min_row=7, max_row=7+rit_data_len-1):
             for cell in row:
-                cell.border = thin_border
-                cell.alignment = center_align
-                if cell.column in [7, 8]: # Harga Rit (G), Total Harga (H)
-                    cell.number_format = 'Rp #,##0'
+                # Harga Rit (G), Total Harga (H) in Rupiah
+                cell.style = 'ci_cell_rupiah' if cell.column in [7, 8] else 'ci_cell'
 
         # Total Row
         tot_row = 7 + rit_data_len
         ws_rit.merge_cells(f'A{tot_row}:G{tot_row}')
         ws_rit[f'A{tot_row}'] = "TOTAL"
-        ws_rit[f'A{tot_row}'].fill = orange_fill
-        ws_rit[f'A{tot_row}'].font = black_font_bold
-        ws_rit[f'A{tot_row}'].alignment = center_align
+        ws_rit[f'A{tot_row}'].style = 'ci_header'
         
         # Apply border/fill to merged cells
-        for c_idx in range(1, 8):
-            ws_rit.cell(row=tot_row, column=c_idx).border = thin_border
-            ws_rit.cell(row=tot_row, column=c_idx).fill = orange_fill
+        for c_idx in range(2, 8):
+            ws_rit.cell(row=tot_row, column=c_idx).style = 'ci_total_fill'
             
         ws_rit[f'H{tot_row}'] = rit_total_sum
-        ws_rit[f'H{tot_row}'].fill = orange_fill
-        ws_rit[f'H{tot_row}'].font = black_font_bold
-        ws_rit[f'H{tot_row}'].border = thin_border
-        ws_rit[f'H{tot_row}'].number_format = 'Rp #,##0'
+        ws_rit[f'H{tot_row}'].style = 'ci_total_amount'
         
         # Signatures
         sig_rit_start = tot_row + 3
         ws_rit[f'B{sig_rit_start}'] = "Mengetahui"
         ws_rit[f'B{sig_rit_start+6}'] = "PT CHIJUN SMART FREIGHT"
-        ws_rit[f'B{sig_rit_start+6}'].font = Font(bold=True)
+        ws_rit[f'B{sig_rit_start+6}'].font = BOLD_FONT
         
         ws_rit[f'G{sig_rit_start}'] = "Mengetahui"
         ws_rit[f'G{sig_rit_start+6}'] = "PT GLOBAL JET EXPRESS"
-        ws_rit[f'G{sig_rit_start+6}'].font = Font(bold=True)
+        ws_rit[f'G{sig_rit_start+6}'].font = BOLD_FONT
 
         # Col Widths
         ws_rit.column_dimensions['A'].width = 5
@@ -1039,51 +1208,38 @@ def export_excel():
         
         # Apply Header Styles (Row 1)
         for cell in ws[1]:
-            cell.fill = orange_fill
-            cell.font = black_font_bold
-            cell.alignment = center_align
-            cell.border = thin_border
+            cell.style = 'ci_header'
             
         # Apply Data Styles & Borders
-        for row in ws.iter_rows(min_row=2, max_row=len(rincian_data)+1):
+        for row in ws.iter_rows(min_row=2, max_row=len(df_rk)+1):
             for cell in row:
-                cell.border = thin_border
-                cell.alignment = center_align
-                if cell.column == 8: # Col H
-                     cell.number_format = '#,##0'
+                cell.style = 'ci_cell_number' if cell.column == 8 else 'ci_cell' # Col H
                      
         # Add Total Row
-        total_row_idx = len(rincian_data) + 2
+        total_row_idx = len(df_rk) + 2
         ws.merge_cells(f'A{total_row_idx}:G{total_row_idx}')
         total_label_cell = ws[f'A{total_row_idx}']
         total_label_cell.value = "TOTAL"
-        total_label_cell.fill = orange_fill
-        total_label_cell.font = black_font_bold
-        total_label_cell.alignment = center_align
-        total_label_cell.border = thin_border
+        total_label_cell.style = 'ci_header'
         
         # Fill merged cells border
-        for col in range(1, 8): # A to G
-             ws.cell(row=total_row_idx, column=col).border = thin_border
-             ws.cell(row=total_row_idx, column=col).fill = orange_fill
+        for col in range(2, 8): # B to G
+             ws.cell(row=total_row_idx, column=col).style = 'ci_total_fill'
 
         total_val_cell = ws[f'H{total_row_idx}']
         total_val_cell.value = df_rk['HARGA'].sum() if not df_rk.empty else 0
-        total_val_cell.fill = orange_fill
-        total_val_cell.font = black_font_bold
-        total_val_cell.border = thin_border
-        total_val_cell.number_format = 'Rp #,##0'
+        total_val_cell.style = 'ci_total_amount'
         
         # Add Signatures
         sig_start_row = total_row_idx + 3
         
         ws[f'B{sig_start_row}'] = "Mengetahui"
         ws[f'A{sig_start_row+6}'] = "PT CHIJUN SMART FREIGHT"
-        ws[f'A{sig_start_row+6}'].font = Font(bold=True)
+        ws[f'A{sig_start_row+6}'].font = BOLD_FONT
         
         ws[f'G{sig_start_row}'] = "Mengetahui"
         ws[f'G{sig_start_row+6}'] = "PT GLOBAL JET EXPRESS"
-        ws[f'G{sig_start_row+6}'].font = Font(bold=True)
+        ws[f'G{sig_start_row+6}'].font = BOLD_FONT
         
         ws.column_dimensions['A'].width = 5
         ws.column_dimensions['B'].width = 12
@@ -1101,8 +1257,8 @@ def export_excel():
     # Generate Filename
     # Pattern: "22-31 Desember 2025_BGR_CSF_REPORT W4" -> "INVOICE GLOBAL JET EXPRESS-BGR 22-31 DESEMBER 2025"
     export_name = 'Consolidated_Invoice.xlsx'
-    if data:
-        first_file = data[0].get('source_file', '')
+    if trips['source_file']:
+        first_file = trips['source_file'][0]
         # Regex to capture Date_Code_
         # Expecting: [Date Part]_[Code]_[Rest]
         # Example: 22-31 Desember 2025_BGR_...
@@ -1117,9 +1273,4 @@ def export_excel():
              clean_name = first_file.rsplit('.', 1)[0].upper()
              export_name = f"INVOICE {clean_name}.xlsx"
 
-    return send_file(
-        output,
-        download_name=export_name,
-        as_attachment=True,
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
+    return output, export_name
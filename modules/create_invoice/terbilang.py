@@ -0,0 +1,91 @@
+"""
+Amounts in Indonesian words for the INVOICE and KWITANSI sheets
+(1250000 -> "SATU JUTA DUA RATUS LIMA PULUH RIBU").
+
+The amount is split into 0-999 triplets with integer divmod, so there is no
+float division, and each triplet is spelled once through an LRU cache. Scales go
+up to KUADRILIUN (10^15). The recursive version this replaces returned "" from
+10^12 upward.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+from functools import lru_cache
+
+SATUAN = ["", "SATU", "DUA", "TIGA", "EMPAT", "LIMA", "ENAM", "TUJUH", "DELAPAN", "SEMBILAN", "SEPULUH", "SEBELAS"]
+
+# One word per power of 1000: 10^3 RIBU ... 10^15 KUADRILIUN
+SCALES = ["", "RIBU", "JUTA", "MILYAR", "TRILIUN", "KUADRILIUN"]
+MAX_AMOUNT = 1000 ** len(SCALES) - 1
+
+CENT = Decimal('0.01')
+
+# --- HELPER FUNCTIONS ---
+
+@lru_cache(maxsize=1000)
+def triplet_words(n):
+    """
+    Words for 0-999 ("" for 0), e.g. 115 -> "SERATUS LIMA BELAS".
+    Returns: str
+    """
+    hundreds, rest = divmod(n, 100)
+    words = []
+    if hundreds == 1:
+        words.append("SERATUS")
+    elif hundreds:
+        words += [SATUAN[hundreds], "RATUS"]
+    if rest <= 11:
+        words.append(SATUAN[rest])
+    elif rest < 20:
+        words += [SATUAN[rest % 10], "BELAS"]
+    else:
+        tens, ones = divmod(rest, 10)
+        words += [SATUAN[tens], "PULUH", SATUAN[ones]]
+    return " ".join(word for word in words if word)
+
+def _split_amount(amount):
+    """
+    Whole part and cents of an amount, rounded to the cent first so float noise
+    (1234.9999999) does not lose a rupiah.
+    Returns: (whole, cents) as ints, signs dropped
+    """
+    whole = int(abs(amount))
+    if whole == abs(amount):
+        return whole, 0
+    cents = int(abs(Decimal(str(amount))).quantize(CENT, rounding=ROUND_HALF_UP) * 100)
+    return divmod(cents, 100)
+
+# --- PUBLIC API ---
+
+def terbilang(n):
+    """
+    Convert number to Indonesian text (whole part, e.g. 2000 -> "DUA RIBU", 0 -> "NOL").
+    Returns: str; raises ValueError above MAX_AMOUNT
+    """
+    whole, _ = _split_amount(n)
+    if whole > MAX_AMOUNT:
+        raise ValueError(f"Amount too large to spell: {n}")
+    if whole == 0:
+        return "NOL"
+
+    groups = []
+    scale = 0
+    while whole:
+        whole, triplet = divmod(whole, 1000)
+        if triplet == 1 and scale == 1:
+            groups.append("SERIBU")
+        elif triplet:
+            groups.append(f"{triplet_words(triplet)} {SCALES[scale]}".rstrip())
+        scale += 1
+    words = " ".join(reversed(groups))
+    return f"MINUS {words}" if n < 0 else words
+
+def terbilang_rupiah(amount, sen=False):
+    """
+    Amount in words with the currency, as printed on the invoice and kwitansi.
+    With sen=True non-zero cents are spelled too ("... RUPIAH LIMA PULUH SEN").
+    Returns: str
+    """
+    text = terbilang(amount) + " RUPIAH"
+    _, cents = _split_amount(amount)
+    if sen and cents:
+        text += f" {triplet_words(cents)} SEN"
+    return text
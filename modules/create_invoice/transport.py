@@ -0,0 +1,130 @@
+"""
+Compact transport of extracted trips between /create-invoice/process and /export.
+
+The trips used to travel as a list of dicts twice: to the browser for the
+table, and back again in the /export body, repeating every key on every row.
+Now:
+    - /process keeps the trips server-side under a handle (the columnar JSON
+      below in a DownloadStore, like the invoice-generator previews); /export
+      only needs the handle
+    - the browser copy is column-oriented: one array per field, text
+      columns with few distinct values (file names, routes, vehicle types)
+      are sent as {"values": [...], "codes": [...]}, and a field equal to an
+      earlier one (dpp / base_amount_raw / base_amount) as {"same_as": field}
+    - /export still accepts the columnar trips (used when the handle expired or
+      on serverless, where there is no handle) and the legacy record list
+"""
+import os
+import json
+import tempfile
+
+from modules.common.downloads import DownloadStore, DEFAULT_TTL_SECONDS
+
+FORMAT_RECORDS = 'records'
+FORMAT_COLUMNAR = 'columnar'
+
+# Fields of one extracted trip, in record order
+TRIP_COLUMNS = [
+    "source_file", "surat_jalan", "plat_nomor", "jenis_mobil", "rute", "trip_type", "date",
+    "dpp", "base_amount_raw", "ppn", "pph", "base_amount", "final_total"
+]
+
+# Fields the export reads, with the value used when a legacy record lacks the key
+EXPORT_DEFAULTS = {
+    "source_file": "", "surat_jalan": "", "plat_nomor": "", "jenis_mobil": "",
+    "rute": "", "trip_type": "", "date": "", "base_amount_raw": 0
+}
+
+JSON_MIMETYPE = 'application/json'
+
+# --- ENCODING ---
+
+def empty_columns():
+    return {name: [] for name in TRIP_COLUMNS}
+
+def columns_to_records(columns):
+    """Legacy record list (one dict per trip)."""
+    return [dict(zip(TRIP_COLUMNS, values)) for values in zip(*(columns[name] for name in TRIP_COLUMNS))]
+
+def records_to_columns(records):
+    """Export columns from legacy records (missing keys get EXPORT_DEFAULTS, like item.get)."""
+    return {name: [item.get(name, default) for item in records] for name, default in EXPORT_DEFAULTS.items()}
+
+def _encode_column(values):
+    """Text columns with few distinct values become {"values", "codes"}; others stay a plain array."""
+    if not values or not all(type(v) is str for v in values):
+        return values
+    index = {}
+    codes = [index.setdefault(v, len(index)) for v in values]
+    if len(index) * 2 > len(values):
+        return values
+    return {"values": list(index), "codes": codes}
+
+def _decode_column(column, decoded=None):
+    if isinstance(column, dict):
+        if "same_as" in column:
+            return list((decoded or {}).get(column["same_as"]) or [])
+        values = column.get("values") or []
+        return [values[code] for code in column.get("codes") or []]
+    return list(column or [])
+
+def encode_trips(columns):
+    """
+    Columnar payload for the browser.
+    Returns: {"count": n, "columns": {field: array, {"values", "codes"} or {"same_as"}}}
+    """
+    count = len(columns[TRIP_COLUMNS[0]]) if columns else 0
+    encoded = {}
+    for pos, name in enumerate(TRIP_COLUMNS):
+        same = next((prev for prev in TRIP_COLUMNS[:pos] if columns[prev] == columns[name]), None)
+        encoded[name] = {"same_as": same} if same else _encode_column(columns[name])
+    return {"count": count, "columns": encoded}
+
+def decode_trips(payload):
+    """
+    Export columns from a columnar payload; fields the payload lacks get EXPORT_DEFAULTS.
+    Returns: {field: list} (None when the payload is malformed)
+    """
+    if not isinstance(payload, dict) or not isinstance(payload.get("columns"), dict):
+        return None
+    count = payload.get("count") or 0
+    decoded = {}
+    for name in TRIP_COLUMNS:
+        column = payload["columns"].get(name)
+        if column is not None:
+            decoded[name] = _decode_column(column, decoded)
+    columns = {}
+    for name, default in EXPORT_DEFAULTS.items():
+        values = decoded.get(name, [default] * count)
+        if len(values) != count:
+            return None
+        columns[name] = values
+    return columns
+
+# --- STORAGE ---
+
+def get_trip_store(app):
+    """Columnar trip payloads under DOWNLOAD_DIR/trips, same TTL as downloads."""
+    if 'trip_store' not in app.extensions:
+        base = app.config.get('DOWNLOAD_DIR') or os.path.join(tempfile.gettempdir(), 'downloads')
+        ttl = int(app.config.get('DOWNLOAD_TTL_SECONDS') or DEFAULT_TTL_SECONDS)
+        app.extensions['trip_store'] = DownloadStore(os.path.join(base, 'trips'), ttl)
+    return app.extensions['trip_store']
+
+def save_trips(store, columns):
+    payload = json.dumps(encode_trips(columns), ensure_ascii=False).encode('utf-8')
+    return store.put(payload, 'trips.json', JSON_MIMETYPE)
+
+def load_trips(store, handle):
+    """
+    Returns: export columns, or None when the handle is unknown or expired
+    """
+    stored = store.get(handle)
+    if stored is None:
+        return None
+    path, _ = stored
+    with open(path, 'rb') as f:
+        try:
+            return decode_trips(json.load(f))
+        except ValueError:
+            return None
@@ -0,0 +1,167 @@
+"""
+Persistent Master Data store (Kode Tugas -> Nama Tugas) backed by SQLite.
+
+The master list (200k+ codes) used to be re-read from Excel and rebuilt as a
+dict on every /api/process call. The store keeps it on disk instead:
+    - codes are stored normalized (str, stripped) under a primary-key index
+    - uploads are imported incrementally; a master file whose SHA-256 was
+      already imported is skipped without being parsed, unless the store has
+      changed since (then it is applied again, so the latest upload wins)
+    - every change bumps a version number, which is reported with each output
+    - lookups are one bulk query for the codes of a file
+    - clear() empties it, e.g. before a request that replaces the master data
+The default file sits in a private directory (see modules/common/storage.py),
+not directly in the shared temp dir.
+"""
+import io
+import os
+import math
+import sqlite3
+import hashlib
+import tempfile
+import threading
+from contextlib import closing
+from datetime import datetime
+
+from modules.common.storage import private_directory
+
+# SQLite's default limit on bound parameters per statement is 999
+LOOKUP_CHUNK = 900
+
+_write_locks = {}
+_write_locks_guard = threading.Lock()
+
+def normalize_code(code):
+    """Same normalization as the vendor 'Kode Tugas' column: str + strip."""
+    return str(code).strip()
+
+def _storable(value):
+    """SQLite can hold str/int/float/None; NaN becomes NULL, anything else its str()."""
+    if value is None or isinstance(value, (str, int)):
+        return value
+    if isinstance(value, float):
+        return None if math.isnan(value) else value
+    return str(value)
+
+def lookup_codes(path, codes):
+    """
+    Bulk lookup of normalized codes in the store at path (read-only; safe in worker processes).
+    Returns: {code: name} for the codes present in the store
+    """
+    codes = list(dict.fromkeys(codes))
+    found = {}
+    with closing(sqlite3.connect(path, timeout=30)) as conn:
+        for start in range(0, len(codes), LOOKUP_CHUNK):
+            chunk = codes[start:start + LOOKUP_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            found.update(conn.execute(f"SELECT code, name FROM master WHERE code IN ({placeholders})", chunk))
+    return found
+
+class MasterStore:
+    def __init__(self, path):
+        self.path = path
+        with _write_locks_guard:
+            self._lock = _write_locks.setdefault(os.path.abspath(path), threading.Lock())
+        private_directory(os.path.dirname(os.path.abspath(path)))
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS master (code TEXT PRIMARY KEY, name)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS imports ("
+                "sha256 TEXT PRIMARY KEY, source TEXT, records INTEGER, version INTEGER, imported_at TEXT)"
+            )
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    # --- READS ---
+
+    def version(self):
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+    def count(self):
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM master").fetchone()[0]
+
+    def import_version(self, sha256):
+        """Store version right after the file with this hash was last applied, or None."""
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT version FROM imports WHERE sha256 = ?", (sha256,)).fetchone()
+        return row[0] if row else None
+
+    def lookup(self, codes):
+        return lookup_codes(self.path, codes)
+
+    # --- WRITES ---
+
+    def import_mapping(self, mapping, source, sha256=None):
+        """
+        Upserts {code: name} (later entries win, like dict.update) and records the import.
+        The version is bumped only when a row was added or changed.
+        Returns: (changed rows, store version after the import)
+        """
+        rows = [(normalize_code(code), _storable(name)) for code, name in mapping.items()]
+        with self._lock, closing(self._connect()) as conn, conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT INTO master (code, name) VALUES (?, ?) "
+                "ON CONFLICT(code) DO UPDATE SET name = excluded.name WHERE name IS NOT excluded.name",
+                rows
+            )
+            changed = conn.total_changes - before
+            if changed:
+                conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+            version = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+            if sha256:
+                conn.execute(
+                    "INSERT OR REPLACE INTO imports (sha256, source, records, version, imported_at) VALUES (?, ?, ?, ?, ?)",
+                    (sha256, source, len(rows), version, datetime.now().isoformat(timespec='seconds'))
+                )
+        return changed, version
+
+    def import_file(self, data, source, parse):
+        """
+        Imports one uploaded master file. The same bytes are skipped only while the
+        store is still at the version that import left it at; after any other change
+        (another file, a paste, a clear) they are parsed and applied again.
+        parse: callable(file-like) -> {code: name} or {"__error__": message}
+        Returns: (error message or None, changed rows)
+        """
+        sha256 = hashlib.sha256(data).hexdigest()
+        if self.import_version(sha256) == self.version():
+            return None, 0
+        buffer = io.BytesIO(data)
+        buffer.filename = source # load_master_data names the file in its errors
+        mapping = parse(buffer)
+        if "__error__" in mapping:
+            return mapping["__error__"], 0
+        changed, _ = self.import_mapping(mapping, source, sha256=sha256)
+        return None, changed
+
+    def clear(self):
+        """
+        Removes every code and import record. The version still moves forward, so
+        results cached under an earlier version are never reused.
+        Returns: store version after clearing
+        """
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM master")
+            conn.execute("DELETE FROM imports")
+            conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+            return conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+def default_store_path():
+    return os.path.join(tempfile.gettempdir(), 'master_store', 'master_data.sqlite3')
+
+def get_master_store(app):
+    """
+    The app-wide store at MASTER_STORE_PATH, opened on first use.
+    Returns None when the store is disabled (MASTER_STORE_PATH = 'none').
+    """
+    if 'master_store' not in app.extensions:
+        path = app.config.get('MASTER_STORE_PATH') or default_store_path()
+        app.extensions['master_store'] = None if path.lower() == 'none' else MasterStore(path)
+    return app.extensions['master_store']
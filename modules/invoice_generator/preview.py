@@ -0,0 +1,240 @@
+"""
+Server-side preview of the consolidated invoice data.
+
+/api/process used to ship every consolidated row to the browser, which then
+filtered the DOM itself; at 100k rows that is tens of MB of JSON and a frozen
+tab. The consolidated frame is now kept server-side under a preview token
+(as JSON columns in a DownloadStore, so any worker can answer; never pickled,
+since loading a pickle runs code) and the browser asks
+/api/preview/<token> for one page at a time, with filtering and sorting done
+here in pandas.
+"""
+import os
+import json
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from modules.common import parse_amount_series, MODE_DOT_THOUSANDS
+from modules.common.downloads import DownloadStore, DEFAULT_TTL_SECONDS
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Helper columns stored with the frame (never shown as data columns)
+ANOMALY_COL = '_anomaly'
+SEARCH_COL = '_search'
+
+ANOMALY_ANY = 'anomaly'
+ANOMALY_CLEAN = 'clean'
+
+# Columns sorted by their parsed amount instead of their text
+NUMERIC_COLUMNS = ['Tarif Pengiriman Sistem', 'PPN', 'PPH', 'Total pembayaran aktual']
+
+JSON_MIMETYPE = 'application/json'
+
+# Recently used frames stay loaded in this process
+_frames = OrderedDict()
+_frames_lock = threading.Lock()
+_FRAMES_KEPT = 4
+
+def _text(series):
+    """
+    Lowercased display text (missing cells are empty, like in the preview table).
+    Computed on the distinct values and broadcast back; returns an object ndarray.
+    """
+    codes, uniques = pd.factorize(series.to_numpy(dtype=object))
+    text = np.empty(len(uniques) + 1, dtype=object)
+    text[:-1] = [str(v).lower() for v in uniques]
+    text[-1] = ''
+    return text[codes]
+
+def build_preview_frame(final_df, display_columns, rules):
+    """
+    Adds the helper columns used for filtering:
+        _anomaly: names of the validation rules a row fails (', '-joined, '' when clean)
+        _search: lowercased text of every display column plus source_file, for the global search
+    rules: VALIDATION_RULES (same checks as the per-file anomaly messages)
+    """
+    frame = final_df.reset_index(drop=True)
+    hits = np.full(len(frame), '', dtype=object)
+    for rule in rules:
+        if rule["column"] not in frame.columns:
+            continue
+        mask, _ = rule["check"](frame[rule["column"]])
+        mask = mask.to_numpy(dtype=bool)
+        hits[mask] = np.where(hits[mask] == '', rule["name"], hits[mask] + ', ' + rule["name"])
+    frame[ANOMALY_COL] = hits
+
+    search_columns = list(display_columns) + (['source_file'] if 'source_file' in frame.columns else [])
+    search = np.full(len(frame), '', dtype=object)
+    for pos, col in enumerate(search_columns):
+        search = _text(frame[col]) if pos == 0 else search + '\x00' + _text(frame[col])
+    frame[SEARCH_COL] = search
+    return frame
+
+def file_aggregates(frame):
+    """
+    Per source file (upload order): rows, amount, anomaly rows.
+    """
+    if frame.empty or 'source_file' not in frame.columns:
+        return []
+    amount = parse_amount_series(frame['Total pembayaran aktual'], mode=MODE_DOT_THOUSANDS)
+    grouped = pd.DataFrame({
+        'source_file': frame['source_file'],
+        'amount': amount,
+        'anomaly': frame[ANOMALY_COL].ne('')
+    }).groupby('source_file', sort=False)
+    stats = grouped.agg(rows=('amount', 'size'), amount=('amount', 'sum'), anomaly_rows=('anomaly', 'sum'))
+    return [
+        {"filename": name, "rows": int(row.rows), "amount": float(row.amount), "anomaly_rows": int(row.anomaly_rows)}
+        for name, row in stats.iterrows()
+    ]
+
+def query_preview(frame, display_columns, args):
+    """
+    Filters, sorts and pages the preview frame.
+    args (query string):
+        page, page_size
+        source_file, agent (repeatable, exact match)
+        anomaly: 'anomaly' | 'clean' (default: all rows)
+        q: case-insensitive substring over all columns
+        f.<column>: case-insensitive substring in one column
+        sort: column name, order: 'asc' | 'desc'
+    Returns: dict with 'rows' (records of the page) and paging/total info
+    """
+    mask = np.ones(len(frame), dtype=bool)
+
+    files = [f for f in args.getlist('source_file') if f]
+    if files and 'source_file' in frame.columns:
+        mask &= frame['source_file'].isin(files).to_numpy()
+
+    agents = [a for a in args.getlist('agent') if a]
+    if agents:
+        mask &= frame['Agen Operasional'].astype(str).isin(agents).to_numpy()
+
+    anomaly = (args.get('anomaly') or '').lower()
+    if anomaly == ANOMALY_ANY:
+        mask &= frame[ANOMALY_COL].ne('').to_numpy()
+    elif anomaly == ANOMALY_CLEAN:
+        mask &= frame[ANOMALY_COL].eq('').to_numpy()
+
+    term = (args.get('q') or '').strip().lower()
+    if term:
+        mask &= np.fromiter((term in text for text in frame[SEARCH_COL].to_numpy(dtype=object)), dtype=bool, count=len(frame))
+
+    for key in args:
+        if not key.startswith('f.'):
+            continue
+        col, value = key[2:], (args.get(key) or '').strip().lower()
+        if value and col in frame.columns:
+            mask &= np.fromiter((value in text for text in _text(frame[col])), dtype=bool, count=len(frame))
+
+    view = frame[mask]
+
+    sort_col = args.get('sort')
+    if sort_col in display_columns or sort_col == 'source_file':
+        if sort_col in NUMERIC_COLUMNS:
+            key = lambda s: parse_amount_series(s, mode=MODE_DOT_THOUSANDS)
+        else:
+            key = lambda s: pd.Series(_text(s), index=s.index)
+        view = view.sort_values(sort_col, ascending=args.get('order', 'asc') != 'desc',
+                                kind='stable', key=key, na_position='last')
+
+    try:
+        page_size = min(MAX_PAGE_SIZE, max(1, int(args.get('page_size') or DEFAULT_PAGE_SIZE)))
+        page = max(1, int(args.get('page') or 1))
+    except ValueError:
+        page_size, page = DEFAULT_PAGE_SIZE, 1
+    total = len(view)
+    pages = max(1, -(-total // page_size))
+    page = min(page, pages)
+    chunk = view.iloc[(page - 1) * page_size: page * page_size]
+
+    return {
+        "success": True,
+        "rows": page_records(chunk, display_columns),
+        "page": page,
+        "page_size": page_size,
+        "pages": pages,
+        "total_rows": total,
+        "total_amount": float(parse_amount_series(view['Total pembayaran aktual'], mode=MODE_DOT_THOUSANDS).sum()) if total else 0
+    }
+
+def page_records(chunk, display_columns):
+    """Rows in the same shape as the old data_preview records, plus the row's anomaly rules."""
+    columns = list(display_columns) + (['source_file'] if 'source_file' in chunk.columns else []) + [ANOMALY_COL]
+    return chunk[columns].replace({float('nan'): None}).to_dict(orient='records')
+
+# --- STORAGE ---
+
+def get_preview_store(app):
+    """Preview frames under DOWNLOAD_DIR/previews, same TTL as downloads."""
+    if 'preview_store' not in app.extensions:
+        base = app.config.get('DOWNLOAD_DIR') or os.path.join(tempfile.gettempdir(), 'downloads')
+        ttl = int(app.config.get('DOWNLOAD_TTL_SECONDS') or DEFAULT_TTL_SECONDS)
+        app.extensions['preview_store'] = DownloadStore(os.path.join(base, 'previews'), ttl)
+    return app.extensions['preview_store']
+
+def _json_value(value):
+    """numpy scalars as Python numbers; anything else JSON lacks (timestamps) as text."""
+    return value.item() if isinstance(value, np.generic) else str(value)
+
+def frame_to_json(frame, display_columns):
+    """
+    The frame as plain JSON: one value list per column plus its dtype, missing cells as null.
+    Returns: bytes
+    """
+    columns = []
+    for name in frame.columns:
+        series = frame[name]
+        values = series.astype(object).where(series.notna(), None).tolist()
+        columns.append({"name": name, "dtype": str(series.dtype), "values": values})
+    payload = {"display_columns": list(display_columns), "columns": columns}
+    return json.dumps(payload, ensure_ascii=False, default=_json_value).encode('utf-8')
+
+def frame_from_json(data):
+    """
+    Inverse of frame_to_json (missing cells come back as NaN).
+    Returns: (frame, display_columns)
+    """
+    payload = json.loads(data)
+    frame = pd.DataFrame({
+        column["name"]: pd.Series([np.nan if v is None else v for v in column["values"]], dtype=column["dtype"])
+        for column in payload["columns"]
+    })
+    return frame, payload["display_columns"]
+
+def save_preview(store, frame, display_columns):
+    token = store.put(frame_to_json(frame, display_columns), 'preview.json', JSON_MIMETYPE)
+    _remember(token, frame, display_columns)
+    return token
+
+def load_preview(store, token):
+    """
+    Returns: (frame, display_columns) or None when the token expired
+    """
+    stored = store.get(token)
+    if stored is None:
+        with _frames_lock:
+            _frames.pop(token, None)
+        return None
+    with _frames_lock:
+        if token in _frames:
+            _frames.move_to_end(token)
+            return _frames[token]
+    path, _ = stored
+    with open(path, 'rb') as f:
+        frame, display_columns = frame_from_json(f.read())
+    _remember(token, frame, display_columns)
+    return frame, display_columns
+
+def _remember(token, frame, display_columns):
+    with _frames_lock:
+        _frames[token] = (frame, list(display_columns))
+        _frames.move_to_end(token)
+        while len(_frames) > _FRAMES_KEPT:
+            _frames.popitem(last=False)
@@ -0,0 +1,152 @@
+"""
+Streaming writer for the consolidated 陆运数据核对 workbook.
+
+The export used to go through DataFrame.to_excel into a regular openpyxl
+workbook, then walk every cell twice (header styling, auto width). With 100k+
+rows that keeps millions of Cell objects in memory. This writer uses an
+openpyxl write-only workbook instead: column widths are computed up front from
+the column values, the styled header row is emitted, and data rows are
+streamed straight to the file.
+
+The output matches the old path cell for cell: values are converted the way
+pandas hands them to openpyxl (NaN -> '', numpy scalars -> Python, dates with
+pandas' default formats) and each width is still max(len(str(value))) + 2,
+header included.
+"""
+import datetime
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Border, Side, Alignment
+from openpyxl.utils import get_column_letter
+
+SHEET_NAME = 'Sheet1'
+HEADER_HEIGHT = 40
+
+# pandas' openpyxl defaults for date cells
+DATETIME_FORMAT = 'YYYY-MM-DD HH:MM:SS'
+DATE_FORMAT = 'YYYY-MM-DD'
+
+# Header columns written in black instead of red
+BLACK_HEADER_COLUMNS = ['Berat', 'Tarif Pengiriman per kg']
+
+HEADER_FONT = Font(name='SimSun', size=11, color="FF0000", bold=True)
+BLACK_HEADER_FONT = Font(name='SimSun', size=11, color="000000", bold=True)
+HEADER_FILL = PatternFill(start_color="D9D9D9", end_color="D9D9D9", fill_type="solid")
+THIN_BORDER = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
+CENTER_ALIGNMENT = Alignment(horizontal='center', vertical='center', wrap_text=True)
+
+# --- HELPER FUNCTIONS ---
+
+def excel_value(value):
+    """
+    One value as DataFrame.to_excel writes it.
+    Returns: (cell value, number format or None)
+    """
+    if pd.api.types.is_scalar(value) and pd.isna(value):
+        return '', None
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value), None
+    if isinstance(value, (int, np.integer)):
+        return int(value), None
+    if isinstance(value, (float, np.floating)):
+        if np.isinf(value):
+            return ('inf' if value > 0 else '-inf'), None
+        return float(value), None
+    if isinstance(value, Decimal):
+        return value, None
+    if isinstance(value, datetime.datetime):
+        return value, DATETIME_FORMAT
+    if isinstance(value, datetime.date):
+        return value, DATE_FORMAT
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds() / 86400, '0'
+    return str(value), None
+
+def column_cells(series):
+    """
+    Cell values of one column plus the number formats needed (None for plain cells).
+    Returns: (values object ndarray, formats object ndarray or None)
+    """
+    if pd.api.types.is_float_dtype(series.dtype) or pd.api.types.is_integer_dtype(series.dtype) \
+            or pd.api.types.is_bool_dtype(series.dtype):
+        values = series.to_numpy(dtype=object, copy=True)
+        if pd.api.types.is_float_dtype(series.dtype):
+            numbers = series.to_numpy(dtype=float)
+            values[np.isnan(numbers)] = ''
+            values[np.isposinf(numbers)] = 'inf'
+            values[np.isneginf(numbers)] = '-inf'
+        return values, None
+    if pd.api.types.is_string_dtype(series.dtype) and not pd.api.types.is_object_dtype(series.dtype):
+        values = series.to_numpy(dtype=object, copy=True)
+        values[series.isna().to_numpy()] = ''
+        return values, None
+
+    raw = series.to_numpy(dtype=object)
+    values = np.empty(len(raw), dtype=object)
+    formats = None
+    for pos, value in enumerate(raw):
+        if type(value) is str:
+            values[pos] = value
+            continue
+        values[pos], fmt = excel_value(value)
+        if fmt is not None:
+            if formats is None:
+                formats = np.full(len(raw), None, dtype=object)
+            formats[pos] = fmt
+    return values, formats
+
+def column_width(header, values):
+    """Same rule as the old auto-width loop: longest str(value), header included, + 2."""
+    longest = len(str(header))
+    if len(values):
+        longest = max(longest, int(pd.Series(values, dtype=object).astype(str).str.len().max()))
+    return longest + 2
+
+# --- WRITER ---
+
+def write_consolidated_workbook(df, columns, output):
+    """
+    Writes df[columns] as the styled 陆运数据核对 sheet into output (path or file-like).
+    Returns: number of data rows written
+    """
+    cells = [column_cells(df[col]) for col in columns]
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet(SHEET_NAME)
+
+    # Widths and the header height must be set before any row is streamed
+    for idx, (col, (values, _)) in enumerate(zip(columns, cells), start=1):
+        worksheet.column_dimensions[get_column_letter(idx)].width = column_width(col, values)
+    worksheet.row_dimensions[1].height = HEADER_HEIGHT
+
+    header = []
+    for col in columns:
+        cell = WriteOnlyCell(worksheet, value=str(col))
+        cell.font = BLACK_HEADER_FONT if col in BLACK_HEADER_COLUMNS else HEADER_FONT
+        cell.fill = HEADER_FILL
+        cell.border = THIN_BORDER
+        cell.alignment = CENTER_ALIGNMENT
+        header.append(cell)
+    worksheet.append(header)
+
+    value_columns = [values for values, _ in cells]
+    if all(formats is None for _, formats in cells):
+        for row in zip(*value_columns):
+            worksheet.append(row)
+    else:
+        format_columns = [formats for _, formats in cells]
+        for pos, row in enumerate(zip(*value_columns)):
+            row = list(row)
+            for idx, formats in enumerate(format_columns):
+                if formats is not None and formats[pos] is not None:
+                    cell = WriteOnlyCell(worksheet, value=row[idx])
+                    cell.number_format = formats[pos]
+                    row[idx] = cell
+            worksheet.append(row)
+
+    workbook.save(output)
+    return len(df)
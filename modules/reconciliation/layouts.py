@@ -0,0 +1,277 @@
+"""
+Declarative invoice layouts for the reconciliation scanner.
+
+A layout describes where one vendor's invoice keeps its data:
+    sheet        - sheet name (case-insensitive); falls back to the active sheet
+    header_rows  - rows scanned from the top of the sheet
+    label_col    - column holding the amount labels (e.g. "Total PPN")
+    value_col    - column holding the amount next to each label
+    cells        - fixed cells: {field: "B7"} or {field: {"cell": "K13", "remove": [...], "upper": true}}
+    amounts      - label-searched fields: {field: {"keywords": [...], "priority": "row"|"keyword",
+                                                    "override": {"label_contains": [...], "value": 0}}}
+    required     - {field: display name}; the file fails validation when the field is empty
+    detect       - rules that must all hold for the layout to be picked:
+                   {"cell": "A1", "contains": "text"} or {"label": "text"}
+
+Layouts are compiled once: every amount field becomes a single regex over the
+joined label column, so a file is matched in one pass instead of a loop over
+labels x keywords. Extra layouts are loaded from *.json files in
+RECONCILIATION_LAYOUT_DIR and tried (in file name order) before the built-in one.
+"""
+import os
+import re
+import json
+from bisect import bisect_right
+from functools import lru_cache
+from openpyxl.utils.cell import coordinate_from_string, column_index_from_string
+from modules.common import fingerprint
+
+PRIORITY_ROW = 'row'          # first label (top to bottom) containing any keyword
+PRIORITY_KEYWORD = 'keyword'  # first keyword (in list order) found in any label
+
+# Joins the label column into one searchable string; never part of a keyword
+LABEL_SEP = '\x00'
+
+DEFAULT_LAYOUT = {
+    "name": "standard",
+    "sheet": "INVOICE",
+    "header_rows": 50,
+    "label_col": "H",
+    "value_col": "K",
+    "cells": {
+        "tagihan_kepada": "B7",
+        "dikirim_ke": "B12",
+        "no_invoice": "J8",
+        "invoice_date": "J13",
+        # Removes "Currency", newlines, and spaces
+        "currency": {"cell": "K13", "remove": ["currency", "\n"], "upper": True},
+        "due_date": "K15"
+    },
+    "amounts": {
+        "dpp": {"keywords": ["total dasar pengenaan pajak", "total dasar pengenaan pajak (asli)", "dpp"]},
+        "diskon": {"keywords": ["total diskon", "diskon"]},
+        "ppn": {
+            "keywords": ["total ppn (1.1%)", "total ppn", "ppn"],
+            "override": {"label_contains": ["dibebaskan"], "value": 0}
+        },
+        "pph": {"keywords": ["total pph 23 (2%)", "total pph", "pph 23", "pph"]}
+    },
+    "required": {"no_invoice": "No. Invoice"},
+    "detect": []
+}
+
+# --- COMPILATION ---
+
+def _cell_position(cell_ref):
+    """'B7' -> (row, zero-based column index)."""
+    col, row = coordinate_from_string(cell_ref)
+    return row, column_index_from_string(col) - 1
+
+def _keywords(spec, field):
+    keywords = [str(k).lower() for k in spec.get("keywords", []) if str(k)]
+    if not keywords:
+        raise ValueError(f"amount '{field}' has no keywords")
+    return keywords
+
+def _compile_amount(field, spec):
+    keywords = _keywords(spec, field)
+    priority = spec.get("priority", PRIORITY_ROW)
+    if priority == PRIORITY_ROW:
+        # Leftmost match in the joined labels == first matching row
+        pattern = re.compile("|".join(re.escape(k) for k in keywords))
+    elif priority == PRIORITY_KEYWORD:
+        # One optional lookahead per keyword; the lowest matched group wins
+        pattern = re.compile("".join(rf"(?=[\s\S]*?({re.escape(k)}))?" for k in keywords))
+    else:
+        raise ValueError(f"amount '{field}' has unknown priority '{priority}'")
+
+    override = spec.get("override")
+    override_pattern = None
+    override_value = None
+    if override:
+        words = [str(w).lower() for w in override.get("label_contains", []) if str(w)]
+        if words:
+            override_pattern = re.compile("|".join(re.escape(w) for w in words))
+            override_value = override.get("value", 0)
+
+    return {
+        "field": field,
+        "priority": priority,
+        "pattern": pattern,
+        "override_pattern": override_pattern,
+        "override_value": override_value,
+    }
+
+def compile_layout(layout):
+    """
+    Validates a layout dict and precomputes its cell positions and matchers.
+    Returns: compiled layout dict (picklable, safe to ship to worker processes)
+    Raises: ValueError / KeyError on a malformed layout
+    """
+    cells = []
+    for field, spec in layout.get("cells", {}).items():
+        if isinstance(spec, str):
+            spec = {"cell": spec}
+        row, idx = _cell_position(spec["cell"])
+        cells.append({
+            "field": field,
+            "ref": spec["cell"].upper(),
+            "row": row,
+            "idx": idx,
+            "remove": [str(r).lower() for r in spec.get("remove", [])],
+            "upper": bool(spec.get("upper", False)),
+        })
+
+    detect = []
+    for rule in layout.get("detect", []):
+        if "cell" in rule:
+            row, idx = _cell_position(rule["cell"])
+            detect.append({"row": row, "idx": idx, "contains": str(rule.get("contains", "")).lower()})
+        elif "label" in rule:
+            detect.append({"label": str(rule["label"]).lower()})
+        else:
+            raise ValueError(f"unknown detect rule {rule}")
+
+    label_idx = column_index_from_string(layout.get("label_col", "H")) - 1
+    value_idx = column_index_from_string(layout.get("value_col", "K")) - 1
+    detect_idx = [rule["idx"] for rule in detect if "idx" in rule]
+
+    return {
+        "name": layout.get("name", "unnamed"),
+        # Part of the result cache key: editing a layout invalidates its cached scans
+        "fingerprint": fingerprint(layout),
+        "sheet": layout.get("sheet", "INVOICE").upper(),
+        "header_rows": int(layout.get("header_rows", 50)),
+        "label_idx": label_idx,
+        "value_idx": value_idx,
+        "max_col": max([label_idx, value_idx] + [c["idx"] for c in cells] + detect_idx) + 1,
+        "cells": cells,
+        "amounts": [_compile_amount(field, spec) for field, spec in layout.get("amounts", {}).items()],
+        "required": dict(layout.get("required", {})),
+        "detect": detect,
+    }
+
+@lru_cache(maxsize=8)
+def get_layouts(layout_dir=None):
+    """
+    Compiled layouts in matching order: *.json files from layout_dir, then the built-in layout.
+    A broken layout file is reported and skipped rather than taking the scanner down.
+    """
+    layouts = []
+    if layout_dir and os.path.isdir(layout_dir):
+        for name in sorted(os.listdir(layout_dir)):
+            if not name.lower().endswith('.json'):
+                continue
+            path = os.path.join(layout_dir, name)
+            try:
+                with open(path, encoding='utf-8') as f:
+                    layout = json.load(f)
+                layout.setdefault("name", os.path.splitext(name)[0])
+                layouts.append(compile_layout(layout))
+            except Exception as e:
+                print(f"Skipping invoice layout {path}: {e}")
+    layouts.append(compile_layout(DEFAULT_LAYOUT))
+    return tuple(layouts)
+
+# --- MATCHING ---
+
+class HeaderGrid:
+    """
+    Top rows of one sheet as value tuples, plus a lazily built label index
+    per (label column, value column) pair.
+    """
+    def __init__(self, rows):
+        self.rows = rows
+        self._labels = {}
+
+    def cell(self, row, idx):
+        if row - 1 < len(self.rows):
+            values = self.rows[row - 1]
+            if idx < len(values):
+                return values[idx]
+        return None
+
+    def labels(self, label_idx, value_idx, max_row):
+        """
+        Returns: (joined, starts, entries)
+            joined: lowercased labels (first occurrence, row order) joined by LABEL_SEP
+            starts: offset of each label in joined
+            entries: [(label, value)] aligned with starts
+        """
+        key = (label_idx, value_idx, max_row)
+        if key not in self._labels:
+            seen = {}
+            for values in self.rows[:max_row]:
+                label = values[label_idx] if label_idx < len(values) else None
+                if label:
+                    value = values[value_idx] if value_idx < len(values) else None
+                    seen.setdefault(str(label).lower(), value)
+            entries = list(seen.items())
+            starts = []
+            offset = 0
+            for label, _ in entries:
+                starts.append(offset)
+                offset += len(label) + len(LABEL_SEP)
+            self._labels[key] = (LABEL_SEP.join(seen), starts, entries)
+        return self._labels[key]
+
+def _entry_at(starts, entries, pos):
+    return entries[bisect_right(starts, pos) - 1]
+
+def layout_matches(layout, grid):
+    for rule in layout["detect"]:
+        if "label" in rule:
+            joined, _, _ = grid.labels(layout["label_idx"], layout["value_idx"], layout["header_rows"])
+            if rule["label"] not in joined:
+                return False
+        else:
+            value = grid.cell(rule["row"], rule["idx"]) if rule["row"] <= layout["header_rows"] else None
+            if value is None or rule["contains"] not in str(value).lower():
+                return False
+    return True
+
+def find_amount(amount, joined, starts, entries):
+    """
+    Runs one compiled amount matcher over the joined labels.
+    Returns: (raw value, matched label) or (None, None)
+    """
+    if not entries:
+        return None, None
+    if amount["priority"] == PRIORITY_ROW:
+        m = amount["pattern"].search(joined)
+        if not m:
+            return None, None
+        pos = m.start()
+    else:
+        m = amount["pattern"].match(joined)
+        found = [m.start(i) for i in range(1, len(m.groups()) + 1) if m.group(i) is not None]
+        if not found:
+            return None, None
+        pos = found[0]
+
+    label, value = _entry_at(starts, entries, pos)
+    if amount["override_pattern"] is not None and amount["override_pattern"].search(label):
+        value = amount["override_value"]
+    return value, label
+
+def apply_layout(layout, grid):
+    """
+    Returns: {"cells": {field: raw value}, "amounts": {field: raw value or None}}
+    """
+    cells = {c["field"]: grid.cell(c["row"], c["idx"]) for c in layout["cells"]}
+    joined, starts, entries = grid.labels(layout["label_idx"], layout["value_idx"], layout["header_rows"])
+    amounts = {}
+    for amount in layout["amounts"]:
+        amounts[amount["field"]], _ = find_amount(amount, joined, starts, entries)
+    return {"cells": cells, "amounts": amounts}
+
+def clean_cell_text(text, cell):
+    """Applies a cell's 'remove' / 'upper' cleanup to its formatted text."""
+    if text and (cell["remove"] or cell["upper"]):
+        text = text.lower()
+        for part in cell["remove"]:
+            text = text.replace(part, "")
+        text = text.strip()
+        if cell["upper"]:
+            text = text.upper()
+    return text
@@ -1,24 +1,28 @@
 import os
 import io
 import pandas as pd
-from flask import Blueprint, render_template, request, jsonify, send_file
+from flask import Blueprint, render_template, request, jsonify, send_file, current_app
 from openpyxl import load_workbook
+from modules.common import parse_amount, MODE_PLAIN_FIRST, EXECUTOR_PROCESS, resolve_workers, content_key, get_result_cache, run_cached
+from modules.common.jobs import respond
+from modules.common.timing import (
+    STAGE_AGGREGATE, STAGE_CLEAN, STAGE_READ, STAGE_RESOLVE, STAGE_SERIALIZE, STAGE_VALIDATE, request_timings, source_size, stage
+)
+from modules.common.uploads import UploadRejected, ingest_uploads
+from modules.reconciliation.layouts import HeaderGrid, get_layouts, layout_matches, apply_layout, clean_cell_text
 import datetime
 
+# Bump when extraction logic changes so cached scan results are not reused
+PARSER_VERSION = 1
+
+# A scan reads the INVOICE sheet's header cells in read-only mode (~0.3x the file at most, measured
+# on a 1.6 MB invoice) and keeps ~1 KB per file, so it reserves about the size of the files scanned at once
+SCAN_MEMORY_FACTOR = 1
+
 reconciliation_bp = Blueprint('reconciliation', __name__, 
                             template_folder='../../templates/reconciliation', 
                             static_folder='../../static/reconciliation')
 
-# Coordinates configuration
-COORD_MAP = {
-    "tagihan_kepada": "B7",
-    "dikirim_ke": "B12",
-    "no_invoice": "J8",
-    "invoice_date": "J13",
-    "currency": "K13",
-    "due_date": "K15"
-}
-
 def format_value(val):
     """Utility to format values cleanly."""
     if val is None:
@@ -29,136 +33,83 @@ def format_value(val):
 
 def safe_float_convert(val):
     """Convert value to float, handling strings like 'Rp 100.000' or regular numbers."""
-    if val is None:
-        return 0.0
-    if isinstance(val, (int, float)):
-        return float(val)
-    
-    # Clean string: remove Rp, dots (if thousands), replace comma with dot (if decimal)
-    s_val = str(val).lower().replace("rp", "").replace(" ", "")
-    
-    # Try standard float conversion
-    try:
-        return float(s_val)
-    except ValueError:
-        pass
-        
-    # Handle Indonesia thousands separator (.) and decimal (,)
-    if "," in s_val and "." in s_val:
-            s_val = s_val.replace(".", "").replace(",", ".")
-    elif "." in s_val and s_val.count(".") > 1: # Mulitple dots = thousands
-            s_val = s_val.replace(".", "")
-    elif "," in s_val: # Check if comma is decimal
-            s_val = s_val.replace(",", ".")
-            
-    try:
-        return float(s_val)
-    except ValueError:
-        return 0.0
+    return parse_amount(val, mode=MODE_PLAIN_FIRST)
 
-def find_value_in_col_k(ws, keyword_list, search_col="J", value_col="K", max_row=50):
+def read_header_grid(file_storage, layouts):
     """
-    Search for a keyword in 'search_col' (default J) and return the value from 'value_col' (default K).
-    Returns raw value or None if not found.
+    Opens the workbook in read-only mode and streams the top rows of each sheet a
+    layout asks for (once per sheet), trying the layouts in order.
+    Returns: (layout, HeaderGrid) for the first layout whose detect rules hold
     """
-    for row in range(1, max_row + 1):
-        cell_val = ws[f"{search_col}{row}"].value
-        if cell_val:
-            str_val = str(cell_val).lower()
-            # Check if any keyword matches
-            for key in keyword_list:
-                if key in str_val:
-                    return ws[f"{value_col}{row}"].value
-    return None
+    # Load workbook with data_only=True to get values, not formulas
+    wb = load_workbook(file_storage, read_only=True, data_only=True)
+    try:
+        sheet_names = {}
+        for sheet_name in wb.sheetnames:
+            sheet_names.setdefault(sheet_name.upper(), sheet_name)
+        max_row = max(layout["header_rows"] for layout in layouts)
+        max_col = max(layout["max_col"] for layout in layouts)
 
-def find_value_and_label(ws, keyword_list, search_col="J", value_col="K", max_row=50):
-    """
-    Search for a keyword in 'search_col' and return (value, label_text).
-    """
-    for row in range(1, max_row + 1):
-        cell_val = ws[f"{search_col}{row}"].value
-        if cell_val:
-            str_val = str(cell_val).lower()
-            for key in keyword_list:
-                if key in str_val:
-                    return ws[f"{value_col}{row}"].value, str_val
-    return None, None
+        grids = {}
+        for layout in layouts:
+            sheet_name = sheet_names.get(layout["sheet"])
+            if sheet_name not in grids:
+                ws = wb[sheet_name] if sheet_name else wb.active
+                # Some exporters write a wrong <dimension>; ignore it so no column is cut off
+                ws.reset_dimensions()
+                rows = [tuple(row) for row in ws.iter_rows(min_row=1, max_row=max_row, max_col=max_col, values_only=True)]
+                grids[sheet_name] = HeaderGrid(rows)
+            if layout_matches(layout, grids[sheet_name]):
+                return layout, grids[sheet_name]
+        raise ValueError("Tidak ada layout invoice yang cocok")
+    finally:
+        wb.close()
 
-def process_single_file(file_storage):
+def process_single_file(file_storage, filename=None, layouts=None):
     # Remove extension from filename for display/export
-    filename = os.path.splitext(file_storage.filename)[0]
+    filename = os.path.splitext(filename or file_storage.filename)[0]
     error_msg = None
     data = {}
+    layout_name = None
 
     try:
-        # Load workbook with data_only=True to get values, not formulas
-        wb = load_workbook(file_storage, data_only=True)
-        
-        # Select Sheet (Case-insensitive)
-        sheet_found = False
-        for sheet_name in wb.sheetnames:
-            if sheet_name.upper() == "INVOICE":
-                ws = wb[sheet_name]
-                sheet_found = True
-                break
-        
-        if not sheet_found:
-            ws = wb.active
+        # Single streaming pass over the header area; picks the matching invoice layout
+        with stage(STAGE_READ, nbytes=source_size(file_storage)) as size:
+            layout, grid = read_header_grid(file_storage, layouts or get_layouts())
+            size["rows"] = len(grid.rows)
+        layout_name = layout["name"]
+        with stage(STAGE_RESOLVE):
+            found = apply_layout(layout, grid)
 
-        # Extract fixed coordinates
-        extracted = {}
-        for key, cell_ref in COORD_MAP.items():
-            try:
-                val = ws[cell_ref].value
-                extracted[key] = format_value(val)
-            except Exception as e:
-                extracted[key] = ""
-        
-        # Custom cleanup for Currency field
-        # Removes "Currency", newlines, and spaces
-        if extracted.get("currency"):
-                c_val = extracted["currency"].lower().replace("currency", "").replace("\n", "").strip()
-                extracted["currency"] = c_val.upper()
-        
-        # Dynamic Extraction for DPP, PPN, PPH
-        
-        raw_dpp = find_value_in_col_k(ws, ["total dasar pengenaan pajak","total dasar pengenaan pajak (asli)", "dpp"], search_col="H")
-        raw_diskon = find_value_in_col_k(ws, ["total diskon", "diskon"], search_col="H")
-        
-        # PPN Logic with 'Dibebaskan' check
-        raw_ppn, ppn_label = find_value_and_label(ws, ["total ppn (1.1%)", "total ppn", "ppn"], search_col="H")
-        if ppn_label and "dibebaskan" in ppn_label:
-            raw_ppn = 0
-            
-        raw_pph = find_value_in_col_k(ws, ["total pph 23 (2%)", "total pph", "pph 23", "pph"], search_col="H")
-        
-        extracted['dpp'] = format_value(raw_dpp) if raw_dpp is not None else "0"
-        extracted['diskon'] = format_value(raw_diskon) if raw_diskon is not None else "0"
-        extracted['ppn'] = format_value(raw_ppn) if raw_ppn is not None else "0"
-        extracted['pph'] = format_value(raw_pph) if raw_pph is not None else "0"
+        with stage(STAGE_CLEAN, rows=1):
+            # Extract fixed coordinates (with per-layout cleanup, e.g. Currency)
+            extracted = {}
+            for cell in layout["cells"]:
+                extracted[cell["field"]] = clean_cell_text(format_value(found["cells"][cell["field"]]), cell)
 
-        val_dpp = safe_float_convert(raw_dpp)
-        val_diskon = safe_float_convert(raw_diskon)
-        val_ppn = safe_float_convert(raw_ppn)
-        val_pph = safe_float_convert(raw_pph)
-        
-        # Calculate Total Bayar = DPP - Diskon + PPN - PPH
-        # Assuming Diskon is a reduction.
-        val_total = val_dpp - val_diskon + val_ppn - val_pph
-        
-        # Store as float/number for good JSON and Excel export
-        extracted['dpp'] = val_dpp
-        extracted['diskon'] = val_diskon
-        extracted['ppn'] = val_ppn
-        extracted['pph'] = val_pph
-        extracted['total_bayar'] = val_total
+            # Dynamic Extraction for DPP, Diskon, PPN (with 'Dibebaskan' override), PPH
+            raw = found["amounts"]
+            values = {field: safe_float_convert(raw.get(field)) for field in ("dpp", "diskon", "ppn", "pph")}
+
+        with stage(STAGE_AGGREGATE):
+            # Calculate Total Bayar = DPP - Diskon + PPN - PPH
+            # Assuming Diskon is a reduction.
+            val_total = values["dpp"] - values["diskon"] + values["ppn"] - values["pph"]
+
+            # Store as float/number for good JSON and Excel export
+            extracted.update(values)
+            extracted['total_bayar'] = val_total
         
         # Validation
-        # Rules: No Invoice (J8) must not be empty.
-        no_inv = extracted.get("no_invoice")
-        
-        if not no_inv:
-            error_msg = f"Validasi Gagal: 'No. Invoice' (J8) tidak ditemukan."
+        # Rules: required fields (e.g. No. Invoice, J8) must not be empty.
+        with stage(STAGE_VALIDATE, rows=1):
+            cell_refs = {cell["field"]: cell["ref"] for cell in layout["cells"]}
+            for field, display_name in layout["required"].items():
+                if not extracted.get(field):
+                    error_msg = f"Validasi Gagal: '{display_name}' ({cell_refs.get(field, field)}) tidak ditemukan."
+                    break
+
+        if error_msg:
             status = "failed"
         else:
             status = "success"
@@ -173,9 +124,22 @@ def process_single_file(file_storage):
         "status": status,
         "filename": filename,
         "data": data,
-        "error": error_msg
+        "error": error_msg,
+        "layout": layout_name
     }
 
+def scan_invoice_file(item, context=None):
+    """
+    Pool task for process_single_file.
+    item: (filename, source) - source is a file-like object, raw bytes, or the path of a spooled upload
+    context: {"layouts": compiled layouts} (optional)
+    """
+    filename, source = item
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    layouts = (context or {}).get("layouts")
+    return process_single_file(source, filename=filename, layouts=layouts)
+
 @reconciliation_bp.route('/')
 def index():
     return render_template('rekon_index.html')
@@ -186,21 +150,80 @@ def process_files():
         return jsonify({"error": "No files uploaded"}), 400
     
     files = request.files.getlist('files')
-    results = []
+    results = [None] * len(files)
+    to_scan = []
     
-    for file in files:
+    for pos, file in enumerate(files):
         if not file.filename.lower().endswith('.xlsx'):
-            results.append({
+            results[pos] = {
                 "status": "failed",
                 "filename": file.filename,
                 "error": "Bukan file Excel (.xlsx)"
-            })
+            }
             continue
-            
-        res = process_single_file(file)
-        results.append(res)
-        
-    return jsonify(results)
+        to_scan.append((pos, file))
+    
+    # Scan workbooks concurrently; each file still fails on its own.
+    # Unchanged re-uploads are served from the result cache.
+    workers = resolve_workers(current_app.config, len(to_scan))
+    executor = current_app.config.get('RECONCILIATION_EXECUTOR', EXECUTOR_PROCESS)
+    layouts = get_layouts(current_app.config.get('RECONCILIATION_LAYOUT_DIR'))
+    # Uploads are spooled to disk; workers read them one file at a time within the memory budget
+    try:
+        uploads = ingest_uploads(current_app, [file for _, file in to_scan], workers=workers,
+                                 parse_factor=SCAN_MEMORY_FACTOR, result_factor=0)
+    except UploadRejected as e:
+        return jsonify({"error": str(e)}), e.status
+
+    # The scan runs inline, as a background job with ?async=1 or with per-file results streamed
+    # with ?stream=ndjson|sse (see modules/common/jobs.py and modules/common/streaming.py)
+    def work(progress):
+        # One invoice per file: a file counts as one row once it scanned successfully
+        def report_file(pos, res):
+            event = {
+                "index": pos,
+                "file": files[pos].filename,
+                "rows": int(res["status"] == "success"),
+                "status": res["status"],
+                "error": res["error"],
+                "anomalies": []
+            }
+            progress.file_done(rows=event["rows"], event=event, data={"result": res} if progress.streaming else None)
+
+        for pos, res in enumerate(results):
+            if res is not None: # rejected before the scan
+                report_file(pos, res)
+
+        with uploads:
+            layouts_key = ",".join(layout["fingerprint"] for layout in layouts)
+            keys = [content_key(upload.digest, upload.filename, PARSER_VERSION, layouts_key) for upload in uploads.uploads]
+
+            progress.update(stage='scanning invoices')
+            scanned = run_cached(scan_invoice_file, uploads.items, keys, cache=get_result_cache(current_app),
+                                 workers=workers, context={"layouts": layouts}, executor=executor,
+                                 on_result=lambda scan_pos, res: report_file(to_scan[scan_pos][0], res),
+                                 timings=request_timings(), cacheable=lambda res: res["status"] == "success")
+            for (pos, _), res in zip(to_scan, scanned):
+                results[pos] = res
+
+        if progress.streaming:
+            # Every result already went out with its file event
+            return jsonify({
+                "total_files": len(results),
+                "success": sum(res["status"] == "success" for res in results),
+                "failed": sum(res["status"] != "success" for res in results),
+                "peak_memory_mb": uploads.peak_memory_mb
+            })
+
+        # The response is a plain list of per-file results, so peak memory travels in a header
+        with stage(STAGE_SERIALIZE, rows=len(results)) as size:
+            response = jsonify(results)
+            size["bytes"] = response.content_length or 0
+        if uploads.peak_memory_mb is not None:
+            response.headers['X-Peak-Memory-MB'] = str(uploads.peak_memory_mb)
+        return response
+
+    return respond('reconciliation.process', work, files_total=len(files), streamable=True)
 
 @reconciliation_bp.route('/export', methods=['POST'])
 def export_excel():
@@ -0,0 +1,71 @@
+// Job/stream client shared by the create invoice, invoice generator and reconciliation pages.
+// Load before the page script; each page keeps its own describeFile.
+
+// Long batches run as a background job (?async=1): poll its progress, then fetch its result,
+// the same response the endpoint sends inline (which it still does when jobs are off).
+// With stream ({onFile, assemble}) each file is handed to onFile as soon as it is parsed: from the
+// job status while polling, or, when jobs are off, from the per-file events the endpoint then
+// streams (?stream=ndjson); assemble(files, totals) turns those back into the inline response body.
+async function fetchJob(url, options, onProgress, stream) {
+    const query = 'async=1' + (stream ? '&stream=ndjson' : '');
+    const res = await fetch(url + (url.includes('?') ? '&' : '?') + query, options);
+    if (stream && (res.headers.get('Content-Type') || '').startsWith('application/x-ndjson')) {
+        return readFileStream(res, onProgress, stream);
+    }
+    if (res.status !== 202) return res;
+    const job = await res.json();
+    let filesSeen = 0;
+    while (true) {
+        await new Promise(resolve => setTimeout(resolve, 1000));
+        const statusRes = await fetch(job.status_url);
+        const status = await statusRes.json();
+        if (!statusRes.ok) throw new Error(status.error || 'Job not found');
+        if (stream && status.files) {
+            status.files.slice(filesSeen).forEach(stream.onFile);
+            filesSeen = status.files.length;
+        }
+        if (onProgress) onProgress(status);
+        if (status.status === 'done' || status.status === 'failed') return fetch(job.result_url);
+    }
+}
+
+// One JSON event per line: progress, file (summary, anomalies, rows), then done with the totals
+async function readFileStream(res, onProgress, stream) {
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    const files = [];
+    let buffer = '';
+    let stage = 'starting';
+    while (true) {
+        const { value, done } = await reader.read();
+        buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+        let newline;
+        while ((newline = buffer.indexOf('\n')) >= 0) {
+            const line = buffer.slice(0, newline).trim();
+            buffer = buffer.slice(newline + 1);
+            if (!line) continue;
+            const event = JSON.parse(line);
+            if (event.event === 'progress') {
+                stage = event.stage || stage;
+                if (onProgress) onProgress(event);
+            } else if (event.event === 'file') {
+                files.push(event);
+                stream.onFile(event);
+                if (onProgress) onProgress({ stage, files_done: event.files_done, files_total: event.files_total, rows: event.rows_total });
+            } else if (event.event === 'error') {
+                throw new Error(event.error);
+            } else if (event.event === 'done') {
+                files.sort((a, b) => a.index - b.index);
+                const body = event.status === 200 ? stream.assemble(files, event.result) : event.result;
+                return new Response(JSON.stringify(body), { status: event.status, headers: { 'Content-Type': 'application/json' } });
+            }
+        }
+        if (done) throw new Error('The response stream ended early');
+    }
+}
+
+function describeJob(status) {
+    const files = status.files_total ? ` - ${status.files_done}/${status.files_total} files` : '';
+    const rows = status.rows ? `, ${status.rows.toLocaleString()} rows` : '';
+    return status.stage.charAt(0).toUpperCase() + status.stage.slice(1) + files + rows;
+}
@@ -49,8 +49,19 @@ document.addEventListener('DOMContentLoaded', () => {
     const outputFilenameDisplay = document.getElementById('output-filename');
     const notificationArea = document.getElementById('notification-area');
 
+    const previewFilters = document.getElementById('preview-filters');
+    const filterFile = document.getElementById('filter-file');
+    const filterAgent = document.getElementById('filter-agent');
+    const filterAnomaly = document.getElementById('filter-anomaly');
+    const previewPager = document.getElementById('preview-pager');
+    const pagerInfo = document.getElementById('pager-info');
+    const pagerPrev = document.getElementById('pager-prev');
+    const pagerNext = document.getElementById('pager-next');
+
     // --- State ---
     let selectedFiles = [];
+    // Current preview table: columns, file colors and (server-side mode) paging/sort state
+    let previewContext = null;
 
 
     // ... (drag & drop handlers) ...
@@ -73,6 +84,11 @@ document.addEventListener('DOMContentLoaded', () => {
             const colFilters = document.querySelectorAll('.column-filter');
             colFilters.forEach(input => input.value = '');
 
+            // Drop the server-side preview
+            previewContext = null;
+            if (previewFilters) previewFilters.classList.add('hidden');
+            if (previewPager) previewPager.classList.add('hidden');
+
             // Hide Reset Button again
             resetBtn.classList.add('hidden');
 
@@ -456,6 +472,11 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // --- API & Processing ---
 
+    function describeFile(file) {
+        const issues = file.error ? ` - ${file.error}` : (file.anomalies && file.anomalies.length ? `, ${file.anomalies.length} anomalies` : '');
+        return `${file.file}: ${file.status}, ${(file.rows || 0).toLocaleString()} rows${issues}`;
+    }
+
     processBtn.addEventListener('click', async () => {
         if (selectedFiles.length === 0) return;
 
@@ -500,10 +521,29 @@ document.addEventListener('DOMContentLoaded', () => {
             formData.append('master_data_json', JSON.stringify(pastedMasterData));
         }
 
+        // Clear the stored master data before importing this request's sources
+        const replaceMaster = document.getElementById('replace-master');
+        if (replaceMaster && replaceMaster.checked) {
+            formData.append('replace_master', '1');
+        }
+
         try {
-            const response = await fetch(window.API_URL || '/api/process', {
+            const jobProgress = document.getElementById('job-progress');
+            const fileProgress = document.getElementById('file-progress');
+            if (jobProgress) jobProgress.textContent = '';
+            if (fileProgress) fileProgress.innerHTML = '';
+            const response = await fetchJob(window.API_URL || '/api/process', {
                 method: 'POST',
                 body: formData
+            }, (status) => { if (jobProgress) jobProgress.textContent = describeJob(status); }, {
+                onFile: (file) => {
+                    if (!fileProgress) return;
+                    const li = document.createElement('li');
+                    li.textContent = describeFile(file);
+                    fileProgress.appendChild(li);
+                },
+                // The totals event is the whole response; the files only fed the list above
+                assemble: (files, totals) => totals
             });
 
             const result = await response.json();
@@ -750,9 +790,8 @@ document.addEventListener('DOMContentLoaded', () => {
         summaryRows.textContent = result.summary.total_rows;
         summaryAmount.textContent = formatCurrency(result.summary.total_amount);
 
-        // Download Link
-        // downloadBtn.href = result.summary.download_url; // Removed for stateless
-        setupDownloadButton(result.summary.output_filename, result.summary.excel_data);
+        // Download Link (fetched from the server on click; inline base64 on serverless)
+        setupDownloadButton(result.summary.output_filename, result.summary);
 
         // Output Filename Display
         if (outputFilenameDisplay && result.summary.output_filename) {
@@ -823,8 +862,14 @@ document.addEventListener('DOMContentLoaded', () => {
         }
 
         // --- 2. Main Data Preview Table ---
+        // With result.preview the server keeps the rows: result.data is only the first page,
+        // and filters/sorting/paging are fetched from result.preview.url.
         const data = result.data;
+        const preview = result.preview || null;
         if (data.length === 0) {
+            previewContext = null;
+            if (previewFilters) previewFilters.classList.add('hidden');
+            if (previewPager) previewPager.classList.add('hidden');
             tableHeader.innerHTML = '<tr><td colspan="100%" class="p-8 text-center text-slate-500">No data found</td></tr>';
             tableBody.innerHTML = '';
             resultsSection.classList.remove('hidden');
@@ -832,22 +877,61 @@ document.addEventListener('DOMContentLoaded', () => {
         }
 
         // Exclude 'source_file' from columns header but use it for row styling
-        const displayColumns = result.display_columns || Object.keys(data[0]).filter(col => col !== 'source_file');
+        const displayColumns = result.display_columns || Object.keys(data[0]).filter(col => col !== 'source_file' && col !== '_anomaly');
+
+        previewContext = {
+            displayColumns,
+            fileColorMap,
+            defaultColor: colors[0],
+            url: preview ? preview.url : null,
+            pageSize: preview ? preview.page_size : data.length,
+            page: 1,
+            sort: '',
+            order: 'asc',
+            requestId: 0
+        };
 
         tableHeader.innerHTML = displayColumns.map(col =>
             `<th scope="col" class="px-6 py-3 font-semibold tracking-wide whitespace-nowrap bg-slate-100 dark:bg-slate-700/50 dark:text-slate-200">
                 <div class="flex flex-col gap-2">
-                    <span>${col}</span>
+                    <span class="${preview ? 'cursor-pointer select-none hover:text-blue-600' : ''}" data-sort-col="${col}">${col}</span>
                     <input type="text" class="column-filter bg-white dark:bg-slate-600 border border-slate-300 dark:border-slate-500 text-slate-900 dark:text-white text-xs rounded-lg focus:ring-blue-500 focus:border-blue-500 block w-full p-1.5 font-normal placeholder-slate-400" placeholder="Filter ${col}..." data-col="${col}">
                 </div>
             </th>`
         ).join('');
 
-        tableBody.innerHTML = data.map(row => {
+        renderTableRows(data);
+
+        if (preview) {
+            setupPreviewFilters(preview);
+            updatePager(preview.total_rows, 1, preview.pages);
+            tableHeader.querySelectorAll('[data-sort-col]').forEach(span => {
+                span.addEventListener('click', () => toggleSort(span.dataset.sortCol));
+            });
+        } else {
+            if (previewFilters) previewFilters.classList.add('hidden');
+            if (previewPager) previewPager.classList.add('hidden');
+        }
+
+        // Attach Event Listeners for Column Filters
+        const colFilters = document.querySelectorAll('.column-filter');
+        colFilters.forEach(input => {
+            input.addEventListener('input', applyFilters);
+        });
+
+        resultsSection.classList.remove('hidden');
+        resultsSection.scrollIntoView({ behavior: 'smooth' });
+    }
+
+    function renderTableRows(rows) {
+        const { displayColumns, fileColorMap, defaultColor } = previewContext;
+
+        tableBody.innerHTML = rows.map(row => {
             const filename = row['source_file'];
-            const color = fileColorMap[filename] || colors[0];
+            const color = fileColorMap[filename] || defaultColor;
+            const anomaly = row['_anomaly'] || '';
 
-            return `<tr class="bg-white dark:bg-transparent hover:bg-slate-50 dark:hover:bg-slate-700/50 transition-colors border-b last:border-0 border-slate-100 dark:border-slate-700/50">
+            return `<tr class="${anomaly ? 'bg-amber-50/60 dark:bg-amber-900/10' : 'bg-white dark:bg-transparent'} hover:bg-slate-50 dark:hover:bg-slate-700/50 transition-colors border-b last:border-0 border-slate-100 dark:border-slate-700/50" ${anomaly ? `title="Anomaly: ${anomaly}"` : ''}>
                 ${displayColumns.map((col, idx) => {
                 const cellValue = row[col] !== null ? row[col] : '';
                 // Inject filename badge in the first cell
@@ -865,18 +949,99 @@ document.addEventListener('DOMContentLoaded', () => {
             }).join('')}
             </tr>`;
         }).join('');
+    }
 
-        // Attach Event Listeners for Column Filters
-        const colFilters = document.querySelectorAll('.column-filter');
-        colFilters.forEach(input => {
-            input.addEventListener('input', applyFilters);
+    // --- Server-side Preview (paging, filtering, sorting) ---
+    let previewFetchTimer = null;
+
+    function setupPreviewFilters(preview) {
+        if (!previewFilters) return;
+
+        filterFile.innerHTML = '<option value="">All files</option>' + (preview.files || []).map(f =>
+            `<option value="${f.filename}">${f.filename} (${f.rows} rows, ${f.anomaly_rows} anomalies)</option>`
+        ).join('');
+        filterAgent.innerHTML = '<option value="">All agents</option>' + (preview.agents || []).map(a =>
+            `<option value="${a}">${a}</option>`
+        ).join('');
+        filterAnomaly.value = '';
+        previewFilters.classList.remove('hidden');
+    }
+
+    [filterFile, filterAgent, filterAnomaly].forEach(select => {
+        if (select) select.addEventListener('change', () => fetchPreviewPage(1));
+    });
+    if (pagerPrev) pagerPrev.addEventListener('click', () => fetchPreviewPage(previewContext.page - 1));
+    if (pagerNext) pagerNext.addEventListener('click', () => fetchPreviewPage(previewContext.page + 1));
+
+    function toggleSort(col) {
+        if (previewContext.sort === col) {
+            previewContext.order = previewContext.order === 'asc' ? 'desc' : 'asc';
+        } else {
+            previewContext.sort = col;
+            previewContext.order = 'asc';
+        }
+        tableHeader.querySelectorAll('[data-sort-col]').forEach(span => {
+            const active = span.dataset.sortCol === previewContext.sort;
+            span.textContent = span.dataset.sortCol + (active ? (previewContext.order === 'asc' ? ' ▲' : ' ▼') : '');
         });
+        fetchPreviewPage(1);
+    }
 
-        resultsSection.classList.remove('hidden');
-        resultsSection.scrollIntoView({ behavior: 'smooth' });
+    function updatePager(totalRows, page, pages) {
+        if (!previewPager) return;
+        const start = totalRows === 0 ? 0 : (page - 1) * previewContext.pageSize + 1;
+        const end = Math.min(page * previewContext.pageSize, totalRows);
+        pagerInfo.textContent = `Showing ${start}-${end} of ${totalRows} rows (page ${page} of ${pages})`;
+        pagerPrev.disabled = page <= 1;
+        pagerNext.disabled = page >= pages;
+        previewPager.classList.remove('hidden');
+    }
+
+    async function fetchPreviewPage(page) {
+        if (!previewContext || !previewContext.url) return;
+
+        const params = new URLSearchParams({ page: Math.max(1, page), page_size: previewContext.pageSize });
+        if (tableSearch && tableSearch.value.trim()) params.append('q', tableSearch.value.trim());
+        document.querySelectorAll('.column-filter').forEach(input => {
+            if (input.value.trim() !== '') params.append(`f.${input.dataset.col}`, input.value.trim());
+        });
+        if (filterFile && filterFile.value) params.append('source_file', filterFile.value);
+        if (filterAgent && filterAgent.value) params.append('agent', filterAgent.value);
+        if (filterAnomaly && filterAnomaly.value) params.append('anomaly', filterAnomaly.value);
+        if (previewContext.sort) {
+            params.append('sort', previewContext.sort);
+            params.append('order', previewContext.order);
+        }
+
+        // Only the latest request may render (typing fires several)
+        const requestId = ++previewContext.requestId;
+        try {
+            const response = await fetch(`${previewContext.url}?${params.toString()}`);
+            const result = await response.json();
+            if (requestId !== previewContext.requestId) return;
+            if (!response.ok || !result.success) {
+                alert(result.error || 'Failed to load preview page.');
+                return;
+            }
+            previewContext.page = result.page;
+            renderTableRows(result.rows);
+            if (result.rows.length === 0) {
+                tableBody.innerHTML = `<tr><td colspan="${previewContext.displayColumns.length}" class="p-8 text-center text-slate-500">No matching rows</td></tr>`;
+            }
+            updatePager(result.total_rows, result.page, result.pages);
+        } catch (error) {
+            console.error('Error:', error);
+        }
     }
 
     function applyFilters() {
+        // Server-side preview: re-query (debounced) instead of hiding DOM rows
+        if (previewContext && previewContext.url) {
+            clearTimeout(previewFetchTimer);
+            previewFetchTimer = setTimeout(() => fetchPreviewPage(1), 300);
+            return;
+        }
+
         const globalTerm = tableSearch ? tableSearch.value.toLowerCase() : '';
         const rows = tableBody.querySelectorAll('tr');
         const colFilters = document.querySelectorAll('.column-filter');
@@ -950,18 +1115,46 @@ document.addEventListener('DOMContentLoaded', () => {
         return !isNaN(parseFloat(n)) && isFinite(n);
     }
 
-    // --- HELPER: Stateless Download ---
+    // --- HELPER: Download ---
     let currentDownloadHandler = null;
 
-    function setupDownloadButton(filename, base64Data) {
+    function saveBlob(blob, filename) {
+        const url = URL.createObjectURL(blob);
+        const a = document.createElement('a');
+        a.href = url;
+        a.download = filename;
+        document.body.appendChild(a);
+        a.click();
+        document.body.removeChild(a);
+        URL.revokeObjectURL(url);
+    }
+
+    function setupDownloadButton(filename, summary) {
         if (!downloadBtn) return;
 
         if (currentDownloadHandler) {
             downloadBtn.removeEventListener('click', currentDownloadHandler);
         }
 
-        currentDownloadHandler = (e) => {
+        currentDownloadHandler = async (e) => {
             e.preventDefault();
+
+            if (summary.download_url) {
+                // Workbook is kept server-side for a limited time; fetch the raw bytes on demand
+                try {
+                    const response = await fetch(summary.download_url);
+                    if (!response.ok) {
+                        const err = await response.json().catch(() => ({}));
+                        throw new Error(err.error || `Download failed (${response.status})`);
+                    }
+                    saveBlob(await response.blob(), filename);
+                } catch (error) {
+                    alert(error.message);
+                }
+                return;
+            }
+
+            // Inline mode (serverless): the workbook came base64-encoded in the response
             const b64toBlob = (b64Data, contentType = '', sliceSize = 512) => {
                 const byteCharacters = atob(b64Data);
                 const byteArrays = [];
@@ -977,19 +1170,11 @@ document.addEventListener('DOMContentLoaded', () => {
                 return new Blob(byteArrays, { type: contentType });
             }
 
-            const blob = b64toBlob(base64Data, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet');
-            const url = URL.createObjectURL(blob);
-            const a = document.createElement('a');
-            a.href = url;
-            a.download = filename;
-            document.body.appendChild(a);
-            a.click();
-            document.body.removeChild(a);
-            URL.revokeObjectURL(url);
+            saveBlob(b64toBlob(summary.excel_data, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'), filename);
         };
 
         downloadBtn.addEventListener('click', currentDownloadHandler);
-        downloadBtn.href = "#";
+        downloadBtn.href = summary.download_url || "#";
     }
 
     // --- Theme Toggle ---